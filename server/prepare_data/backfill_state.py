@@ -0,0 +1,175 @@
+"""
+Per-ticker checkpoint for long historical backfills.
+
+The state lives in a small JSON file that is rewritten atomically after
+every stored batch, so a crashed or killed run can be restarted: completed
+tickers are skipped and only failed or never-attempted ones are fetched.
+
+A job is finished once every ticker has been attempted. Tickers that failed
+are carried into the next job's retry list instead of holding the job open,
+so one delisted symbol can't stall every later scheduled run.
+
+    {"job": "sp500_stock_prices", "finished": false, "retry": ["GONE"],
+     "tickers": {"AAPL": {"status": "done", "rows": 1257, "last_date": "2024-05-31", ...}}}
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+DEFAULT_DIR = os.getenv(
+    'BACKFILL_STATE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'backfill'),
+)
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def default_path(job):
+    """Checkpoint file for a named job, e.g. data/backfill/sp500_stock_prices.json."""
+    return os.path.join(DEFAULT_DIR, f"{job}.json")
+
+
+class Checkpoint:
+    """
+    Thread-safe per-ticker job state backed by a JSON file.
+
+    A checkpoint whose previous run finished is discarded on load, so the
+    next scheduled backfill starts a new job instead of skipping everything;
+    only its failed tickers are kept, as the new job's retry list.
+
+    Args:
+        path (str): JSON file location; None keeps the state in memory only.
+        job (str): Job name stored in the file for reports.
+        fresh (bool): Ignore any existing state.
+    """
+
+    def __init__(self, path, job='backfill', fresh=False):
+        self.path = path
+        self.job = job
+        self._lock = threading.Lock()
+        self.state = {'job': job, 'started': _now(), 'finished': False, 'retry': [], 'tickers': {}}
+        if path and not fresh and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if not saved.get('finished'):
+                self.state = {'retry': [], **saved}
+                print(f"Resuming {job} from {path}: {len(self.done())} tickers already done.")
+            elif saved.get('retry'):
+                self.state['retry'] = list(saved['retry'])
+                print(f"Retrying {len(self.state['retry'])} tickers that failed in the last {job} run.")
+
+    @property
+    def tickers(self):
+        return self.state['tickers']
+
+    def done(self):
+        return {t for t, entry in self.tickers.items() if entry['status'] == DONE}
+
+    def failed(self):
+        return {t: entry for t, entry in self.tickers.items() if entry['status'] == FAILED}
+
+    def retry(self):
+        """Tickers that failed in the previous job."""
+        return list(self.state['retry'])
+
+    def pending(self, tickers):
+        """
+        Tickers still to fetch: failed and never-attempted ones in input order,
+        then any retries from the previous job that are not in `tickers`.
+        """
+        done = self.done()
+        requested = set(tickers)
+        retries = [t for t in self.retry() if t not in requested]
+        return [t for t in list(tickers) + retries if t not in done]
+
+    def mark_done(self, ticker, rows, last_date=None):
+        with self._lock:
+            entry = self.tickers.setdefault(ticker, {'attempts': 0})
+            entry.update(status=DONE, rows=int(rows), last_date=last_date, error=None,
+                         attempts=entry['attempts'] + 1, updated=_now())
+
+    def mark_failed(self, ticker, error):
+        with self._lock:
+            entry = self.tickers.setdefault(ticker, {'attempts': 0})
+            entry.update(status=FAILED, error=str(error),
+                         attempts=entry['attempts'] + 1, updated=_now())
+
+    def finish(self):
+        """
+        Marks the job finished once every ticker has been attempted.
+
+        Failed tickers become the retry list picked up by the next job.
+
+        Returns:
+            bool: True if no ticker failed.
+        """
+        with self._lock:
+            self.state['retry'] = sorted(t for t, e in self.tickers.items() if e['status'] == FAILED)
+            self.state['finished'] = True
+            self.state['ended'] = _now()
+        self.save()
+        return not self.state['retry']
+
+    def save(self):
+        """Writes the state atomically (temp file + rename) so a kill never leaves it half-written."""
+        if not self.path:
+            return
+        with self._lock:
+            payload = json.dumps(self.state, indent=1, sort_keys=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(payload)
+        os.replace(tmp, self.path)
+
+    def report(self):
+        """
+        Structured run report.
+
+        Returns:
+            dict: {'job', 'finished', 'done', 'rows', 'failed': [{'ticker', 'error', 'attempts'}], 'retry'}
+        """
+        failed = [{'ticker': t, 'error': e['error'], 'attempts': e['attempts']}
+                  for t, e in sorted(self.failed().items())]
+        return {
+            'job': self.job,
+            'finished': self.state['finished'],
+            'done': len(self.done()),
+            'rows': sum(e.get('rows', 0) for e in self.tickers.values() if e['status'] == DONE),
+            'failed': failed,
+            'retry': self.retry(),
+        }
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Backfill report written to {path}")
+
+
+def record_stored(checkpoint, df, tickers, empty_ok=False):
+    """
+    Marks every ticker of a stored batch in one pass over the long frame.
+
+    Tickers of the batch without any rows are recorded as failed ('no data
+    returned'), unless `empty_ok`: an incremental top-up on a weekend or
+    holiday has nothing new to store and is done with 0 rows.
+    """
+    if not df.empty:
+        grouped = df.groupby('ticker', observed=True)['time'].agg(['size', 'max'])
+        for ticker, (rows, last) in grouped.iterrows():
+            checkpoint.mark_done(str(ticker), rows, last.date().isoformat())
+    stored = set(df['ticker'].astype(str)) if not df.empty else set()
+    for ticker in tickers:
+        if ticker in stored:
+            continue
+        if empty_ok:
+            checkpoint.mark_done(ticker, 0)
+        else:
+            checkpoint.mark_failed(ticker, 'no data returned')
+    checkpoint.save()
@@ -0,0 +1,216 @@
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from instrumentation import count, stage
+
+# A unit of work: the tickers requested together plus any extra keyword
+# arguments for the fetch function (e.g. period/start/end).
+Batch = namedtuple('Batch', ['tickers', 'kwargs'])
+
+# Sentinel telling the writer thread that no more batches will arrive
+_DONE = object()
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`.
+    `acquire()` blocks until enough tokens are available, which replaces the
+    fixed `time.sleep()` between requests with a shared request budget.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` tokens have been taken from the bucket."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def make_batches(tickers, batch_size, **fetch_kwargs):
+    """
+    Splits a ticker list into multi-symbol batches.
+
+    Args:
+        tickers (list): Ticker strings, e.g. ['AAPL', 'MSFT', ...]
+        batch_size (int): Maximum number of tickers per request.
+        **fetch_kwargs: Extra arguments passed to the fetch function for every batch.
+
+    Returns:
+        list: List of Batch tuples.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    return [
+        Batch(list(tickers[i:i + batch_size]), dict(fetch_kwargs))
+        for i in range(0, len(tickers), batch_size)
+    ]
+
+
+def split_by_ticker(frame, tickers):
+    """
+    Splits a multi-ticker download frame into one frame per ticker.
+
+    Handles the `group_by='ticker'` layout (ticker on the first column level),
+    the default `group_by='column'` layout (ticker on the second level) and the
+    flat single-ticker layout returned by older yfinance versions.
+
+    Returns:
+        dict: {ticker: DataFrame} for every ticker that returned rows.
+    """
+    if frame is None or frame.empty:
+        return {}
+
+    if not isinstance(frame.columns, pd.MultiIndex):
+        return {tickers[0]: frame} if len(tickers) == 1 else {}
+
+    level = 0 if set(tickers) & set(frame.columns.get_level_values(0)) else 1
+    available = set(frame.columns.get_level_values(level))
+
+    result = {}
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        part = frame.xs(ticker, axis=1, level=level).dropna(how='all')
+        if not part.empty:
+            result[ticker] = part
+    return result
+
+
+class BatchDownloader:
+    """
+    Two-stage pipeline: a pool of fetch workers and a single writer thread.
+
+    Fetch workers pull batches, wait for a rate-limit token and call
+    `fetch(tickers, **kwargs)`, retrying with exponential backoff. Results are
+    pushed into a bounded queue that the writer drains by calling
+    `write(batch, result)`, so database writes run while the next batches are
+    still downloading.
+
+    Args:
+        fetch (callable): fetch(tickers, **kwargs) -> result (usually a DataFrame).
+        write (callable): write(batch, result) -> None, runs on the writer thread.
+        batch_size (int): Tickers per request.
+        workers (int): Number of concurrent fetch workers.
+        rate (float): Requests per second allowed across all workers.
+        burst (int): Token-bucket capacity (defaults to `rate`).
+        retries (int): Attempts per batch after the first failure.
+        backoff (float): Base delay in seconds for exponential backoff.
+        queue_size (int): Maximum fetched batches waiting for the writer.
+    """
+
+    def __init__(self, fetch, write, batch_size=50, workers=4, rate=2.0, burst=None,
+                 retries=3, backoff=1.0, queue_size=8, sleep=time.sleep):
+        self.fetch = fetch
+        self.write = write
+        self.batch_size = batch_size
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.queue_size = queue_size
+        self._sleep = sleep
+        self.limiter = TokenBucket(rate, burst)
+
+    def run(self, tickers, **fetch_kwargs):
+        """Downloads and writes all tickers. Returns a summary dict (see run_batches)."""
+        return self.run_batches(make_batches(tickers, self.batch_size, **fetch_kwargs))
+
+    def run_batches(self, batches):
+        """
+        Runs the pipeline over pre-built batches.
+
+        Returns:
+            dict: {'batches': int, 'tickers': int, 'failed': {ticker: error}, 'seconds': float}
+        """
+        start = time.perf_counter()
+        total = len(batches)
+        failed = {}
+        failed_lock = threading.Lock()
+        results = queue.Queue(maxsize=self.queue_size)
+
+        def record_failure(batch, error):
+            with failed_lock:
+                for ticker in batch.tickers:
+                    failed[ticker] = str(error)
+
+        def writer():
+            done = 0
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    return
+                batch, result = item
+                done += 1
+                try:
+                    with stage('store'):
+                        self.write(batch, result)
+                    print(f"[{done}/{total}] Stored batch of {len(batch.tickers)} tickers.")
+                except Exception as e:
+                    print(f"[{done}/{total}] Failed to store batch: {e}")
+                    record_failure(batch, e)
+
+        def worker(batch):
+            try:
+                results.put((batch, self._fetch_with_retry(batch)))
+            except Exception as e:
+                print(f"Failed to fetch {batch.tickers[0]}..{batch.tickers[-1]}: {e}")
+                record_failure(batch, e)
+
+        writer_thread = threading.Thread(target=writer, name='batch-writer', daemon=True)
+        writer_thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(worker, batches))
+        finally:
+            results.put(_DONE)
+            writer_thread.join()
+
+        return {
+            'batches': total,
+            'tickers': sum(len(b.tickers) for b in batches),
+            'failed': failed,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def _fetch_with_retry(self, batch):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                with stage('fetch'):
+                    return self.fetch(batch.tickers, **batch.kwargs)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                count('retries', stage='fetch')
+                # Exponential backoff with jitter so workers don't retry in lockstep
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+                attempt += 1
+                self._sleep(delay)
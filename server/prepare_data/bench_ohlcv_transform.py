@@ -0,0 +1,74 @@
+"""
+Benchmark: per-ticker DataFrame copying vs the vectorized to_long_frame reshape.
+
+Builds a synthetic yf.download(group_by='ticker') frame (default 500 tickers
+x 5 years of trading days) and reports wall time, peak Python allocations
+and the size of the resulting long frame for both approaches.
+
+    python bench_ohlcv_transform.py [--tickers 500] [--days 1260]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from batch_downloader import split_by_ticker
+from ohlcv_transform import to_long_frame
+
+
+def synthetic_download(n_tickers, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2019-01-01', periods=n_days, name='Date')
+    tickers = [f"T{i:03d}" for i in range(n_tickers)]
+    fields = ['Open', 'High', 'Low', 'Close', 'Volume']
+    values = rng.uniform(10, 500, size=(n_days, n_tickers * len(fields)))
+    columns = pd.MultiIndex.from_product([tickers, fields], names=['Ticker', 'Price'])
+    return pd.DataFrame(values, index=dates, columns=columns), tickers
+
+
+def per_ticker_loop(wide, tickers):
+    """The previous approach: copy columns into a fresh frame for every ticker."""
+    frames = []
+    for ticker, hist in split_by_ticker(wide, tickers).items():
+        hist = hist.reset_index()
+        df_insert = pd.DataFrame()
+        df_insert['time'] = hist['Date']
+        df_insert['ticker'] = ticker
+        df_insert['open'] = hist['Open']
+        df_insert['high'] = hist['High']
+        df_insert['low'] = hist['Low']
+        df_insert['close'] = hist['Close']
+        df_insert['volume'] = hist['Volume']
+        frames.append(df_insert)
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run(n_tickers, n_days):
+    wide, tickers = synthetic_download(n_tickers, n_days)
+    print(f"{n_tickers} tickers x {n_days} days = {n_tickers * n_days:,} rows")
+
+    for name, func in [('per-ticker loop', per_ticker_loop), ('to_long_frame', to_long_frame)]:
+        result, seconds, peak = measure(func, wide, tickers)
+        size = result.memory_usage(deep=True).sum()
+        print(f"  {name:<16} {seconds * 1000:9.1f} ms   peak alloc {peak / 2**20:8.1f} MiB   "
+              f"result {size / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--days', type=int, default=1260)
+    args = parser.parse_args()
+    run(args.tickers, args.days)
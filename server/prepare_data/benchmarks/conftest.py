@@ -0,0 +1,61 @@
+"""
+Shared setup for the offline benchmark suite.
+
+Each benchmark goes through the `measure` fixture, which runs it under
+pytest-benchmark and records p50/p99 latency per call and throughput in
+items per second. These are stored in the benchmark's extra_info (so
+--benchmark-json keeps them) and printed as a table at the end of the run.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Shared prepare_data modules live one directory up, the daily-update ones next to them
+sys.path.append(os.path.join(HERE, '..'))
+sys.path.append(os.path.join(HERE, '..', 'daily-update'))
+
+_results = []
+
+
+def latency_summary(samples, items=1):
+    """p50/p99 seconds per call and items/s at the median, from per-call timings."""
+    samples = np.asarray(samples, dtype='float64')
+    p50, p99 = np.percentile(samples, [50, 99])
+    return {
+        'calls': len(samples),
+        'p50_ms': p50 * 1e3,
+        'p99_ms': p99 * 1e3,
+        'items_per_call': items,
+        'throughput_per_s': items / p50 if p50 > 0 else float('inf'),
+    }
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """
+    measure(func, *args, items=N, **kwargs) -> func's result.
+
+    `items` is the work done per call (quotes, pages, rows) for throughput.
+    """
+    def run(func, *args, items=1, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+        if benchmark.stats is not None:
+            summary = latency_summary(benchmark.stats.stats.data, items)
+            benchmark.extra_info.update(summary)
+            _results.append((request.node.name, summary))
+        return result
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section('latency and throughput')
+    write(f"{'benchmark':<44} {'calls':>6} {'p50 ms':>10} {'p99 ms':>10} {'items/s':>14}")
+    for name, s in _results:
+        write(f"{name:<44} {s['calls']:>6} {s['p50_ms']:>10.3f} {s['p99_ms']:>10.3f} "
+              f"{s['throughput_per_s']:>14,.0f}")
@@ -0,0 +1,208 @@
+"""
+Offline benchmarks for the fetch -> extract -> reshape -> load path.
+
+Network sources are replayed from cassettes with injected latency, so the
+numbers are repeatable without Yahoo or set.or.th. DB loads run against
+an in-process stand-in that drains the COPY stream. Set BENCH_DATABASE_URL
+to load into a real local Postgres instead (e.g. the docker-compose trading DB).
+
+    pytest benchmarks --benchmark-only [--benchmark-json out.json]
+    BENCH_LATENCY_MS=50 pytest benchmarks --benchmark-only
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from bench_ohlcv_transform import synthetic_download
+from bulk_load import copy_dataframe
+from ohlcv_transform import to_long_frame
+from quote_engine import fetch_quotes
+from replay import Cassette, Latency, ReplayDownload, ReplayProvider, ReplaySession
+from scrape_set_stock import QUOTE_URL, scrape_set_stock_prices
+from set_quote_extract import extract_price
+
+SET_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'daily-update',
+                            'fixtures', 'set_quote')
+
+# Injected network delay per replayed call, in milliseconds (fixed + uniform jitter)
+LATENCY_MS = float(os.getenv('BENCH_LATENCY_MS', '2'))
+JITTER_MS = float(os.getenv('BENCH_JITTER_MS', '3'))
+
+N_QUOTES = 200
+N_TICKERS, N_DAYS = 100, 1260
+
+
+def latency():
+    return Latency(LATENCY_MS / 1e3, JITTER_MS / 1e3, seed=0)
+
+
+@pytest.fixture
+def quote_cassette(tmp_path):
+    cassette = Cassette('quotes', root=str(tmp_path), mode='replay')
+    rng = np.random.default_rng(0)
+    for i, price in enumerate(rng.uniform(5, 500, N_QUOTES)):
+        cassette.put(f"quote:S{i:03d}.BK", {'price': float(price)})
+    return cassette
+
+
+@pytest.fixture(scope='module')
+def set_pages():
+    with open(os.path.join(SET_FIXTURES, 'expected.json')) as f:
+        expected = json.load(f)
+    pages = {}
+    for name in expected:
+        with open(os.path.join(SET_FIXTURES, name), 'rb') as f:
+            pages[name.removesuffix('.html')] = f.read()
+    return pages, {name.removesuffix('.html'): price for name, price in expected.items()}
+
+
+@pytest.fixture
+def set_cassette(tmp_path, set_pages):
+    """The saved SET quote pages as recorded responses for their quote URLs."""
+    pages, _ = set_pages
+    cassette = Cassette('set', root=str(tmp_path), mode='replay')
+    for symbol, html in pages.items():
+        cassette.put(ReplaySession.key(QUOTE_URL.format(symbol=symbol)), {
+            'status': 200, 'headers': {'Content-Type': 'text/html'},
+            'body': cassette.write_blob(html, '.body'),
+        })
+    return cassette
+
+
+@pytest.fixture(scope='module')
+def download():
+    return synthetic_download(N_TICKERS, N_DAYS)
+
+
+# --- Quote fetching ---
+
+def test_quote_fetch(measure, quote_cassette):
+    provider = ReplayProvider(quote_cassette, latency=latency())
+    symbols = [f"S{i:03d}" for i in range(N_QUOTES)]
+
+    quotes = measure(fetch_quotes, symbols, 'SET', provider=provider, cache=None, items=N_QUOTES)
+
+    assert len(quotes) == N_QUOTES and all(q[s] is not None for q, s in zip(quotes, symbols))
+
+
+# --- HTML extraction ---
+
+def test_set_extract(measure, set_pages):
+    pages, expected = set_pages
+
+    def extract_all():
+        return {symbol: extract_price(html) for symbol, html in pages.items()}
+
+    assert measure(extract_all, items=len(pages)) == expected
+
+
+def test_set_scrape(measure, set_cassette, set_pages):
+    _, expected = set_pages
+    session = ReplaySession(set_cassette, latency=latency())
+    symbols = list(expected) * 10
+
+    result = measure(scrape_set_stock_prices, symbols, max_workers=8, session=session, items=len(symbols))
+
+    assert result[:len(expected)] == [{s: expected[s] or 0} for s in expected]
+
+
+# --- Historical reshaping ---
+
+def test_history_reshape(measure, download):
+    wide, tickers = download
+
+    long = measure(to_long_frame, wide, tickers, items=N_TICKERS * N_DAYS)
+
+    assert len(long) == N_TICKERS * N_DAYS
+
+
+def test_history_replay_download(measure, tmp_path, download):
+    wide, tickers = download
+    cassette = Cassette('history', root=str(tmp_path), mode='replay')
+    fetch = ReplayDownload(cassette, latency=latency())
+    fetch.put(ReplayDownload.key(tickers, period='5y'), wide)
+
+    long = measure(lambda: to_long_frame(fetch(tickers, period='5y'), tickers), items=N_TICKERS * N_DAYS)
+
+    assert len(long) == N_TICKERS * N_DAYS
+
+
+# --- DB bulk loads ---
+
+class StandInCursor:
+    def __init__(self, counter):
+        self.counter = counter
+
+    def execute(self, sql):
+        pass
+
+    def copy_expert(self, sql, buffer):
+        # Drain the stream the way the server would, counting rows
+        for _ in buffer:
+            self.counter['rows'] += 1
+
+
+class StandInConnection:
+    def __init__(self, counter):
+        self.counter = counter
+
+    def cursor(self):
+        return StandInCursor(self.counter)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StandInEngine:
+    """Minimal engine for copy_dataframe: a COPY sink that accepts everything."""
+
+    def __init__(self):
+        self.counter = {'rows': 0}
+
+    def raw_connection(self):
+        return StandInConnection(self.counter)
+
+
+@pytest.fixture
+def load_target():
+    url = os.getenv('BENCH_DATABASE_URL')
+    if not url:
+        yield StandInEngine(), 'bench_prices'
+        return
+
+    from sqlalchemy import create_engine, text
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS bench_prices (
+                time TIMESTAMPTZ NOT NULL, ticker TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume BIGINT,
+                PRIMARY KEY (time, ticker)
+            );
+        """))
+        conn.commit()
+    yield engine, 'bench_prices'
+    with engine.connect() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_prices;"))
+        conn.commit()
+    engine.dispose()
+
+
+def test_bulk_load(measure, load_target, download):
+    engine, table = load_target
+    wide, tickers = download
+    long = to_long_frame(wide, tickers)
+
+    stats = measure(copy_dataframe, engine, long, table, conflict_columns=['time', 'ticker'], items=len(long))
+
+    assert stats.rows == len(long)
@@ -0,0 +1,222 @@
+import io
+import time
+from collections import namedtuple
+
+from instrumentation import METRICS
+
+# Result of one bulk load: rows written, wall-clock seconds and throughput
+LoadStats = namedtuple('LoadStats', ['rows', 'seconds', 'rows_per_sec'])
+
+# Staging column numbering rows in COPY order, so the last duplicate wins the merge
+STAGE_ROW = '_stage_row'
+
+
+def quote_ident(name):
+    """Quotes a possibly schema-qualified identifier, e.g. asset.prices -> "asset"."prices"."""
+    return '.'.join('"' + part.replace('"', '""') + '"' for part in name.split('.'))
+
+
+def dataframe_to_csv_buffer(df, columns):
+    """
+    Serialises DataFrame columns into an in-memory CSV buffer for COPY.
+
+    Missing values are written as empty fields, which COPY reads as NULL.
+    Use nullable integer dtypes (e.g. 'Int64') for integer columns that may
+    hold NaN, otherwise pandas writes them as floats ("123.0").
+
+    float32 columns are widened to float64 first: their text form keeps only
+    ~7 significant digits, which would silently round DOUBLE PRECISION values.
+    """
+    float32 = [c for c in columns if df[c].dtype == 'float32']
+    if float32:
+        df = df.astype({c: 'float64' for c in float32})
+    buffer = io.StringIO()
+    df.to_csv(buffer, columns=columns, index=False, header=False, na_rep='')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_dataframe(engine, df, table, columns=None, conflict_columns=None,
+                   update=True, chunksize=100_000):
+    """
+    Bulk-loads a DataFrame into PostgreSQL with COPY FROM STDIN.
+
+    Without `conflict_columns` rows are copied straight into `table`.
+    With `conflict_columns` rows are copied into a temporary staging table
+    and merged with a single INSERT ... ON CONFLICT, which makes re-runs
+    idempotent (existing rows are updated, or left alone if `update=False`).
+    When `df` repeats a key, its last row wins.
+
+    Args:
+        engine: SQLAlchemy engine backed by psycopg2.
+        df (DataFrame): Rows to load.
+        table (str): Target table, optionally schema-qualified.
+        columns (list): Columns to load (defaults to all DataFrame columns).
+        conflict_columns (list): Primary/unique key columns for the merge.
+        update (bool): Update non-key columns on conflict instead of skipping.
+        chunksize (int): Rows serialised per COPY call, bounds buffer memory.
+
+    Returns:
+        LoadStats: rows loaded, seconds taken and rows per second.
+    """
+    columns = list(columns or df.columns)
+    rows = len(df)
+    if rows == 0:
+        return LoadStats(0, 0.0, 0.0)
+
+    start = time.perf_counter()
+    column_sql = ', '.join(quote_ident(c) for c in columns)
+    target = quote_ident(table)
+    staging = quote_ident('_stage_' + table.split('.')[-1])
+    copy_into = staging if conflict_columns else target
+
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        if conflict_columns:
+            cur.execute(f"CREATE TEMP TABLE {staging} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP; "
+                        f"ALTER TABLE {staging} ADD COLUMN {quote_ident(STAGE_ROW)} BIGSERIAL;")
+
+        copy_sql = f"COPY {copy_into} ({column_sql}) FROM STDIN WITH (FORMAT csv, NULL '')"
+        for offset in range(0, rows, chunksize):
+            chunk = df.iloc[offset:offset + chunksize]
+            cur.copy_expert(copy_sql, dataframe_to_csv_buffer(chunk, columns))
+
+        if conflict_columns:
+            cur.execute(merge_sql(target, staging, columns, conflict_columns, update))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        METRICS.count_error(e, 'load')
+        raise
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - start
+    stats = LoadStats(rows, seconds, rows / seconds if seconds > 0 else float('inf'))
+    METRICS.observe('load', seconds, table=table, method='copy')
+    METRICS.count('rows', rows, table=table)
+    print(f"Loaded {rows} rows into {table} in {seconds:.2f}s ({stats.rows_per_sec:,.0f} rows/s).")
+    return stats
+
+
+def merge_sql(target, staging, columns, conflict_columns, update=True):
+    """
+    Builds the INSERT ... SELECT ... ON CONFLICT statement that merges a staging table.
+
+    The staging table needs the STAGE_ROW column added by copy_dataframe.
+    """
+    column_sql = ', '.join(quote_ident(c) for c in columns)
+    key_sql = ', '.join(quote_ident(c) for c in conflict_columns)
+    action = conflict_action(columns, conflict_columns, update)
+
+    # DISTINCT ON keeps one row per key (ON CONFLICT cannot touch the same row twice);
+    # ordering by the staging row number makes that the last copied row
+    return (
+        f"INSERT INTO {target} ({column_sql}) "
+        f"SELECT DISTINCT ON ({key_sql}) {column_sql} FROM {staging} "
+        f"ORDER BY {key_sql}, {quote_ident(STAGE_ROW)} DESC "
+        f"ON CONFLICT ({key_sql}) {action};"
+    )
+
+
+def conflict_action(columns, conflict_columns, update=True):
+    """Builds the ON CONFLICT action: update every non-key column, or do nothing."""
+    value_columns = [c for c in columns if c not in conflict_columns]
+    if not update or not value_columns:
+        return "DO NOTHING"
+    assignments = ', '.join(f"{quote_ident(c)} = EXCLUDED.{quote_ident(c)}" for c in value_columns)
+    return f"DO UPDATE SET {assignments}"
+
+
+def validate_records(records, required=(), max_lengths=None):
+    """
+    Checks records before they are sent to the database.
+
+    Args:
+        records (list): Row dictionaries.
+        required (iterable): Keys that must be present and non-empty.
+        max_lengths (dict): {key: max string length}, mirroring VARCHAR sizes.
+
+    Returns:
+        tuple: (valid_records, errors) where errors is a list of
+        {'index': int, 'record': dict, 'error': str}.
+    """
+    max_lengths = max_lengths or {}
+    valid, errors = [], []
+
+    for index, record in enumerate(records):
+        problems = [f"missing {key}" for key in required if record.get(key) in (None, '')]
+        for key, limit in max_lengths.items():
+            value = record.get(key)
+            if isinstance(value, str) and len(value) > limit:
+                problems.append(f"{key} longer than {limit} characters")
+
+        if problems:
+            errors.append({'index': index, 'record': record, 'error': '; '.join(problems)})
+        else:
+            valid.append(record)
+    return valid, errors
+
+
+def upsert_records(engine, table, records, conflict_columns, columns=None, update=True, page_size=1000,
+                   server_values=None):
+    """
+    Upserts row dictionaries with batched multi-row INSERT ... ON CONFLICT statements.
+
+    Uses psycopg2's execute_values, so `page_size` rows travel in each
+    statement instead of one round-trip per row. Rows sharing a key are
+    collapsed (last one wins) because one statement cannot update the same
+    row twice. Everything runs in a single transaction.
+
+    Args:
+        engine: SQLAlchemy engine backed by psycopg2.
+        table (str): Target table, optionally schema-qualified.
+        records (list): Row dictionaries.
+        conflict_columns (list): Primary/unique key columns.
+        columns (list): Columns to write (defaults to the first record's keys).
+        update (bool): Update non-key columns on conflict instead of skipping.
+        page_size (int): Rows per INSERT statement.
+        server_values (dict): {column: SQL expression} evaluated by the database for
+            every row, e.g. {'updated_at': 'NOW()'}; also applied on conflict.
+
+    Returns:
+        LoadStats: rows written, seconds taken and rows per second.
+    """
+    from psycopg2.extras import execute_values
+
+    if not records:
+        return LoadStats(0, 0.0, 0.0)
+
+    server_values = server_values or {}
+    columns = [c for c in (columns or records[0].keys()) if c not in server_values]
+    deduped = {tuple(r[c] for c in conflict_columns): r for r in records}
+    values = [tuple(r.get(c) for c in columns) for r in deduped.values()]
+
+    all_columns = columns + list(server_values)
+    column_sql = ', '.join(quote_ident(c) for c in all_columns)
+    key_sql = ', '.join(quote_ident(c) for c in conflict_columns)
+    action = conflict_action(all_columns, conflict_columns, update)
+    sql = f"INSERT INTO {quote_ident(table)} ({column_sql}) VALUES %s ON CONFLICT ({key_sql}) {action}"
+    template = f"({', '.join(['%s'] * len(columns) + list(server_values.values()))})" if server_values else None
+
+    start = time.perf_counter()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, sql, values, template=template, page_size=page_size)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        METRICS.count_error(e, 'load')
+        raise
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - start
+    rows = len(values)
+    stats = LoadStats(rows, seconds, rows / seconds if seconds > 0 else float('inf'))
+    METRICS.observe('load', seconds, table=table, method='upsert')
+    METRICS.count('rows', rows, table=table)
+    print(f"Upserted {rows} rows into {table} in {seconds:.2f}s ({stats.rows_per_sec:,.0f} rows/s).")
+    return stats
@@ -0,0 +1,83 @@
+"""
+Benchmark: vectorized compute_positions vs a row-by-row average-cost loop.
+
+Generates a synthetic stock book (default 50,000 trades over 200 symbols)
+and reports the time to compute positions, average cost and realized P&L.
+
+    python bench_portfolio_valuation.py [--trades 50000] [--symbols 200]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from portfolio_valuation import KEY, compute_positions
+
+
+def synthetic_trades(n_trades, n_symbols, seed=0):
+    """Random BUY/SELL/DIVIDEND rows; sells never exceed the running position."""
+    rng = np.random.default_rng(seed)
+    symbols = rng.integers(0, n_symbols, n_trades)
+    sides = rng.choice(['BUY', 'SELL', 'DIVIDEND'], n_trades, p=[0.55, 0.4, 0.05])
+    amounts = rng.integers(1, 100, n_trades).astype(float)
+
+    # Cap sells at the running position so the book stays long-only
+    held = np.zeros(n_symbols)
+    for i in range(n_trades):
+        s = symbols[i]
+        if sides[i] == 'BUY':
+            held[s] += amounts[i]
+        elif sides[i] == 'SELL':
+            amounts[i] = held[s] if rng.random() < 0.1 else min(amounts[i], held[s])
+            held[s] -= amounts[i]
+            if amounts[i] == 0:
+                sides[i] = 'DIVIDEND'
+                amounts[i] = 1.0
+
+    return pd.DataFrame({
+        'book': 'stock',
+        'id': np.arange(1, n_trades + 1),
+        'time': pd.Timestamp('2020-01-01') + pd.to_timedelta(np.arange(n_trades), unit='min'),
+        'side': sides,
+        'symbol': [f"S{s:03d}" for s in symbols],
+        'market': 'US',
+        'amount': amounts,
+        'price': np.round(rng.uniform(10, 500, n_trades), 2),
+        'currency': 'USD',
+    })
+
+
+def reference_positions(trades):
+    """The straightforward per-trade loop compute_positions replaces."""
+    state = {}
+    for row in trades.sort_values(['time', 'id']).itertuples(index=False):
+        key = (row.book, row.symbol, row.market)
+        qty, basis, realized = state.get(key, (0.0, 0.0, 0.0))
+        if row.side == 'BUY':
+            qty, basis = qty + row.amount, basis + row.amount * row.price
+        elif row.side == 'SELL' and qty > 0:
+            sold = min(row.amount, qty)
+            avg = basis / qty
+            realized += sold * (row.price - avg)
+            qty, basis = qty - sold, basis - sold * avg
+        state[key] = (qty, basis, realized)
+    index = pd.MultiIndex.from_tuples(list(state), names=KEY)
+    return pd.DataFrame(list(state.values()), index=index, columns=['quantity', 'cost_basis', 'realized_pnl'])
+
+
+def run(n_trades, n_symbols):
+    trades = synthetic_trades(n_trades, n_symbols)
+    print(f"{n_trades:,} trades over {n_symbols} symbols")
+    for name, func in [('row loop', reference_positions), ('compute_positions', compute_positions)]:
+        start = time.perf_counter()
+        func(trades)
+        print(f"  {name:<18} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trades', type=int, default=50000)
+    parser.add_argument('--symbols', type=int, default=200)
+    args = parser.parse_args()
+    run(args.trades, args.symbols)
@@ -0,0 +1,72 @@
+"""
+Offline benchmark for the SET quote-page extractors.
+
+Runs every extractor over the saved pages in fixtures/set_quote, checks
+the result against expected.json and prints the time per page.
+
+    python bench_set_quote_extract.py [--repeat 200]
+"""
+import argparse
+import json
+import os
+import time
+
+from set_quote_extract import LxmlExtractor, RegexExtractor, SoupExtractor, extract_price, to_price
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'set_quote')
+
+
+class ChainExtractor:
+    """Wraps extract_price so the default chain is timed like a single extractor."""
+
+    name = 'chain'
+
+    def extract(self, html):
+        price = extract_price(html)
+        return None if price is None else str(price)
+
+
+def load_fixtures():
+    with open(os.path.join(FIXTURES, 'expected.json')) as f:
+        expected = json.load(f)
+    pages = {}
+    for name in expected:
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            pages[name] = f.read()
+    return pages, expected
+
+
+def run(repeat):
+    pages, expected = load_fixtures()
+    extractors = [RegexExtractor(), LxmlExtractor(), SoupExtractor(), ChainExtractor()]
+    baseline = None
+
+    print(f"{len(pages)} pages x {repeat} repeats")
+    for extractor in extractors:
+        mismatches = []
+        for name, html in pages.items():
+            got = to_price(extractor.extract(html))
+            # The regex path may decline pages with nested markup; the chain falls back
+            if got != expected[name] and not (extractor.name == 'regex' and got is None):
+                mismatches.append(name)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for html in pages.values():
+                extractor.extract(html)
+        per_page = (time.perf_counter() - start) / (repeat * len(pages)) * 1e6
+
+        if baseline is None and extractor.name == 'soup':
+            baseline = per_page
+        status = 'OK' if not mismatches else f"MISMATCH {mismatches}"
+        print(f"  {extractor.name:<6} {per_page:10.1f} us/page  {status}")
+        extractor.per_page = per_page
+
+    for extractor in extractors:
+        print(f"  {extractor.name:<6} speedup vs soup: {baseline / extractor.per_page:6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    run(parser.parse_args().repeat)
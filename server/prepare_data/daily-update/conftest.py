@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import quote_engine
+from replay import DEFAULT_DIR, Cassette, ReplayProvider
+
+
+@pytest.fixture
+def recorded_quotes(monkeypatch):
+    """
+    Serves yfinance quotes from prepare_data/fixtures/replay/yahoo_quotes instead of the network.
+
+    The committed quotes are a fixed snapshot; REPLAY_MODE=record refreshes
+    them from Yahoo and REPLAY_MODE=live bypasses the cassette. A missing
+    cassette fails the test instead of silently skipping its coverage.
+    """
+    mode = os.getenv('REPLAY_MODE', 'replay')
+    if mode == 'live':
+        yield None
+        return
+    cassette = Cassette('yahoo_quotes', root=DEFAULT_DIR, mode=mode)
+    if not cassette.recording and not len(cassette):
+        pytest.fail(f"No recorded Yahoo quotes in {cassette.path}; run once with REPLAY_MODE=record")
+    monkeypatch.setattr(quote_engine, 'DEFAULT_PROVIDER', ReplayProvider(cassette, quote_engine.DEFAULT_PROVIDER))
+    yield cassette
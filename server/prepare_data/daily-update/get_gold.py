@@ -1,32 +1,23 @@
-import yfinance as yf
+import os
+import sys
 
-def get_gold_price():
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gold import latest_price
+from quote_cache import DEFAULT_CACHE
+
+def get_gold_price(cache=DEFAULT_CACHE, engine=None):
     """
-    Scrapes the latest Gold Futures (GC=F) price using yfinance.
-    
+    Gets the latest Gold Futures (GC=F) price in USD per ounce.
+
+    Args:
+        cache (QuoteCache): Shared quote cache, or None to always hit the network.
+        engine: Optional trading DB engine; the newest stored bar is used if the quote fails.
+
     Returns:
-        float: The latest market price of gold.
+        float: The latest market price of gold, or None.
     """
-    try:
-        # 'GC=F' is the ticker symbol for Gold Futures
-        gold_ticker = yf.Ticker("GC=F")
-        
-        # Get the market data for the last 1 day
-        data = gold_ticker.history(period="1d")
-        
-        # Check if data is available
-        if data.empty:
-            print("No data found for symbol GC=F")
-            return None
-            
-        # Extract the latest 'Close' price
-        latest_price = data['Close'].iloc[-1]
-        
-        return float(latest_price)
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    return latest_price(cache=cache, engine=engine)
 
 # --- Usage Example ---
 def test_gold_price():
@@ -1,39 +1,28 @@
-import yfinance as yf
+import os
+import sys
 
-def get_set_prices(symbols):
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from quote_cache import DEFAULT_CACHE
+from quote_engine import fetch_quotes
+
+def get_set_prices(symbols, max_concurrency=16, timeout=10.0, cache=DEFAULT_CACHE):
     """
     Fetches the current price for a list of SET (Thailand) stocks using yfinance.
     
     Args:
         symbols (list): List of symbol strings, e.g., ['KTC', 'LH', 'KBANK']
+        max_concurrency (int): Maximum number of quotes requested at once.
+        timeout (float): Seconds allowed per symbol.
+        cache (QuoteCache): Shared quote cache, or None to always hit the network.
         
     Returns:
         list: List of dictionaries, e.g., [{'KTC': 43.50}, {'LH': 9.80}]
     """
-    results = []
-    
-    for symbol in symbols:
-        # 1. Append the suffix '.BK' for Thailand stocks
-        ticker_symbol = f"{symbol.upper()}.BK"
-        
-        try:
-            stock = yf.Ticker(ticker_symbol)
-            
-            # 2. Get the latest price efficiently
-            # fast_info.last_price gets the most recent trade or closing price
-            price = stock.fast_info.last_price
-            
-            if price is not None:
-                # Return the original symbol as key (without .BK)
-                results.append({symbol.upper(): round(price, 2)})
-            else:
-                results.append({symbol.upper(): None})
-                
-        except Exception as e:
-            print(f"Error fetching {symbol}: {e}")
-            results.append({symbol.upper(): None})
-            
-    return results
+    # The engine appends the '.BK' suffix for the SET market;
+    # results are keyed by the original symbol (without .BK)
+    return fetch_quotes([symbol.upper() for symbol in symbols], 'SET',
+                        max_concurrency=max_concurrency, timeout=timeout, cache=cache)
 
 # --- Usage Example ---
 def test_set_prices():
@@ -1,71 +1,42 @@
-import yfinance as yf
+import os
+import sys
 
-def get_nasdaq_prices(symbols):
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from quote_cache import DEFAULT_CACHE
+from quote_engine import fetch_quotes
+
+def get_nasdaq_prices(symbols, max_concurrency=16, timeout=10.0, cache=DEFAULT_CACHE):
     """
     Fetches the latest market price for a list of NASDAQ symbols.
     
     Args:
         symbols (list): A list of symbol strings, e.g., ['NVDA', 'AAPL', 'TSLA']
+        max_concurrency (int): Maximum number of quotes requested at once.
+        timeout (float): Seconds allowed per symbol.
+        cache (QuoteCache): Shared quote cache, or None to always hit the network.
         
     Returns:
         list: A list of dictionaries, e.g., [{'NVDA': 120.50}, {'AAPL': 180.00}]
     """
-    results = []
-    
-    for symbol in symbols:
-        try:
-            # Initialize the Ticker object
-            ticker = yf.Ticker(symbol)
-            
-            # fast_info is the most efficient way to get the latest price 
-            # without downloading historical dataframes.
-            # 'last_price' covers the most recent close or real-time price if market is open.
-            price = ticker.fast_info.last_price
-            
-            if price:
-                results.append({symbol: round(price, 2)})
-            else:
-                # Fallback if fast_info fails (e.g., delisted stock)
-                results.append({symbol: None})
-                
-        except Exception as e:
-            # Handle invalid symbols or connection errors
-            print(f"Error fetching {symbol}: {e}")
-            results.append({symbol: None})
-            
-    return results
+    # fast_info.last_price covers the most recent close or real-time price if market is open.
+    # Invalid or delisted symbols come back as None.
+    return fetch_quotes(symbols, 'NASDAQ', max_concurrency=max_concurrency, timeout=timeout, cache=cache)
 
-def get_nyse_prices(symbols):
+def get_nyse_prices(symbols, max_concurrency=16, timeout=10.0, cache=DEFAULT_CACHE):
     """
     Fetches the latest market price for a list of NYSE symbols.
     
     Args:
         symbols (list): A list of symbol strings, e.g., ['BA', 'JPM', 'KO']
+        max_concurrency (int): Maximum number of quotes requested at once.
+        timeout (float): Seconds allowed per symbol.
+        cache (QuoteCache): Shared quote cache, or None to always hit the network.
         
     Returns:
         list: A list of dictionaries, e.g., [{'BA': 145.20}, {'JPM': 170.50}]
     """
-    results = []
-    
-    for symbol in symbols:
-        try:
-            # Initialize the Ticker object
-            ticker = yf.Ticker(symbol)
-            
-            # fast_info.last_price provides the most recent trade price
-            # This works for both Real-time (during market hours) and Closing price
-            price = ticker.fast_info.last_price
-            
-            if price:
-                results.append({symbol: round(price, 2)})
-            else:
-                results.append({symbol: None})
-                
-        except Exception as e:
-            print(f"Error fetching {symbol}: {e}")
-            results.append({symbol: None})
-            
-    return results
+    return fetch_quotes(symbols, 'NYSE', max_concurrency=max_concurrency, timeout=timeout, cache=cache)
 
 # --- Usage Example ---
 
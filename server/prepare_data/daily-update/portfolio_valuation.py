@@ -0,0 +1,327 @@
+"""
+Portfolio valuation over the books tables.
+
+Loads stock, crypto and gold transactions in one pass per book, computes
+positions with the average-cost method using grouped NumPy/pandas
+operations (no per-trade Python loop), and marks open positions to market
+with the daily-update quote fetchers.
+
+    python portfolio_valuation.py [--no-prices]
+
+Average cost: a BUY adds qty * price to the cost basis; a SELL scales the
+basis by (1 - sold / held) and realizes sold * (price - average cost).
+Within one holding period the basis after trade t is
+F_t * cumsum(buy_cost / F) where F is the running product of the sell
+factors, so the whole book is a few cumsum/cumprod calls. A holding period
+ends whenever the position returns to zero. Short positions are not modelled:
+selling more than is held closes the position.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from db import get_engine
+from fx import load_rates
+from gold import GOLD_SYMBOL, fine_ounces
+
+from run_daily_update import MARKET_CURRENCIES, default_fetchers, market_inference
+
+KEY = ['book', 'symbol', 'market']
+TRADE_COLUMNS = ['book', 'id', 'time', 'side', 'symbol', 'market', 'amount', 'price', 'currency']
+STATE_COLUMNS = ['quantity', 'cost_basis', 'realized_pnl', 'dividends', 'currency', 'last_id', 'trades']
+
+# Quantities below this are treated as a closed position
+EPSILON = 1e-9
+
+OPEN = 'OPEN'  # synthetic opening row carrying a previous position into an incremental run
+
+
+def books_queries(conn):
+    """SELECT statements per book, each returning TRADE_COLUMNS (gold adds purity/unit)."""
+    joins, market = market_inference(conn)
+    return {
+        'stock': f"""
+            SELECT b.id, b.created_at AS time, b.side::text AS side, UPPER(b.symbol) AS symbol,
+                   {market} AS market, b.amount, b.price, b.currency
+            FROM asset.stock_books b {joins}
+            WHERE b.id > :last_id
+        """,
+        'crypto': """
+            SELECT id, created_at AS time, side::text AS side, UPPER(symbol) AS symbol,
+                   'CRYPTO' AS market, amount, price, currency
+            FROM asset.crypto_books
+            WHERE id > :last_id
+        """,
+        'gold': """
+            SELECT id, created_at AS time, side::text AS side, gold_purity, unit,
+                   amount, price, currency
+            FROM asset.gold_books
+            WHERE id > :last_id
+        """,
+    }
+
+
+def normalize_gold(df):
+    """
+    Converts gold_books rows to fine troy ounces of GC=F.
+
+    The amount becomes weight * purity in ounces and the price is rescaled so
+    amount * price (the cash paid) is unchanged.
+    """
+    ounces = fine_ounces(df['amount'], df['unit'].to_numpy(dtype=object), df['gold_purity'])
+    out = df.assign(symbol=GOLD_SYMBOL, market='GOLD')
+    out['price'] = np.where(ounces != 0, df['amount'] * df['price'] / np.where(ounces != 0, ounces, 1.0), 0.0)
+    out['amount'] = ounces
+    return out
+
+
+def load_transactions(engine, since=None):
+    """
+    Loads book transactions in bulk, one query per book.
+
+    Args:
+        engine: SQLAlchemy engine for the asset database.
+        since (dict): {book: last id already processed}; only newer rows are read.
+
+    Returns:
+        DataFrame: TRADE_COLUMNS, amount/price as float64.
+    """
+    since = since or {}
+    frames = []
+    with engine.connect() as conn:
+        for book, sql in books_queries(conn).items():
+            df = pd.read_sql_query(text(sql), conn, params={'last_id': int(since.get(book, 0))})
+            if df.empty:
+                continue
+            df[['amount', 'price']] = df[['amount', 'price']].astype('float64')
+            if book == 'gold':
+                df['gold_purity'] = df['gold_purity'].astype('float64')
+                df = normalize_gold(df)
+            frames.append(df.assign(book=book)[TRADE_COLUMNS])
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype='float64' if c in ('amount', 'price') else 'object')
+                             for c in TRADE_COLUMNS})
+    return pd.concat(frames, ignore_index=True)
+
+
+def _opening_rows(state):
+    """Turns previous positions into OPEN rows that replay their quantity and basis."""
+    state = state.reset_index()
+    return pd.DataFrame({
+        'book': state['book'], 'symbol': state['symbol'], 'market': state['market'],
+        'id': state['last_id'], 'time': pd.NaT, 'side': OPEN,
+        'amount': state['quantity'], 'price': 0.0, 'currency': state['currency'],
+        '_basis': state['cost_basis'], '_realized': state['realized_pnl'],
+        '_dividends': state['dividends'], '_trades': state['trades'], '_order': 0,
+    })
+
+
+def _grouped_cumsum(values, starts, counts):
+    """Cumulative sum restarting at every group start (rows sorted by group)."""
+    total = np.cumsum(values)
+    before = np.r_[0.0, total[:-1]][starts]
+    return total - np.repeat(before, counts)
+
+
+def compute_positions(trades, state=None):
+    """
+    Computes positions, average cost and realized P&L per (book, symbol, market).
+
+    Args:
+        trades (DataFrame): TRADE_COLUMNS rows, in any order.
+        state (DataFrame): Previous compute_positions result; `trades` then only
+            needs the transactions added since (see `since_ids`).
+
+    Returns:
+        DataFrame indexed by KEY with quantity, cost_basis, avg_cost,
+        realized_pnl, dividends, currency, last_id and trades.
+        It is also the state for the next incremental run.
+    """
+    df = trades.assign(_basis=0.0, _realized=0.0, _dividends=0.0, _trades=1, _order=1)
+    if state is not None and not state.empty:
+        df = pd.concat([_opening_rows(state), df], ignore_index=True)
+    if df.empty:
+        return pd.DataFrame(columns=STATE_COLUMNS + ['avg_cost'],
+                            index=pd.MultiIndex.from_tuples([], names=KEY))
+
+    # One integer code per position, then opening rows first and trades in booking order
+    codes = df.groupby(KEY, sort=False).ngroup().to_numpy()
+    times = df['time'].to_numpy(dtype='datetime64[ns]').view('int64')
+    ids = df['id'].to_numpy(dtype='int64')
+    order = np.lexsort((ids, times, df['_order'].to_numpy(), codes))
+    codes, ids = codes[order], ids[order]
+
+    side = df['side'].to_numpy(dtype='U8')[order]
+    amount = df['amount'].to_numpy(dtype='float64')[order]
+    price = df['price'].to_numpy(dtype='float64')[order]
+    size = np.abs(amount)
+
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    starts = np.flatnonzero(first)
+    counts = np.diff(np.r_[starts, len(codes)])
+    ends = starts + counts - 1
+
+    is_open = side == OPEN
+    transfer = side == 'TRANSFER'
+    # A TRANSFER moves shares in (positive amount, at its price) or out (negative, at average cost)
+    adds = (side == 'BUY') | is_open | (transfer & (amount > 0))
+    is_sell = side == 'SELL'
+    removes = is_sell | (transfer & (amount < 0))
+
+    signed = np.where(adds, size, 0.0) - np.where(removes, size, 0.0)
+    buy_cost = np.where(is_open, df['_basis'].to_numpy()[order], np.where(adds, size * price, 0.0))
+
+    qty_after = _grouped_cumsum(signed, starts, counts)
+    qty_before = qty_after - signed
+
+    # Fraction of the basis kept by each row; oversells close the position
+    held = qty_before > EPSILON
+    factor = np.ones_like(signed)
+    np.divide(size, qty_before, out=factor, where=removes & held)
+    factor = np.where(removes & held, np.clip(1.0 - factor, 0.0, 1.0), 1.0)
+
+    # A holding period starts at each group's first row and whenever the position was flat
+    period = np.cumsum(first | ~held)
+    kept = pd.Series(factor).groupby(period).cumprod().to_numpy()
+    scaled = np.zeros_like(buy_cost)
+    np.divide(buy_cost, kept, out=scaled, where=buy_cost != 0)
+    basis_after = kept * pd.Series(scaled).groupby(period).cumsum().to_numpy()
+
+    basis_before = np.where(first, 0.0, np.r_[0.0, basis_after[:-1]])
+    avg_before = np.zeros_like(basis_before)
+    np.divide(basis_before, qty_before, out=avg_before, where=held)
+    sold = np.where(is_sell, np.minimum(size, np.maximum(qty_before, 0.0)), 0.0)
+
+    realized = df['_realized'].to_numpy()[order] + sold * (price - avg_before)
+    dividends = df['_dividends'].to_numpy()[order] + np.where(side == 'DIVIDEND', amount * price, 0.0)
+
+    keys = df[KEY].take(order[starts])
+    positions = pd.DataFrame({
+        'quantity': qty_after[ends],
+        'cost_basis': basis_after[ends],
+        'realized_pnl': np.add.reduceat(realized, starts),
+        'dividends': np.add.reduceat(dividends, starts),
+        'currency': df['currency'].to_numpy()[order[ends]],
+        'last_id': np.maximum.reduceat(ids, starts),
+        'trades': np.add.reduceat(df['_trades'].to_numpy(dtype='int64')[order], starts),
+    }, index=pd.MultiIndex.from_frame(keys))
+
+    closed = np.abs(positions['quantity'].to_numpy()) <= EPSILON
+    positions.loc[closed, ['quantity', 'cost_basis']] = 0.0
+    positions['avg_cost'] = (positions['cost_basis'] / positions['quantity']).where(~closed)
+    return positions
+
+
+def since_ids(state):
+    """Last processed transaction id per book, for load_transactions(since=...)."""
+    if state is None or state.empty:
+        return {}
+    return state.groupby(level='book')['last_id'].max().astype(int).to_dict()
+
+
+async def fetch_marks(positions, fetchers=None):
+    """
+    Fetches the latest price of every open position, one concurrent request per market.
+
+    Returns:
+        dict: {(symbol, market): price or None}
+    """
+    fetchers = fetchers or default_fetchers()
+    open_positions = positions[positions['quantity'].abs() > EPSILON].reset_index()
+    wanted = open_positions.groupby('market')['symbol'].unique()
+
+    async def fetch_market(market, symbols):
+        fetcher = fetchers.get(market)
+        prices = await fetcher(list(symbols)) if fetcher else [None] * len(symbols)
+        return {(s, market): p for s, p in zip(symbols, prices)}
+
+    marks = {}
+    for result in await asyncio.gather(*(fetch_market(m, s) for m, s in wanted.items())):
+        marks.update(result)
+    return marks
+
+
+def mark_to_market(positions, marks, fx=None):
+    """
+    Adds price, fx_rate, market_value, unrealized_pnl and total_pnl columns.
+
+    Args:
+        positions (DataFrame): compute_positions result.
+        marks (dict): {(symbol, market): price}; missing prices leave the values NaN.
+        fx (RateTable): Converts quote-currency prices into each position's book
+            currency at the latest rate. Without it prices are used as quoted.
+    """
+    index = positions.index.droplevel('book')
+    price = pd.Series(index.map(lambda key: marks.get(key)), index=positions.index, dtype='float64')
+    quote_currency = [MARKET_CURRENCIES.get(m) for m in index.get_level_values('market')]
+    valued = positions.assign(price=price, quote_currency=quote_currency, fx_rate=1.0)
+
+    if fx is not None:
+        # One lookup per (quote, book) currency pair, not per position
+        pairs = valued.groupby(['quote_currency', 'currency'], dropna=True).indices
+        rates = np.ones(len(valued))
+        for (source, target), rows in pairs.items():
+            try:
+                rates[rows] = fx.latest(source, target)
+            except KeyError:
+                print(f"No FX rate for {source}->{target}; leaving those positions unvalued.")
+                rates[rows] = np.nan
+        valued['fx_rate'] = rates
+
+    valued['market_value'] = valued['quantity'] * valued['price'] * valued['fx_rate']
+    valued['unrealized_pnl'] = valued['market_value'] - valued['cost_basis']
+    valued['total_pnl'] = valued['realized_pnl'] + valued['dividends'] + valued['unrealized_pnl'].fillna(0.0)
+    return valued
+
+
+def value_portfolio(engine, state=None, fetchers=None, with_prices=True, fx=None):
+    """
+    Recomputes positions (incrementally when `state` is given) and marks them to market.
+
+    Returns:
+        tuple: (valued positions DataFrame, {stage: seconds})
+    """
+    timings = {}
+    start = time.perf_counter()
+    trades = load_transactions(engine, since_ids(state))
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    positions = compute_positions(trades, state) if not trades.empty or state is None else state
+    timings['positions'] = time.perf_counter() - start
+
+    marks = {}
+    if with_prices and not positions.empty:
+        start = time.perf_counter()
+        marks = asyncio.run(fetch_marks(positions, fetchers))
+        timings['prices'] = time.perf_counter() - start
+    return mark_to_market(positions, marks, fx), timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Value the books tables: positions, average cost and P&L.")
+    parser.add_argument('--no-prices', action='store_true', help="Skip marking positions to market.")
+    parser.add_argument('--no-fx', action='store_true', help="Use quoted prices without currency conversion.")
+    args = parser.parse_args()
+
+    fx = None
+    if not args.no_fx:
+        try:
+            fx = load_rates(get_engine('trading'))
+        except Exception as e:
+            print(f"FX rates unavailable, valuing in quote currency: {e}")
+
+    valued, timings = value_portfolio(get_engine('asset'), with_prices=not args.no_prices, fx=fx)
+    columns = ['quantity', 'avg_cost', 'cost_basis', 'price', 'fx_rate', 'market_value',
+               'unrealized_pnl', 'realized_pnl', 'dividends', 'currency', 'quote_currency']
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(valued[columns].round(4).to_string())
+    print("\n" + ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()))
@@ -0,0 +1,282 @@
+"""
+Daily price update pipeline.
+
+Reads the symbols held in the books tables, groups them by market, fetches
+every market concurrently and streams each chunk of quotes into
+asset.price_snapshots as soon as it arrives.
+
+    python run_daily_update.py [--chunk-size 50] [--concurrency 16] [--dry-run]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import time
+from collections import defaultdict
+
+import pandas as pd
+from sqlalchemy import text
+
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bulk_load import copy_dataframe
+from db import ensure_schema, get_engine
+from gold import GOLD_SYMBOL
+from instrumentation import count, job_run
+from quote_cache import DEFAULT_CACHE
+from quote_engine import fetch_prices_async
+
+from get_gold import get_gold_price
+from scrape_set_stock import scrape_set_stock_prices
+
+SNAPSHOT_TABLE = 'asset.price_snapshots'
+
+# Quote currency per market
+MARKET_CURRENCIES = {'SET': 'THB', 'MAI': 'THB', 'NASDAQ': 'USD', 'NYSE': 'USD', 'US': 'USD', 'GOLD': 'USD',
+                     'CRYPTO': 'USD'}
+
+
+def init_db(engine):
+    """Creates the price snapshot table if it doesn't exist."""
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS asset.price_snapshots (
+                time TIMESTAMPTZ NOT NULL,
+                symbol VARCHAR(20) NOT NULL,
+                market VARCHAR(50) NOT NULL,
+                price DOUBLE PRECISION,
+                currency VARCHAR(10),
+                PRIMARY KEY (time, symbol, market)
+            );
+        """))
+        conn.commit()
+
+def signed_amount(alias=None):
+    """
+    SQL for a books row's effect on the position: BUY adds, SELL removes and
+    TRANSFER carries its own sign, as in portfolio_valuation.
+    """
+    column = f"{alias}." if alias else ''
+    return (f"CASE CAST({column}side AS TEXT) WHEN 'BUY' THEN ABS({column}amount) "
+            f"WHEN 'SELL' THEN -ABS({column}amount) "
+            f"WHEN 'TRANSFER' THEN {column}amount ELSE 0 END")
+
+def table_exists(conn, name):
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name}).scalar()
+
+def market_inference(conn, alias='b'):
+    """
+    SQL pieces that resolve a books row's market.
+
+    The row's own market wins when set; otherwise it is inferred from
+    asset.set_symbols (SET) or asset.sp500_symbols (US) when those tables
+    exist, defaulting to US.
+
+    Returns:
+        tuple: (join clauses, market expression) for a query over `<books> {alias}`.
+    """
+    joins, fallbacks = [], []
+    if table_exists(conn, 'asset.set_symbols'):
+        joins.append(f"LEFT JOIN asset.set_symbols s ON s.symbol = {alias}.symbol")
+        fallbacks.append("WHEN s.symbol IS NOT NULL THEN 'SET'")
+    if table_exists(conn, 'asset.sp500_symbols'):
+        joins.append(f"LEFT JOIN asset.sp500_symbols u ON u.symbol = {alias}.symbol")
+        fallbacks.append("WHEN u.symbol IS NOT NULL THEN 'US'")
+    inferred = f"CASE {' '.join(fallbacks)} END" if fallbacks else "NULL"
+    return ' '.join(joins), f"COALESCE(NULLIF(UPPER({alias}.market), ''), {inferred}, 'US')"
+
+def load_watchlist(engine):
+    """
+    Reads held symbols from the books tables, grouped by market.
+
+    Only open positions count: a symbol is held while its signed quantity
+    (see signed_amount) is positive, so fully sold positions aren't quoted.
+    stock_books markets are resolved by market_inference.
+    Crypto symbols are listed under CRYPTO; gold is included while any
+    (unit, purity) holding in asset.gold_books is open.
+
+    Returns:
+        dict: {market: [symbols]}, e.g. {'SET': ['KTC'], 'NASDAQ': ['NVDA'], 'GOLD': ['GC=F']}
+    """
+    with engine.connect() as conn:
+        joins, market = market_inference(conn)
+        rows = conn.execute(text(f"""
+            SELECT UPPER(b.symbol) AS symbol, {market} AS market
+            FROM asset.stock_books b
+            {joins}
+            GROUP BY 1, 2
+            HAVING SUM({signed_amount('b')}) > 0
+        """)).fetchall()
+        crypto = conn.execute(text(f"""
+            SELECT UPPER(symbol) FROM asset.crypto_books
+            GROUP BY 1
+            HAVING SUM({signed_amount()}) > 0
+        """)).scalars().all()
+        holds_gold = conn.execute(text(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM asset.gold_books
+                GROUP BY UPPER(unit), gold_purity
+                HAVING SUM({signed_amount()}) > 0
+            )
+        """)).scalar()
+
+    watchlist = defaultdict(list)
+    for row in rows:
+        watchlist[row.market].append(row.symbol)
+    if crypto:
+        watchlist['CRYPTO'] = list(crypto)
+    if holds_gold:
+        watchlist['GOLD'].append(GOLD_SYMBOL)
+    return dict(watchlist)
+
+def default_fetchers(max_concurrency=16, timeout=10.0, cache=DEFAULT_CACHE):
+    """
+    Builds the async fetcher per market: fetcher(symbols) -> list of prices in input order.
+
+    SET symbols that yfinance can't price are retried through the set.or.th scraper.
+    Quotes go through `cache` (the shared quote cache by default); pass None to
+    always hit the provider, e.g. when polling faster than the cache TTL.
+    """
+    async def fetch_quotes(symbols, market):
+        return await fetch_prices_async(symbols, market, max_concurrency=max_concurrency,
+                                        timeout=timeout, cache=cache)
+
+    async def fetch_set(symbols):
+        prices = await fetch_quotes(symbols, 'SET')
+        missing = [s for s, p in zip(symbols, prices) if p is None]
+        if missing:
+            scraped = await asyncio.to_thread(scrape_set_stock_prices, missing)
+            found = {k: v for item in scraped for k, v in item.items() if v}
+            prices = [p if p is not None else found.get(s) for s, p in zip(symbols, prices)]
+        return prices
+
+    async def fetch_gold(symbols):
+        price = await asyncio.to_thread(get_gold_price)
+        return [price for _ in symbols]
+
+    fetchers = {'SET': fetch_set, 'MAI': fetch_set, 'GOLD': fetch_gold}
+    for market in ('NASDAQ', 'NYSE', 'US', 'CRYPTO'):
+        fetchers[market] = lambda symbols, market=market: fetch_quotes(symbols, market)
+    return fetchers
+
+def snapshot_frame(market, symbols, prices, fetched_at):
+    """Builds price_snapshots rows for one chunk of quotes, dropping symbols without a price."""
+    df = pd.DataFrame({
+        'time': fetched_at,
+        'symbol': symbols,
+        'market': market,
+        'price': pd.array(prices, dtype='Float64'),
+        'currency': MARKET_CURRENCIES.get(market),
+    })
+    return df[df['price'].notna()]
+
+async def run_pipeline(watchlist, fetchers, write, chunk_size=50):
+    """
+    Fetches every market concurrently and hands each chunk to `write` as soon as it is priced.
+
+    A fetch or write error only affects its own market: the symbols it left
+    without a stored price are reported as missing and the other markets carry on.
+
+    Args:
+        watchlist (dict): {market: [symbols]}
+        fetchers (dict): {market: async fetcher(symbols) -> prices}
+        write (callable): Blocking write(df), run on a worker thread.
+        chunk_size (int): Symbols per fetch/write round.
+
+    Returns:
+        dict: {'timings': {stage: seconds}, 'rows': {market: rows written},
+        'missing': {market: [symbols]}, 'errors': {market: [messages]}}
+    """
+    timings = defaultdict(float)
+    rows = defaultdict(int)
+    missing = defaultdict(list)
+    errors = defaultdict(list)
+
+    async def run_market(market, symbols):
+        fetcher = fetchers.get(market)
+        if fetcher is None:
+            print(f"No fetcher for market {market}; skipping {len(symbols)} symbols.")
+            missing[market].extend(symbols)
+            return
+
+        stored = set()
+
+        async def write_chunk(df, total):
+            start = time.perf_counter()
+            if not df.empty:
+                await asyncio.to_thread(write, df)
+            timings[f"write:{market}"] += time.perf_counter() - start
+            rows[market] += len(df)
+            stored.update(df['symbol'])
+            print(f"[{market}] stored {len(df)}/{total} quotes.")
+
+        def fail(stage, error):
+            print(f"[{market}] {stage} failed: {error}")
+            count('errors', stage=f"daily_update_{stage}", market=market, error=type(error).__name__)
+            errors[market].append(f"{stage}: {error}")
+
+        # Each chunk's write runs in the background while the next chunk is fetched
+        pending_writes = []
+        try:
+            for i in range(0, len(symbols), chunk_size):
+                chunk = symbols[i:i + chunk_size]
+
+                start = time.perf_counter()
+                prices = await fetcher(chunk)
+                timings[f"fetch:{market}"] += time.perf_counter() - start
+
+                fetched_at = datetime.datetime.now(datetime.timezone.utc)
+                df = snapshot_frame(market, chunk, prices, fetched_at)
+                pending_writes.append(asyncio.create_task(write_chunk(df, len(chunk))))
+        except Exception as e:
+            fail('fetch', e)
+
+        for result in await asyncio.gather(*pending_writes, return_exceptions=True):
+            if isinstance(result, Exception):
+                fail('write', result)
+        # Unpriced symbols, plus every symbol of a chunk that failed or was never fetched
+        missing[market].extend(s for s in symbols if s not in stored)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_market(m, s) for m, s in watchlist.items()))
+    timings['total'] = time.perf_counter() - start
+    return {'timings': dict(timings), 'rows': dict(rows), 'missing': dict(missing), 'errors': dict(errors)}
+
+def print_report(result):
+    print("\nStage timings:")
+    for stage, seconds in sorted(result['timings'].items()):
+        print(f"  {stage:<20} {seconds:8.2f}s")
+    for market, symbols in result['missing'].items():
+        if symbols:
+            print(f"  No price for {market}: {', '.join(symbols)}")
+    for market, messages in result.get('errors', {}).items():
+        print(f"  Errors in {market}: {'; '.join(messages)}")
+
+def main(chunk_size=50, concurrency=16, dry_run=False):
+    engine = get_engine('asset')
+
+    start = time.perf_counter()
+    watchlist = load_watchlist(engine)
+    load_seconds = time.perf_counter() - start
+    print("Watchlist: " + ", ".join(f"{m}={len(s)}" for m, s in watchlist.items()))
+
+    if dry_run:
+        write = lambda df: print(df.to_string(index=False))
+    else:
+        ensure_schema(engine, SNAPSHOT_TABLE, init_db)
+        write = lambda df: copy_dataframe(engine, df, SNAPSHOT_TABLE, conflict_columns=['time', 'symbol', 'market'])
+
+    result = asyncio.run(run_pipeline(watchlist, default_fetchers(concurrency), write, chunk_size))
+    result['timings']['load_watchlist'] = load_seconds
+    print_report(result)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch latest prices for held symbols into asset.price_snapshots.")
+    parser.add_argument('--chunk-size', type=int, default=50, help="Symbols per fetch/write round.")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent quote requests per market.")
+    parser.add_argument('--dry-run', action='store_true', help="Print snapshots instead of writing them.")
+    args = parser.parse_args()
+    with job_run('daily_update'):
+        main(args.chunk_size, args.concurrency, args.dry_run)
@@ -1,58 +1,141 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from set_quote_extract import extract_price
+
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instrumentation import count, stage
+
+# Headers are necessary to mimic a real browser request
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+QUOTE_URL = "https://www.set.or.th/th/market/product/stock/quote/{symbol}/price"
+
+_session = None
+_session_lock = threading.Lock()
+
+# url -> (etag, last_modified, price) from the last successful response,
+# used for conditional requests
+_validators = {}
+_validators_lock = threading.Lock()
+
+def create_session(pool_size=16, retries=3, backoff=0.5):
+    """
+    Creates a keep-alive session with a connection pool and retry/backoff.
+
+    Retries cover connection errors and 429/5xx responses, with exponential
+    backoff (backoff * 2**attempt seconds).
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session():
+    """Returns the process-wide pooled session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+def fetch_set_stock_price(symbol, session=None, timeout=10):
+    """
+    Fetches one quote page and returns the price, or 0 if it can't be found.
 
-def scrape_set_stock_prices(symbols):
+    Sends If-None-Match / If-Modified-Since when the previous response had an
+    ETag or Last-Modified header, and reuses the previous price on a 304.
+    """
+    session = session or get_session()
+    url = QUOTE_URL.format(symbol=symbol.upper())
+
+    with _validators_lock:
+        cached = _validators.get(url)
+
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    try:
+        with stage('fetch', source='set'):
+            response = session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and cached:
+            count('cache_hits', cache='set_http')
+            return cached[2]
+
+        if response.status_code != 200:
+            # HTTP error (e.g., 404 if page doesn't exist)
+            return 0
+
+        # Regex/lxml fast paths over the raw bytes, BeautifulSoup as fallback
+        with stage('parse', source='set'):
+            price = extract_price(response.content)
+        if price is None:
+            # Element not found in the HTML
+            return 0
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with _validators_lock:
+                _validators[url] = (etag, last_modified, price)
+        return price
+
+    except Exception as e:
+        # Handle connection errors or parsing issues
+        print(f"Error scraping {symbol}: {e}")
+        return 0
+
+def scrape_set_stock_prices(symbols, max_workers=8, timeout=10, session=None):
     """
     Scrapes stock prices from set.or.th based on the provided list of symbols.
-    
+
+    Pages are fetched in parallel over one pooled keep-alive session.
+
     Args:
         symbols (list): A list of stock symbol strings, e.g., ['KTC', 'LH']
-        
+        max_workers (int): Maximum number of pages fetched at once.
+        timeout (float): Per-request timeout in seconds.
+        session (requests.Session): Optional session, defaults to the shared pool.
+
     Returns:
-        list: A list of dictionaries with {symbol: price} or {'NON': 0} if not found.
+        list: A list of dictionaries with {symbol: price} or {symbol: 0} if not found.
     """
-    results = []
-    
-    # Headers are necessary to mimic a real browser request
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    for symbol in symbols:
-        # Construct the URL as requested
-        url = f"https://www.set.or.th/th/market/product/stock/quote/{symbol.upper()}/price"
-        
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Target the specific DIV class from your screenshot
-                # Class: "value text-white mb-0 me-2 lh-1 stock-info"
-                price_element = soup.find('div', class_="value text-white mb-0 me-2 lh-1 stock-info")
-                
-                if price_element:
-                    # Extract text (e.g., "26.25"), remove commas, and convert to float
-                    price_text = price_element.get_text(strip=True).replace(',', '')
-                    price_val = float(price_text)
-                    results.append({symbol.upper(): price_val})
-                else:
-                    # Element not found in the HTML
-                    results.append({symbol.upper(): 0})
-            else:
-                # HTTP error (e.g., 404 if page doesn't exist)
-                results.append({symbol.upper(): 0})
-                
-        except Exception as e:
-            # Handle connection errors or parsing issues
-            print(f"Error scraping {symbol}: {e}")
-            results.append({symbol.upper(): 0})
-            
-    return results
+    if not symbols:
+        return []
+
+    session = session or get_session()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        prices = list(pool.map(lambda s: fetch_set_stock_price(s, session, timeout), symbols))
+
+    return [{symbol.upper(): price} for symbol, price in zip(symbols, prices)]
 
 # --- Usage Example ---
-symbols_to_scrape = ['KTC', 'LH', 'KBANK', 'INVALID_SYMBOL']
-prices = scrape_set_stock_prices(symbols_to_scrape)
-print(prices)
-# Expected Output format: [{'KTC': 43.5}, {'LH': 9.8}, {'KBANK': 130.0}, {'NON': 0}]
\ No newline at end of file
+if __name__ == "__main__":
+    symbols_to_scrape = ['KTC', 'LH', 'KBANK', 'INVALID_SYMBOL']
+    prices = scrape_set_stock_prices(symbols_to_scrape)
+    print(prices)
+    # Expected Output format: [{'KTC': 43.5}, {'LH': 9.8}, {'KBANK': 130.0}, {'INVALID_SYMBOL': 0}]
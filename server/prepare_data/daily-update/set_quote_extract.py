@@ -0,0 +1,110 @@
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml is in requirements.txt, but keep the scraper usable without it
+    lxml_html = None
+
+# Exact class string of the price DIV on set.or.th quote pages
+PRICE_CLASS = "value text-white mb-0 me-2 lh-1 stock-info"
+
+
+class RegexExtractor:
+    """
+    Fastest path: a single compiled regex over the raw response bytes.
+
+    Only matches when the DIV contains plain text; nested markup makes it
+    return None so the next extractor takes over.
+    """
+
+    name = 'regex'
+    authoritative = False
+    _pattern = re.compile(
+        rb'<div\b[^>]*\bclass="' + re.escape(PRICE_CLASS.encode()) + rb'"[^>]*>\s*([^<]*?)\s*</div>'
+    )
+
+    def extract(self, html):
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        match = self._pattern.search(html)
+        return match.group(1).decode('utf-8') if match else None
+
+
+class LxmlExtractor:
+    """
+    libxml2 HTML parser with a pre-compiled XPath selector.
+
+    A full parse, so when it runs cleanly its answer is final and the
+    BeautifulSoup fallback is skipped.
+    """
+
+    name = 'lxml'
+    authoritative = True
+
+    def __init__(self):
+        self._xpath = etree.XPath('//div[@class=$cls]')
+
+    def extract(self, html):
+        nodes = self._xpath(lxml_html.fromstring(html), cls=PRICE_CLASS)
+        return nodes[0].text_content().strip() if nodes else None
+
+
+class SoupExtractor:
+    """Reference implementation: BeautifulSoup with the pure-Python html.parser."""
+
+    name = 'soup'
+    authoritative = True
+
+    def extract(self, html):
+        price_element = BeautifulSoup(html, 'html.parser').find('div', class_=PRICE_CLASS)
+        return price_element.get_text(strip=True) if price_element else None
+
+
+def default_extractors():
+    """Fast paths first, BeautifulSoup last."""
+    extractors = [RegexExtractor()]
+    if lxml_html is not None:
+        extractors.append(LxmlExtractor())
+    extractors.append(SoupExtractor())
+    return extractors
+
+
+DEFAULT_EXTRACTORS = default_extractors()
+
+
+def to_price(text):
+    """Converts the DIV text (e.g. "1,034.00") to float, or None if it isn't a number."""
+    if not text:
+        return None
+    try:
+        return float(text.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def extract_price(html, extractors=None):
+    """
+    Extracts the quote price from a SET quote page.
+
+    Tries each extractor in order and returns the first parsable price.
+    Stops early once an authoritative (full-parse) extractor has run, and
+    moves on to the next extractor if one raises.
+
+    Args:
+        html (bytes or str): Raw page content; bytes avoid a decode on the fast path.
+        extractors (list): Extractor chain, defaults to DEFAULT_EXTRACTORS.
+
+    Returns:
+        float: The price, or None if no extractor found it.
+    """
+    for extractor in extractors or DEFAULT_EXTRACTORS:
+        try:
+            price = to_price(extractor.extract(html))
+        except Exception:
+            continue
+        if price is not None or extractor.authoritative:
+            return price
+    return None
@@ -0,0 +1,309 @@
+"""
+Intraday quote streaming into the trading database.
+
+Polls the held symbols (from the books tables) every few seconds, keeps
+the latest quote per symbol in memory and emits only quotes whose price
+changed. Emitted ticks are micro-batched into the quote_ticks hypertable
+through the COPY loader, so one write covers many polls.
+
+    python stream_quotes.py [--interval 5] [--flush-interval 2] [--batch-size 500]
+                            [--simulate] [--duration SECONDS] [--dry-run]
+
+Sources use the run_pipeline contract, {market: async fetcher(symbols) ->
+prices}: default_fetchers() for live quotes, SimulatedFeed for a local
+random-walk feed (tests, demos, load runs).
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+import pandas as pd
+from sqlalchemy import text
+
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bulk_load import copy_dataframe
+from instrumentation import count, job_run, stage
+from timescale_schema import ensure_hypertable
+
+from run_daily_update import MARKET_CURRENCIES, default_fetchers, load_watchlist
+
+TICK_TABLE = 'quote_ticks'
+TICK_COLUMNS = ['time', 'symbol', 'market', 'price', 'currency']
+
+Quote = namedtuple('Quote', ['symbol', 'market', 'price', 'time'])
+
+# Sentinel telling the writer that the stream has stopped
+_DONE = object()
+
+
+def init_db(engine):
+    """Creates the quote_ticks hypertable (trading DB), compressed per symbol after a day."""
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {TICK_TABLE} (
+                time TIMESTAMPTZ NOT NULL,
+                symbol TEXT NOT NULL,
+                market TEXT NOT NULL,
+                price DOUBLE PRECISION NOT NULL,
+                currency TEXT,
+                PRIMARY KEY (time, symbol, market)
+            );
+        """))
+        ensure_hypertable(conn, TICK_TABLE, 'symbol', compress_after='1 day')
+        conn.commit()
+
+
+class SimulatedFeed:
+    """
+    Local random-walk quote source.
+
+    Every poll moves each symbol with probability `change_probability` by a
+    normal step of `volatility` (relative); other symbols repeat their last
+    price, like a quiet market. Seeded, so runs are reproducible.
+    """
+
+    def __init__(self, start_prices=None, volatility=0.002, change_probability=0.3, seed=0, default_price=100.0):
+        self.prices = dict(start_prices or {})
+        self.volatility = volatility
+        self.change_probability = change_probability
+        self.default_price = default_price
+        self._random = random.Random(seed)
+
+    async def fetch(self, symbols):
+        prices = []
+        for symbol in symbols:
+            price = self.prices.get(symbol, self.default_price)
+            if self._random.random() < self.change_probability:
+                price = round(price * (1 + self._random.gauss(0, self.volatility)), 4)
+            self.prices[symbol] = price
+            prices.append(price)
+        return prices
+
+    def fetchers(self, markets):
+        return {market: self.fetch for market in markets}
+
+
+class QuoteStream:
+    """
+    Polls a watchlist, keeps the latest quotes and writes changed ones in micro-batches.
+
+    Args:
+        watchlist (dict): {market: [symbols]}
+        fetchers (dict): {market: async fetcher(symbols) -> prices in input order}
+        write (callable): Blocking write(DataFrame of TICK_COLUMNS), run on a worker thread.
+        interval (float): Seconds between polls of each market.
+        flush_interval (float): Longest a changed quote waits before it is written.
+        batch_size (int): Buffered ticks that trigger an immediate write.
+        min_change (float): Smallest absolute price move that counts as a change.
+        refresh_watchlist (callable): Optional blocking loader re-read every `watchlist_interval` seconds.
+    """
+
+    def __init__(self, watchlist, fetchers, write, interval=5.0, flush_interval=2.0, batch_size=500,
+                 min_change=0.0, refresh_watchlist=None, watchlist_interval=300.0):
+        self.watchlist = {m: list(s) for m, s in watchlist.items()}
+        self.fetchers = fetchers
+        self.write = write
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.min_change = min_change
+        self.refresh_watchlist = refresh_watchlist
+        self.watchlist_interval = watchlist_interval
+        self.stats = {'polls': 0, 'quotes': 0, 'changed': 0, 'written': 0, 'flushes': 0, 'errors': 0}
+        self._latest = {}
+        self._queue = None
+        self._stopping = None
+        self._pollers = {}
+        self._tasks = []
+
+    def snapshot(self, market=None):
+        """
+        Latest known quote per symbol.
+
+        Returns:
+            dict: {(market, symbol): Quote}, a copy that readers can keep.
+        """
+        return {key: quote for key, quote in self._latest.items() if market is None or key[0] == market}
+
+    def apply(self, market, symbols, prices, fetched_at):
+        """Updates the snapshot from one poll and returns the quotes that changed."""
+        changed = []
+        for symbol, price in zip(symbols, prices):
+            if price is None:
+                continue
+            previous = self._latest.get((market, symbol))
+            if previous is not None and abs(price - previous.price) <= self.min_change:
+                continue
+            quote = Quote(symbol, market, float(price), fetched_at)
+            self._latest[(market, symbol)] = quote
+            changed.append(quote)
+        self.stats['quotes'] += len(symbols)
+        self.stats['changed'] += len(changed)
+        return changed
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self, duration=None):
+        """
+        Streams until stop() is called or `duration` seconds have passed.
+
+        Buffered ticks are flushed before returning.
+
+        Returns:
+            dict: The stats counters.
+        """
+        self._queue = asyncio.Queue()
+        self._stopping = asyncio.Event()
+        self._pollers = {m: asyncio.create_task(self._poll_market(m)) for m in self.watchlist}
+        self._tasks = []
+        if self.refresh_watchlist is not None:
+            self._tasks.append(asyncio.create_task(self._refresh()))
+        writer = asyncio.create_task(self._writer())
+        try:
+            if duration is None:
+                await self._stopping.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), duration)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._stopping.set()
+            tasks = self._tasks + list(self._pollers.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._queue.put(_DONE)
+            await writer
+        return dict(self.stats)
+
+    async def _sleep(self, seconds):
+        """Sleeps unless the stream is stopping; returns False once it is."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+            return False
+        except asyncio.TimeoutError:
+            return True
+
+    async def _poll_market(self, market):
+        # Returns once the market leaves the watchlist; _refresh restarts it if it comes back
+        while not self._stopping.is_set() and market in self.watchlist:
+            started = time.monotonic()
+            symbols = list(self.watchlist.get(market, []))
+            fetcher = self.fetchers.get(market)
+            if symbols and fetcher is not None:
+                try:
+                    prices = await fetcher(symbols)
+                    fetched_at = datetime.datetime.now(datetime.timezone.utc)
+                    for quote in self.apply(market, symbols, prices, fetched_at):
+                        self._queue.put_nowait(quote)
+                except Exception as e:
+                    print(f"[{market}] poll failed: {e}")
+                    self.stats['errors'] += 1
+                    count('errors', stage='stream_poll', error=type(e).__name__)
+                self.stats['polls'] += 1
+            # Fixed cadence: a slow poll shortens the wait instead of drifting the schedule
+            if not await self._sleep(max(0.0, self.interval - (time.monotonic() - started))):
+                return
+
+    async def _refresh(self):
+        while await self._sleep(self.watchlist_interval):
+            try:
+                watchlist = await asyncio.to_thread(self.refresh_watchlist)
+            except Exception as e:
+                print(f"Watchlist refresh failed: {e}")
+                continue
+            self.watchlist = {m: list(s) for m, s in watchlist.items()}
+            for market in self.watchlist:
+                # One poll loop per market; cancelled with the stream
+                poller = self._pollers.get(market)
+                if poller is None or poller.done():
+                    self._pollers[market] = asyncio.create_task(self._poll_market(market))
+
+    async def _writer(self):
+        buffer = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            done = item is _DONE
+            if item is not None and not done:
+                buffer.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if buffer and (done or len(buffer) >= self.batch_size or time.monotonic() >= deadline):
+                await self._flush(buffer)
+                buffer, deadline = [], None
+            if done:
+                return
+
+    async def _flush(self, quotes):
+        df = ticks_frame(quotes)
+        try:
+            with stage('flush', table=TICK_TABLE):
+                await asyncio.to_thread(self.write, df)
+            self.stats['written'] += len(df)
+            self.stats['flushes'] += 1
+            count('ticks', len(df))
+        except Exception as e:
+            # Ticks are a best-effort stream; the snapshot stays current
+            print(f"Failed to write {len(df)} ticks: {e}")
+            self.stats['errors'] += 1
+
+
+def ticks_frame(quotes):
+    """quote_ticks rows from Quotes; for a repeated (time, symbol, market) the last price wins."""
+    df = pd.DataFrame(quotes, columns=['symbol', 'market', 'price', 'time'])
+    df['currency'] = df['market'].map(MARKET_CURRENCIES)
+    return df.drop_duplicates(['time', 'symbol', 'market'], keep='last')[TICK_COLUMNS]
+
+
+def main(interval=5.0, flush_interval=2.0, batch_size=500, simulate=False, duration=None, dry_run=False):
+    from db import ensure_schema, get_engine
+
+    asset_engine = get_engine('asset')
+    watchlist = load_watchlist(asset_engine)
+    print("Watchlist: " + ", ".join(f"{m}={len(s)}" for m, s in watchlist.items()))
+
+    # No quote cache: its TTL (30-60s) is longer than the poll interval, so changes would be hidden
+    fetchers = SimulatedFeed().fetchers(watchlist) if simulate else default_fetchers(cache=None)
+    if dry_run:
+        write = lambda df: print(df.to_string(index=False))
+    else:
+        trading_engine = get_engine('trading')
+        ensure_schema(trading_engine, TICK_TABLE, init_db)
+        write = lambda df: copy_dataframe(trading_engine, df, TICK_TABLE,
+                                          conflict_columns=['time', 'symbol', 'market'], update=False)
+
+    stream = QuoteStream(watchlist, fetchers, write, interval, flush_interval, batch_size,
+                         refresh_watchlist=lambda: load_watchlist(asset_engine))
+    try:
+        stats = asyncio.run(stream.run(duration))
+    except KeyboardInterrupt:
+        stats = stream.stats
+    print("Stream stopped: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream changed quotes for held symbols into quote_ticks.")
+    parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls per market.")
+    parser.add_argument('--flush-interval', type=float, default=2.0, help="Max seconds a tick waits to be written.")
+    parser.add_argument('--batch-size', type=int, default=500, help="Buffered ticks that force a write.")
+    parser.add_argument('--simulate', action='store_true', help="Use the local random-walk feed.")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds.")
+    parser.add_argument('--dry-run', action='store_true', help="Print ticks instead of writing them.")
+    args = parser.parse_args()
+    with job_run('stream_quotes'):
+        main(args.interval, args.flush_interval, args.batch_size, args.simulate, args.duration, args.dry_run)
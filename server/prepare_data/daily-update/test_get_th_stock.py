@@ -1,6 +1,9 @@
 import pytest
 from get_th_stock import get_set_prices
 
+# Quotes come from fixtures/replay (see conftest.py), not live Yahoo
+pytestmark = pytest.mark.usefixtures('recorded_quotes')
+
 def test_get_set_prices():
     # Test with known SET symbols
     test_symbols = ['KTC', 'LH', 'KBANK']
@@ -1,6 +1,9 @@
 import pytest
 from get_usa_stock import get_nasdaq_prices, get_nyse_prices
 
+# Quotes come from fixtures/replay (see conftest.py), not live Yahoo
+pytestmark = pytest.mark.usefixtures('recorded_quotes')
+
 def test_get_nasdaq_prices():
     # Test with known NASDAQ symbols
     test_symbols = ['AAPL', 'MSFT', 'GOOGL']
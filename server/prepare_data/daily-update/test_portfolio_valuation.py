@@ -0,0 +1,117 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_portfolio_valuation import reference_positions, synthetic_trades
+from gold import TROY_OUNCE_GRAMS
+from portfolio_valuation import (compute_positions, fetch_marks, mark_to_market,
+                                 normalize_gold, since_ids)
+
+
+def trades(rows, book='stock', market='US'):
+    return pd.DataFrame([
+        {'book': book, 'id': i + 1, 'time': pd.Timestamp('2024-01-01') + pd.Timedelta(days=i),
+         'side': side, 'symbol': symbol, 'market': market, 'amount': amount, 'price': price, 'currency': 'USD'}
+        for i, (side, symbol, amount, price) in enumerate(rows)
+    ])
+
+
+def test_average_cost_and_realized_pnl():
+    positions = compute_positions(trades([
+        ('BUY', 'AAPL', 10, 100.0),
+        ('BUY', 'AAPL', 10, 120.0),
+        ('SELL', 'AAPL', 5, 130.0),
+        ('DIVIDEND', 'AAPL', 15, 0.5),
+    ]))
+    aapl = positions.loc[('stock', 'AAPL', 'US')]
+    assert aapl['quantity'] == 15
+    assert aapl['avg_cost'] == pytest.approx(110.0)
+    assert aapl['cost_basis'] == pytest.approx(1650.0)
+    assert aapl['realized_pnl'] == pytest.approx(100.0)
+    assert aapl['dividends'] == pytest.approx(7.5)
+    assert aapl['last_id'] == 4 and aapl['trades'] == 4
+
+
+def test_closing_and_reopening_starts_a_new_cost_period():
+    positions = compute_positions(trades([
+        ('BUY', 'KTC', 100, 40.0),
+        ('SELL', 'KTC', 100, 50.0),
+        ('BUY', 'KTC', 10, 60.0),
+        ('SELL', 'KTC', 4, 55.0),
+    ], market='SET'))
+    ktc = positions.loc[('stock', 'KTC', 'SET')]
+    assert ktc['quantity'] == 6
+    assert ktc['avg_cost'] == pytest.approx(60.0)
+    assert ktc['realized_pnl'] == pytest.approx(1000.0 - 20.0)
+
+
+def test_matches_row_by_row_reference():
+    book = synthetic_trades(n_trades=3000, n_symbols=25, seed=3)
+    positions = compute_positions(book)
+    expected = reference_positions(book)
+    np.testing.assert_allclose(positions['quantity'], expected['quantity'].reindex(positions.index), atol=1e-6)
+    np.testing.assert_allclose(positions['cost_basis'], expected['cost_basis'].reindex(positions.index), rtol=1e-7, atol=1e-6)
+    np.testing.assert_allclose(positions['realized_pnl'], expected['realized_pnl'].reindex(positions.index), rtol=1e-7, atol=1e-6)
+
+
+def test_incremental_update_equals_full_recompute():
+    book = synthetic_trades(n_trades=2000, n_symbols=10, seed=5)
+    old, new = book[book['id'] <= 1200], book[book['id'] > 1200]
+
+    state = compute_positions(old)
+    assert since_ids(state) == {'stock': 1200}
+    incremental = compute_positions(new, state)
+    full = compute_positions(book)
+    pd.testing.assert_frame_equal(incremental.sort_index(), full.sort_index(), check_dtype=False)
+
+
+def test_gold_is_normalized_to_fine_ounces_keeping_cash():
+    gold = pd.DataFrame({'amount': [1.0, 31.1034768], 'price': [40000.0, 2500.0],
+                         'unit': ['BAHT', 'GRAM'], 'gold_purity': [96.5, 100.0]})
+    out = normalize_gold(gold)
+    assert out['amount'].iloc[0] == pytest.approx(15.244 * 0.965 / TROY_OUNCE_GRAMS)
+    assert out['amount'].iloc[1] == pytest.approx(1.0)
+    np.testing.assert_allclose(out['amount'] * out['price'], gold['amount'] * gold['price'])
+    assert set(out['symbol']) == {'GC=F'}
+
+
+def test_mark_to_market_with_fetchers():
+    positions = compute_positions(pd.concat([
+        trades([('BUY', 'NVDA', 2, 100.0)]),
+        trades([('BUY', 'BTC', 0.5, 40000.0)], book='crypto', market='CRYPTO'),
+        trades([('BUY', 'GONE', 1, 5.0), ('SELL', 'GONE', 1, 6.0)]),
+    ]))
+    requested = []
+
+    async def fetch_us(symbols):
+        requested.extend(symbols)
+        return [150.0 for _ in symbols]
+
+    async def fetch_crypto(symbols):
+        return [60000.0 for _ in symbols]
+
+    marks = asyncio.run(fetch_marks(positions, {'US': fetch_us, 'CRYPTO': fetch_crypto}))
+    valued = mark_to_market(positions, marks)
+
+    assert requested == ['NVDA']  # closed positions are not priced
+    assert valued.loc[('stock', 'NVDA', 'US'), 'unrealized_pnl'] == pytest.approx(100.0)
+    assert valued.loc[('crypto', 'BTC', 'CRYPTO'), 'market_value'] == pytest.approx(30000.0)
+    assert valued.loc[('crypto', 'BTC', 'CRYPTO'), 'quote_currency'] == 'USD'
+    assert valued.loc[('stock', 'GONE', 'US'), 'total_pnl'] == pytest.approx(1.0)
+
+
+def test_fx_converts_quotes_into_book_currency():
+    from fx import RateTable
+
+    book = trades([('BUY', 'NVDA', 2, 3500.0)])
+    book['currency'] = 'THB'
+    positions = compute_positions(book)
+    fx = RateTable({'USDTHB': (pd.to_datetime(['2024-01-01'], utc=True), [36.0])})
+
+    valued = mark_to_market(positions, {('NVDA', 'US'): 100.0}, fx)
+    nvda = valued.loc[('stock', 'NVDA', 'US')]
+    assert nvda['fx_rate'] == 36.0
+    assert nvda['market_value'] == pytest.approx(7200.0)
+    assert nvda['unrealized_pnl'] == pytest.approx(200.0)
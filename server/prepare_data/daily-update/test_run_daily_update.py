@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from run_daily_update import run_pipeline, signed_amount
+
+
+def test_pipeline_streams_each_chunk_and_reports_missing():
+    written = []
+    lock = threading.Lock()
+
+    async def fetch_us(symbols):
+        return [None if s == 'GONE' else 100.0 for s in symbols]
+
+    async def fetch_gold(symbols):
+        return [2350.0 for _ in symbols]
+
+    def write(df):
+        with lock:
+            written.append(df)
+
+    watchlist = {'US': ['AAPL', 'MSFT', 'GONE', 'NVDA', 'TSLA'], 'GOLD': ['GC=F'], 'CRYPTO': ['BTC']}
+    result = asyncio.run(run_pipeline(watchlist, {'US': fetch_us, 'GOLD': fetch_gold}, write, chunk_size=2))
+
+    assert result['rows'] == {'US': 4, 'GOLD': 1}
+    assert result['missing']['US'] == ['GONE']
+    assert result['missing']['CRYPTO'] == ['BTC']
+    # US is written in chunks of two as they arrive, gold separately
+    assert sorted(len(df) for df in written) == [1, 1, 1, 2]
+    gold = next(df for df in written if df['market'].iloc[0] == 'GOLD')
+    assert gold['currency'].iloc[0] == 'USD'
+    assert {'total', 'fetch:US', 'write:US'} <= set(result['timings'])
+
+
+def test_failing_market_is_reported_without_stopping_the_others():
+    async def fetch_us(symbols):
+        if 'BAD' in symbols:
+            raise ConnectionError('quote API down')
+        return [100.0 for _ in symbols]
+
+    async def fetch_set(symbols):
+        return [43.5 for _ in symbols]
+
+    def write(df):
+        if df['market'].iloc[0] == 'SET':
+            raise RuntimeError('db down')
+
+    watchlist = {'US': ['AAPL', 'MSFT', 'BAD', 'NVDA'], 'SET': ['KTC'], 'GOLD': ['GC=F']}
+    fetchers = {'US': fetch_us, 'SET': fetch_set, 'GOLD': lambda symbols: fetch_set(symbols)}
+    result = asyncio.run(run_pipeline(watchlist, fetchers, write, chunk_size=2))
+
+    assert result['rows'] == {'US': 2, 'GOLD': 1}
+    assert result['missing']['US'] == ['BAD', 'NVDA'] and result['missing']['SET'] == ['KTC']
+    assert result['errors']['US'] == ['fetch: quote API down']
+    assert result['errors']['SET'] == ['write: db down']
+
+
+def test_signed_amount_keeps_only_open_positions():
+    engine = create_engine('sqlite://')
+    pd.DataFrame({
+        'symbol': ['KTC', 'KTC', 'LH', 'LH', 'PTT', 'PTT', 'AOT'],
+        'side': ['BUY', 'SELL', 'BUY', 'SELL', 'BUY', 'TRANSFER', 'DIVIDEND'],
+        'amount': [100, 100, 200, 50, 10, -10, 5],
+    }).to_sql('books', engine, index=False)
+
+    with engine.connect() as conn:
+        held = conn.execute(text(
+            f"SELECT symbol FROM books GROUP BY 1 HAVING SUM({signed_amount()}) > 0")).scalars().all()
+
+    assert held == ['LH']
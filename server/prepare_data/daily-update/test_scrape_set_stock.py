@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+import scrape_set_stock
+from scrape_set_stock import scrape_set_stock_prices
+
+PAGE = '<html><body><div class="value text-white mb-0 me-2 lh-1 stock-info">{price}</div></body></html>'
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self._lock:
+            self.requests.append((url, dict(headers or {})))
+        symbol = url.split('/quote/')[1].split('/')[0]
+        page = self.pages.get(symbol)
+        if page is None:
+            return FakeResponse(404)
+        if headers and headers.get('If-None-Match') == page.get('etag'):
+            return FakeResponse(304)
+        return FakeResponse(200, PAGE.format(price=page['price']), {'ETag': page.get('etag')})
+
+
+@pytest.fixture(autouse=True)
+def clear_validators():
+    scrape_set_stock._validators.clear()
+
+
+def test_scrape_keeps_order_and_handles_missing():
+    session = FakeSession({'KTC': {'price': '43.50'}, 'PTT': {'price': '1,034.00'}})
+    prices = scrape_set_stock_prices(['ktc', 'NOPE', 'PTT'], session=session)
+    assert prices == [{'KTC': 43.5}, {'NOPE': 0}, {'PTT': 1034.0}]
+
+
+def test_scrape_sends_conditional_request_and_reuses_price():
+    session = FakeSession({'LH': {'price': '9.80', 'etag': '"v1"'}})
+    assert scrape_set_stock_prices(['LH'], session=session) == [{'LH': 9.8}]
+    assert scrape_set_stock_prices(['LH'], session=session) == [{'LH': 9.8}]
+    assert session.requests[1][1] == {'If-None-Match': '"v1"'}
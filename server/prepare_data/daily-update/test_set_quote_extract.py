@@ -0,0 +1,36 @@
+import json
+import os
+
+import pytest
+from set_quote_extract import DEFAULT_EXTRACTORS, LxmlExtractor, RegexExtractor, SoupExtractor, extract_price, to_price
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'set_quote')
+
+with open(os.path.join(FIXTURES, 'expected.json')) as f:
+    EXPECTED = json.load(f)
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_extract_price_matches_fixture(name):
+    assert extract_price(load(name)) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_fast_paths_agree_with_soup(name):
+    html = load(name)
+    reference = to_price(SoupExtractor().extract(html))
+    assert to_price(LxmlExtractor().extract(html)) == reference
+
+    # The regex path may decline (None) but must never disagree
+    fast = to_price(RegexExtractor().extract(html))
+    assert fast is None or fast == reference
+
+
+def test_regex_declines_nested_markup():
+    assert RegexExtractor().extract(load('LH.html')) is None
+    assert [e.name for e in DEFAULT_EXTRACTORS] == ['regex', 'lxml', 'soup']
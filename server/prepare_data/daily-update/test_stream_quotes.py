@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+import threading
+
+from stream_quotes import QuoteStream, SimulatedFeed, ticks_frame
+
+T0 = datetime.datetime(2024, 5, 1, 3, 0, tzinfo=datetime.timezone.utc)
+
+
+def test_apply_emits_only_changed_quotes_and_keeps_snapshot():
+    stream = QuoteStream({'SET': ['KTC', 'LH']}, {}, write=None, min_change=0.001)
+
+    first = stream.apply('SET', ['KTC', 'LH'], [43.5, 9.8], T0)
+    second = stream.apply('SET', ['KTC', 'LH'], [43.5, 9.85], T0 + datetime.timedelta(seconds=5))
+    third = stream.apply('SET', ['KTC', 'LH'], [None, 9.8505], T0 + datetime.timedelta(seconds=10))
+
+    assert [q.symbol for q in first] == ['KTC', 'LH']
+    assert [(q.symbol, q.price) for q in second] == [('LH', 9.85)]
+    assert third == []
+    snapshot = stream.snapshot('SET')
+    assert snapshot[('SET', 'KTC')].price == 43.5 and snapshot[('SET', 'KTC')].time == T0
+    assert snapshot[('SET', 'LH')].price == 9.85
+
+
+def test_ticks_frame_adds_currency():
+    stream = QuoteStream({}, {}, write=None)
+    df = ticks_frame(stream.apply('NASDAQ', ['NVDA'], [120.5], T0))
+    assert df.to_dict(orient='records') == [
+        {'time': T0, 'symbol': 'NVDA', 'market': 'NASDAQ', 'price': 120.5, 'currency': 'USD'}]
+
+
+def test_stream_micro_batches_changed_ticks_from_simulated_feed():
+    written = []
+    lock = threading.Lock()
+
+    def write(df):
+        with lock:
+            written.append(df)
+
+    feed = SimulatedFeed({'KTC': 43.5, 'NVDA': 120.0}, change_probability=0.5, seed=1)
+    watchlist = {'SET': ['KTC', 'LH'], 'NASDAQ': ['NVDA']}
+    stream = QuoteStream(watchlist, feed.fetchers(watchlist), write,
+                         interval=0.01, flush_interval=0.05, batch_size=1000)
+
+    stats = asyncio.run(stream.run(duration=0.3))
+
+    assert stats['polls'] >= 4
+    # The first poll emits every symbol; later polls only the moves
+    assert len(written) < stats['polls']
+    assert sum(len(df) for df in written) == stats['written'] == stats['changed']
+    assert stats['changed'] < stats['quotes']
+    snapshot = stream.snapshot()
+    assert set(snapshot) == {('SET', 'KTC'), ('SET', 'LH'), ('NASDAQ', 'NVDA')}
+    assert snapshot[('SET', 'KTC')].price == feed.prices['KTC']
+
+
+def test_stream_survives_failing_source_and_write():
+    async def broken(symbols):
+        raise ConnectionError('feed down')
+
+    def failing_write(df):
+        raise RuntimeError('db down')
+
+    stream = QuoteStream({'SET': ['KTC'], 'GOLD': ['GC=F']},
+                         {'SET': broken, 'GOLD': SimulatedFeed().fetch}, failing_write,
+                         interval=0.01, flush_interval=0.01)
+
+    stats = asyncio.run(stream.run(duration=0.1))
+
+    assert stats['errors'] >= 2 and stats['written'] == 0
+    assert ('GOLD', 'GC=F') in stream.snapshot()
+
+
+def test_watchlist_refresh_adds_markets():
+    feed = SimulatedFeed()
+    stream = QuoteStream({'SET': ['KTC']}, feed.fetchers(['SET', 'CRYPTO']), lambda df: None, interval=0.01,
+                         refresh_watchlist=lambda: {'SET': ['KTC'], 'CRYPTO': ['BTC']}, watchlist_interval=0.05)
+
+    asyncio.run(stream.run(duration=0.2))
+
+    assert ('CRYPTO', 'BTC') in stream.snapshot()
+
+
+def test_market_that_returns_keeps_a_single_poll_loop():
+    crypto_polls = []
+
+    async def fetch_crypto(symbols):
+        crypto_polls.append(asyncio.current_task())
+        return [100.0 for _ in symbols]
+
+    # CRYPTO drops out at the first refresh and comes back at the second
+    watchlists = iter([{'SET': ['KTC']}])
+    stream = QuoteStream({'SET': ['KTC'], 'CRYPTO': ['BTC']}, {'SET': SimulatedFeed().fetch, 'CRYPTO': fetch_crypto},
+                         lambda df: None, interval=0.01, watchlist_interval=0.05,
+                         refresh_watchlist=lambda: next(watchlists, {'SET': ['KTC'], 'CRYPTO': ['BTC']}))
+
+    asyncio.run(stream.run(duration=0.3))
+
+    loops = list(dict.fromkeys(crypto_polls))
+    assert len(loops) == 2
+    # Once the new loop starts, the old one never polls again
+    assert loops[0] not in crypto_polls[crypto_polls.index(loops[1]):]
@@ -0,0 +1,110 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+# Load variables from .env file
+load_dotenv()
+
+# Connection settings per database. Each value can be overridden with
+# <PREFIX>_<KEY> environment variables, e.g. TRADING_DB_HOST.
+# Defaults match server/docker-compose.yml.
+DATABASES = {
+    'asset': {
+        'prefix': 'ASSET_DB',
+        'USER': 'appuser',
+        'PASSWORD': 'asset',
+        'HOST': 'localhost',
+        'PORT': '6001',
+        'NAME': 'asset_db',
+    },
+    'trading': {
+        'prefix': 'TRADING_DB',
+        'USER': 'appuser',
+        'PASSWORD': 'trade',
+        'HOST': 'localhost',
+        'PORT': '6002',
+        'NAME': 'trading_db',
+    },
+}
+
+# Pool tuning shared by all prepare_data jobs
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '5'))
+POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '600000'))
+
+_engines = {}
+_initialised = set()
+_lock = threading.RLock()
+
+
+def database_url(name):
+    """Builds the SQLAlchemy URL for a configured database ('asset' or 'trading')."""
+    config = DATABASES[name]
+
+    def setting(key):
+        return os.getenv(f"{config['prefix']}_{key}", config[key])
+
+    return URL.create(
+        # Explicit driver: bulk_load relies on psycopg2's copy_expert and execute_values
+        drivername='postgresql+psycopg2',
+        username=setting('USER'),
+        password=setting('PASSWORD'),
+        host=setting('HOST'),
+        port=int(setting('PORT')),
+        database=setting('NAME'),
+    )
+
+
+def get_engine(name='asset'):
+    """
+    Returns the process-wide pooled engine for a database, creating it on first use.
+
+    Connections are checked with a pre-ping before use, recycled after
+    DB_POOL_RECYCLE seconds, and run with a server-side statement_timeout so
+    a stuck query can't hold a pooled connection forever.
+    """
+    with _lock:
+        engine = _engines.get(name)
+        if engine is None:
+            engine = create_engine(
+                database_url(name),
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=POOL_RECYCLE_SECONDS,
+                connect_args={
+                    'options': f'-c statement_timeout={STATEMENT_TIMEOUT_MS}',
+                    'application_name': 'prepare_data',
+                },
+            )
+            _engines[name] = engine
+        return engine
+
+
+def ensure_schema(engine, key, init_fn):
+    """
+    Runs `init_fn(engine)` once per process for a given schema key.
+
+    Lets every save call ask for its tables without re-running DDL.
+    """
+    cache_key = (engine.url.render_as_string(hide_password=True), key)
+    with _lock:
+        if cache_key in _initialised:
+            return
+        init_fn(engine)
+        _initialised.add(cache_key)
+
+
+def dispose_engines():
+    """
+    Drops all pooled connections. Call in a child process after fork so it
+    opens its own connections instead of sharing the parent's sockets.
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose(close=False)
+        _engines.clear()
@@ -1,31 +1,36 @@
-import time
+import argparse
+import os
+import queue
+import sys
 import urllib.parse
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from sqlalchemy import create_engine, text
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from lxml import etree
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import text
 
-# --- 1. Database Configuration ---
-DB_HOST = 'localhost'
-DB_PORT = '6001'
-DB_USER = 'appuser'
-DB_PASS = 'asset'
-DB_NAME = 'asset_db'
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bulk_load import upsert_records, validate_records
+from db import ensure_schema, get_engine
 
-DATABASE_URI = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+# --- 1. Database Configuration ---
+# Connection settings come from the shared db module (ASSET_DB_* env vars)
 
 # --- 2. Database Functions ---
 
 def get_db_engine():
-    return create_engine(DATABASE_URI)
+    return get_engine('asset')
 
 def init_db(engine):
-    """Creates the symbols table if it doesn't exist."""
+    """Creates asset.set_symbols if it doesn't exist."""
+    # Schema-qualified rather than SET SCHEMA: the pooled connection is reused
+    # by later callers, and a changed search_path would follow it back into the pool
     create_table_sql = """
-    SET SCHEMA 'asset';
-    CREATE TABLE IF NOT EXISTS set_symbols (
+    CREATE SCHEMA IF NOT EXISTS asset;
+    CREATE TABLE IF NOT EXISTS asset.set_symbols (
         symbol VARCHAR(20) PRIMARY KEY,
         industry_group VARCHAR(50),
         sector VARCHAR(50),
@@ -39,51 +44,183 @@ def init_db(engine):
     print("Database table 'set_symbols' check complete.")
 
 def save_symbols_to_db(symbols_list):
+    """
+    Upserts scraped symbols into asset.set_symbols in batched statements.
+
+    Rows are validated first; invalid rows are reported and skipped, and
+    nothing is written if no row is valid.
+
+    Returns:
+        list: Validation errors, one {'index', 'record', 'error'} dict per rejected row.
+    """
     if not symbols_list:
         print("No symbols to save.")
-        return
+        return []
+
+    records, errors = validate_records(
+        [
+            {'symbol': item.get('symbol'), 'industry_group': item.get('group'),
+             'sector': item.get('sector'), 'market': 'SET'}
+            for item in symbols_list
+        ],
+        required=['symbol'],
+        max_lengths={'symbol': 20, 'industry_group': 50, 'sector': 50},
+    )
+    for error in errors:
+        print(f"Skipping {error['record'].get('symbol')!r}: {error['error']}")
+    if not records:
+        return errors
 
     engine = get_db_engine()
-    init_db(engine)
-    
-    insert_sql = text("""
-        INSERT INTO set_symbols (symbol, industry_group, sector, market, updated_at)
-        VALUES (:symbol, :group, :sector, 'SET', NOW())
-        ON CONFLICT (symbol) 
-        DO UPDATE SET 
-            industry_group = EXCLUDED.industry_group,
-            sector = EXCLUDED.sector,
-            updated_at = NOW();
-    """)
-
-    print(f"Saving {len(symbols_list)} symbols to database...")
-    
-    with engine.connect() as conn:
-        for item in symbols_list:
-            try:
-                conn.execute(insert_sql, {
-                    "symbol": item['symbol'], 
-                    "group": item['group'],
-                    "sector": item['sector']
-                })
-            except Exception as e:
-                print(f"Error saving {item['symbol']}: {e}")
-        conn.commit()
+    ensure_schema(engine, 'asset.set_symbols', init_db)
+
+    print(f"Saving {len(records)} symbols to database...")
+    # updated_at comes from the database clock, not this host's
+    upsert_records(engine, 'asset.set_symbols', records, conflict_columns=['symbol'],
+                   server_values={'updated_at': 'NOW()'})
     print("Database update successful.")
+    return errors
+
+# --- 3. Scraping Logic ---
+
+# Industry group -> sub-industry slugs, as used in set.or.th index URLs
+INDUSTRY_GROUPS = [
+    {'agro': ['agri', 'food']}, 
+    {'consump': ['fashion', 'home', 'person']}, 
+    {'fincial': ['bank', 'fin', 'insur']}, 
+    {'indus': ['auto', 'imm', 'paper', 'petro', 'pkg', 'steel']}, 
+    {'propcon': ['conmat', 'prop', 'pf&reit', 'cons']}, 
+    {'resourc': ['energ', 'mine']}, 
+    {'service': ['comm', 'helth', 'media', 'prof', 'tourism', 'trans']},
+    {'tech': ['etron', 'ict']}
+]
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'application/json, text/html;q=0.9',
+}
+
+# JSON endpoint the Vue page calls to render the sub-industry constituents
+COMPOSITION_API_URL = "https://www.set.or.th/api/set/index/{subgroup}/composition?lang=en"
+# Server-rendered page, used when the API is unavailable
+LISTING_PAGE_URL = "https://www.set.or.th/th/market/index/set/{group}/{subgroup}"
+
+# Symbol selectors, in order of preference
+SYMBOL_SELECTOR = "div.symbol, a[data-symbol]"
+_DIV_SYMBOL_XPATH = etree.XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' symbol ')]")
+_DATA_SYMBOL_XPATH = etree.XPath("//a/@data-symbol")
+
+def iter_subindustries(industry_groups=INDUSTRY_GROUPS):
+    """Yields (group_key, subgroup) pairs from the industry_groups table."""
+    for entry in industry_groups:
+        for group_key, subgroups in entry.items():
+            for subgroup in subgroups:
+                yield group_key, subgroup
+
+def is_valid_symbol(symbol):
+    return bool(symbol) and len(symbol) < 15
+
+def parse_composition_json(data):
+    """Collects symbols from a composition API payload, including nested sub-indices."""
+    composition = data.get('composition', data) if isinstance(data, dict) else {}
+    symbols = [info.get('symbol') for info in composition.get('stockInfos', [])]
+    for sub_index in composition.get('subIndices', []):
+        symbols.extend(info.get('symbol') for info in sub_index.get('stockInfos', []))
+    return [s.strip() for s in symbols if s and is_valid_symbol(s.strip())]
+
+def parse_listing_html(content):
+    """Collects symbols from a server-rendered listing page (div.symbol text or data-symbol)."""
+    tree = lxml_html.fromstring(content)
+
+    # Strategy 1: Find the div with class "symbol" (visible text)
+    symbols = [el.text_content().strip() for el in _DIV_SYMBOL_XPATH(tree)]
+
+    # Strategy 2: If that fails, find the anchor tag with data-symbol attribute
+    if not any(symbols):
+        symbols = [value.strip() for value in _DATA_SYMBOL_XPATH(tree)]
+
+    return [s for s in symbols if is_valid_symbol(s)]
+
+def collect_symbols(pairs, results):
+    """Flattens per-sub-industry symbol lists into the rows saved to set_symbols."""
+    collected_data = []
+    for (group_key, subgroup), symbols in zip(pairs, results):
+        print(f"   {group_key} -> {subgroup}: found {len(symbols)} symbols.")
+        collected_data.extend(
+            {'symbol': symbol, 'group': group_key.upper(), 'sector': subgroup.upper()}
+            for symbol in symbols
+        )
+    return collected_data
+
+def create_session(pool_size=8, retries=3, backoff=0.5):
+    """Keep-alive session with a connection pool sized for the worker count."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(['GET']))
+    session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry))
+    return session
 
-# --- 3. Scraping Logic (FIXED) ---
+def fetch_subindustry_symbols(session, group_key, subgroup, timeout=15):
+    """Fetches one sub-industry's symbols: JSON API first, server-rendered HTML as fallback."""
+    # Handle special chars like & in URL
+    safe_subgroup = urllib.parse.quote(subgroup)
+
+    try:
+        response = session.get(COMPOSITION_API_URL.format(subgroup=safe_subgroup), timeout=timeout)
+        if response.status_code == 200 and 'json' in response.headers.get('Content-Type', ''):
+            symbols = parse_composition_json(response.json())
+            if symbols:
+                return symbols
+    except (requests.RequestException, ValueError) as e:
+        print(f"   API failed for {group_key} -> {subgroup}: {e}")
+
+    response = session.get(LISTING_PAGE_URL.format(group=group_key, subgroup=safe_subgroup), timeout=timeout)
+    response.raise_for_status()
+    return parse_listing_html(response.content)
+
+def scrape_set_symbols_http(industry_groups=INDUSTRY_GROUPS, max_workers=8, session=None):
+    """
+    Scrapes all sub-industry listings with concurrent plain HTTP requests.
 
-def scrape_set_symbols():
-    industry_groups = [
-        {'agro': ['agri', 'food']}, 
-        {'consump': ['fashion', 'home', 'person']}, 
-        {'fincial': ['bank', 'fin', 'insur']}, 
-        {'indus': ['auto', 'imm', 'paper', 'petro', 'pkg', 'steel']}, 
-        {'propcon': ['conmat', 'prop', 'pf&reit', 'cons']}, 
-        {'resourc': ['energ', 'mine']}, 
-        {'service': ['comm', 'helth', 'media', 'prof', 'tourism', 'trans']},
-        {'tech': ['etron', 'ict']}
-    ]
+    Args:
+        industry_groups (list): Industry group table driving the crawl.
+        max_workers (int): Sub-industry pages fetched at once.
+        session (requests.Session): Optional session, a pooled one is created by default.
+
+    Returns:
+        list: [{'symbol': 'AAI', 'group': 'AGRO', 'sector': 'FOOD'}, ...]
+    """
+    session = session or create_session(pool_size=max_workers)
+    pairs = list(iter_subindustries(industry_groups))
+    print(f"Starting HTTP scrape of {len(pairs)} sub-industries...")
+
+    def scrape(pair):
+        group_key, subgroup = pair
+        try:
+            return fetch_subindustry_symbols(session, group_key, subgroup)
+        except Exception as e:
+            print(f"Scraping Error: {group_key} -> {subgroup}: {e}")
+            return []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(scrape, pairs))
+
+    return collect_symbols(pairs, results)
+
+def scrape_set_symbols_browser(industry_groups=INDUSTRY_GROUPS, pool_size=3, wait_timeout=20):
+    """
+    Fallback crawl with a small pool of headless Chrome instances.
+
+    Each page waits for the symbol elements to render instead of sleeping
+    a fixed time. Selenium is only imported when this mode is used.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    from webdriver_manager.chrome import ChromeDriverManager
 
     options = webdriver.ChromeOptions()
     options.add_argument("--headless") 
@@ -91,66 +228,54 @@ def scrape_set_symbols():
     options.add_argument("--disable-dev-shm-usage")
     # Adding window size ensures elements are rendered in view (sometimes helps with lazy loading)
     options.add_argument("--window-size=1920,1080")
-    
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    
-    collected_data = []
-    
-    print(f"Starting scrape of {len(industry_groups)} industry groups...")
-    
+
+    service = Service(ChromeDriverManager().install())
+    drivers = queue.Queue()
+    for _ in range(pool_size):
+        drivers.put(webdriver.Chrome(service=service, options=options))
+
+    def scrape(pair):
+        group_key, subgroup = pair
+        driver = drivers.get()
+        try:
+            driver.get(LISTING_PAGE_URL.format(group=group_key, subgroup=urllib.parse.quote(subgroup)))
+            # Wait for Vue.js to render the listing
+            WebDriverWait(driver, wait_timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, SYMBOL_SELECTOR))
+            )
+            return parse_listing_html(driver.page_source)
+        except Exception as e:
+            print(f"Scraping Error: {group_key} -> {subgroup}: {e}")
+            return []
+        finally:
+            drivers.put(driver)
+
+    pairs = list(iter_subindustries(industry_groups))
+    print(f"Starting browser scrape of {len(pairs)} sub-industries with {pool_size} browsers...")
     try:
-        for entry in industry_groups:
-            group_key = list(entry.keys())[0]
-            subgroups = entry[group_key]
-            
-            for subgroup in subgroups:
-                # Handle special chars like & in URL
-                safe_subgroup = urllib.parse.quote(subgroup)
-                url = f"https://www.set.or.th/th/market/index/set/{group_key}/{safe_subgroup}"
-                print(f"Scraping: {group_key} -> {subgroup} ...")
-
-                driver.get(url)
-                time.sleep(5) # Wait for Vue.js
-
-                # --- NEW SELECTOR STRATEGY BASED ON IMAGE ---
-                # Strategy 1: Find the div with class "symbol" (visible text)
-                elements = driver.find_elements(By.CSS_SELECTOR, "div.symbol")
-                
-                # Strategy 2: If that fails, find the anchor tag with data-symbol attribute
-                if not elements:
-                    elements = driver.find_elements(By.CSS_SELECTOR, "a[data-symbol]")
-
-                count = 0
-                for elem in elements:
-                    # If we found the div.symbol, elem.text is the symbol (e.g. "AAI")
-                    # If we found the a[data-symbol], we need to get the attribute
-                    symbol = elem.text.strip()
-                    
-                    if not symbol:
-                        # Try getting from attribute if text is empty (fallback)
-                        symbol = elem.get_attribute("data-symbol")
-
-                    if symbol and len(symbol) < 15:
-                        collected_data.append({
-                            'symbol': symbol,
-                            'group': group_key.upper(),
-                            'sector': subgroup.upper()
-                        })
-                        count += 1
-
-                print(f"   -> Found {count} symbols.")
-            
-    except Exception as e:
-        print(f"Scraping Error: {e}")
+        with ThreadPoolExecutor(max_workers=pool_size) as pool:
+            results = list(pool.map(scrape, pairs))
     finally:
-        driver.quit()
-        
-    return collected_data
+        while not drivers.empty():
+            drivers.get().quit()
+
+    return collect_symbols(pairs, results)
+
+def scrape_set_symbols(mode='http'):
+    """Scrapes SET symbols per sub-industry. mode is 'http' (default) or 'browser'."""
+    if mode == 'browser':
+        return scrape_set_symbols_browser()
+    return scrape_set_symbols_http()
 
 # --- Main Execution ---
 
 if __name__ == "__main__":
-    symbols = scrape_set_symbols()
+    parser = argparse.ArgumentParser(description="Scrape SET symbols by sub-industry.")
+    parser.add_argument('--mode', choices=['http', 'browser'], default='http',
+                        help="'http' fetches listings directly; 'browser' renders them with headless Chrome.")
+    args = parser.parse_args()
+
+    symbols = scrape_set_symbols(args.mode)
     if symbols:
         save_symbols_to_db(symbols)
     else:
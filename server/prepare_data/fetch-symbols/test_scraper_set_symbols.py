@@ -0,0 +1,56 @@
+from scraper_set_symbols import parse_composition_json, parse_listing_html, scrape_set_symbols_http
+
+
+class FakeResponse:
+    def __init__(self, status_code, json_data=None, content=b'', content_type='text/html'):
+        self.status_code = status_code
+        self._json = json_data
+        self.content = content
+        self.headers = {'Content-Type': content_type}
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    def __init__(self, routes):
+        self.routes = routes
+
+    def get(self, url, timeout=None):
+        for fragment, response in self.routes.items():
+            if fragment in url:
+                return response
+        return FakeResponse(404)
+
+
+def test_parse_composition_json_includes_sub_indices():
+    data = {'composition': {
+        'stockInfos': [{'symbol': 'AAI'}],
+        'subIndices': [{'stockInfos': [{'symbol': 'CPF '}, {'symbol': ''}]}],
+    }}
+    assert parse_composition_json(data) == ['AAI', 'CPF']
+
+
+def test_parse_listing_html_falls_back_to_data_symbol():
+    page = b'<html><body><div class="symbol fs-16px">KBANK</div><div class="symbol">SCB</div></body></html>'
+    assert parse_listing_html(page) == ['KBANK', 'SCB']
+
+    anchors = b'<html><body><a data-symbol="PTT" href="#"></a><a data-symbol="PTTEP"></a></body></html>'
+    assert parse_listing_html(anchors) == ['PTT', 'PTTEP']
+
+
+def test_http_scrape_uses_api_then_html_fallback():
+    session = FakeSession({
+        '/api/set/index/agri/': FakeResponse(200, {'composition': {'stockInfos': [{'symbol': 'AAI'}]}},
+                                            content_type='application/json'),
+        '/set/agro/food': FakeResponse(200, content=b'<div class="symbol">CPF</div>'),
+    })
+    data = scrape_set_symbols_http([{'agro': ['agri', 'food']}], max_workers=2, session=session)
+    assert data == [
+        {'symbol': 'AAI', 'group': 'AGRO', 'sector': 'AGRI'},
+        {'symbol': 'CPF', 'group': 'AGRO', 'sector': 'FOOD'},
+    ]
@@ -0,0 +1,244 @@
+"""
+FX rates: ingestion into the trading database and vectorized as-of conversion.
+
+Rates such as USDTHB are downloaded from yfinance (USDTHB=X), reshaped
+with the same wide -> long path as equities, and merged with COPY into one
+hypertable per interval: fx_rates for daily bars, fx_rates_1h etc. for
+intraday ones, so a daily bar at 00:00 UTC never collides with the hourly
+bar at the same time. RateTable keeps one sorted time array per pair, so
+converting millions of amounts is a binary search (np.searchsorted) per
+currency instead of a lookup per row.
+
+    python fx.py [--pairs USDTHB EURTHB] [--interval 1d|1h] [--full]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from sqlalchemy import text
+
+from bulk_load import copy_dataframe
+from intervals import DAILY, bar_length, interval_table, range_kwargs
+from ohlcv_transform import to_long_frame
+from timescale_schema import ensure_hypertable
+from timestamps import to_ns
+from watermarks import read_watermarks
+
+FX_TABLE = 'fx_rates'
+DEFAULT_PAIRS = ['USDTHB']
+
+# Currency used to cross pairs that aren't stored directly
+PIVOT_CURRENCY = 'USD'
+
+
+def rates_table(interval=DAILY):
+    """Table holding one bar interval: 'fx_rates' for 1d, 'fx_rates_1h' for 1h."""
+    return interval_table(FX_TABLE, interval)
+
+
+def init_db(engine, interval=DAILY):
+    """Creates the rates hypertable for one interval (compressed, segmented by pair)."""
+    table = rates_table(interval)
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                time TIMESTAMPTZ NOT NULL,
+                pair TEXT NOT NULL,
+                rate DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (time, pair)
+            );
+        """))
+        ensure_hypertable(conn, table, 'pair')
+        conn.commit()
+
+
+def provider_symbol(pair):
+    """'USDTHB' -> 'USDTHB=X'"""
+    return f"{pair}=X"
+
+
+def download_rates(pairs, interval='1d', period=None, start=None):
+    """
+    Downloads closing rates for several pairs in one yfinance call.
+
+    Returns:
+        DataFrame: Columns time, pair, rate.
+    """
+    symbols = [provider_symbol(p) for p in pairs]
+    wide = yf.download(symbols, interval=interval, group_by='ticker', progress=False,
+                       auto_adjust=False, threads=False, **range_kwargs(interval, period, start))
+    return rates_frame(wide, pairs)
+
+
+def rates_frame(wide, pairs):
+    """Turns a yf.download frame of =X symbols into (time, pair, rate) rows."""
+    long = to_long_frame(wide, [provider_symbol(p) for p in pairs], price_dtype='float64')
+    rows = pd.DataFrame({
+        'time': long['time'],
+        'pair': long['ticker'].astype(str).str.removesuffix('=X'),
+        'rate': long['close'].astype('float64'),
+    })
+    return rows[rows['rate'].notna()].reset_index(drop=True)
+
+
+def ingest_rates(engine, pairs=DEFAULT_PAIRS, interval='1d', full=False, fetch=download_rates):
+    """
+    Loads new rate points into the interval's table through the COPY + merge path.
+
+    Incremental by default: each pair is fetched from its latest stored day on
+    (the last day is re-fetched so a partial intraday close gets replaced).
+
+    Returns:
+        int: Rows written.
+    """
+    table = rates_table(interval)
+    watermarks = {} if full else read_watermarks(engine, table, 'pair')
+    by_start = {}
+    for pair in pairs:
+        by_start.setdefault(watermarks.get(pair), []).append(pair)
+
+    written = 0
+    for start, group in by_start.items():
+        df = fetch(group, interval=interval, start=start.isoformat() if start else None)
+        if df.empty:
+            print(f"No FX data for {', '.join(group)}")
+            continue
+        copy_dataframe(engine, df, table, conflict_columns=['time', 'pair'])
+        written += len(df)
+    return written
+
+
+class RateTable:
+    """
+    In-memory as-of lookup over rate series.
+
+    Each pair is stored as sorted int64 nanosecond timestamps and float64
+    rates. A lookup returns the latest rate at or before each requested time
+    (NaN before the first point). Missing pairs are derived from the inverse
+    pair or crossed through PIVOT_CURRENCY.
+    """
+
+    def __init__(self, series=None):
+        self._series = {}
+        for pair, (times, rates) in (series or {}).items():
+            self.add(pair, times, rates)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds the table from (time, pair, rate) rows in any order."""
+        table = cls()
+        for pair, group in df.groupby('pair', sort=False):
+            table.add(str(pair), group['time'], group['rate'])
+        return table
+
+    def add(self, pair, times, rates):
+        times = to_ns(times)
+        rates = np.asarray(rates, dtype='float64')
+        order = np.argsort(times, kind='stable')
+        self._series[pair.upper()] = (times[order], rates[order])
+
+    @property
+    def pairs(self):
+        return sorted(self._series)
+
+    def _direct(self, pair, times):
+        times_, rates = self._series[pair]
+        idx = np.searchsorted(times_, times, side='right') - 1
+        return np.where(idx >= 0, rates[np.maximum(idx, 0)], np.nan)
+
+    def factor(self, source, target, times):
+        """
+        Multipliers converting `source` amounts into `target` at each time.
+
+        Args:
+            source (str): Currency code, e.g. 'USD'.
+            target (str): Currency code, e.g. 'THB'.
+            times: Timestamps (array-like, DatetimeIndex or a single value).
+
+        Returns:
+            ndarray: float64 factors, NaN where no rate is known yet.
+        """
+        source, target = source.upper(), target.upper()
+        times = to_ns(times)
+        if source == target:
+            return np.ones(len(times))
+        if source + target in self._series:
+            return self._direct(source + target, times)
+        if target + source in self._series:
+            return 1.0 / self._direct(target + source, times)
+        if PIVOT_CURRENCY not in (source, target):
+            return self.factor(source, PIVOT_CURRENCY, times) * self.factor(PIVOT_CURRENCY, target, times)
+        raise KeyError(f"No FX rate for {source}->{target}")
+
+    def convert(self, amounts, currencies, target, times):
+        """
+        Converts amounts in mixed currencies into `target`.
+
+        Work is done once per distinct currency, with a vectorized as-of
+        lookup over all of its rows.
+
+        Args:
+            amounts: Values to convert.
+            currencies: Currency per value (array-like) or one code for all.
+            target (str): Output currency.
+            times: Valuation time per value, or one time for all.
+
+        Returns:
+            ndarray: Converted amounts (NaN where no rate is known).
+        """
+        amounts = np.asarray(amounts, dtype='float64')
+        times = to_ns(times)
+        if len(times) == 1 and len(amounts) != 1:
+            times = np.repeat(times, len(amounts))
+        if isinstance(currencies, str):
+            return amounts * self.factor(currencies, target, times)
+
+        # Missing currencies (code -1) are taken to be the target already
+        codes, uniques = pd.factorize(pd.Series(currencies))
+        out = amounts.copy()
+        for i, currency in enumerate(uniques):
+            mask = codes == i
+            out[mask] *= self.factor(str(currency), target, times[mask])
+        return out
+
+    def latest(self, source, target):
+        """Most recent conversion factor."""
+        return float(self.factor(source, target, np.array([np.iinfo('int64').max]))[0])
+
+
+def load_rates(engine, pairs=None, start=None, interval=DAILY):
+    """
+    Reads one interval's rates into a RateTable.
+
+    Bars are stamped with their open time, but a bar's close is only known
+    once it ends, so each rate takes effect at time + bar length. A daily
+    close therefore can't leak into as-of lookups earlier that same day.
+    """
+    sql = f"SELECT time, pair, rate FROM {rates_table(interval)} WHERE TRUE"
+    params = {}
+    if pairs:
+        sql += " AND pair = ANY(:pairs)"
+        params['pairs'] = list(pairs)
+    if start:
+        sql += " AND time >= :start"
+        params['start'] = start
+    with engine.connect() as conn:
+        df = pd.read_sql(text(sql), conn, params=params)
+    df['time'] = pd.to_datetime(df['time'], utc=True) + bar_length(interval)
+    return RateTable.from_frame(df)
+
+
+if __name__ == "__main__":
+    from db import ensure_schema, get_engine
+
+    parser = argparse.ArgumentParser(description="Ingest FX rate series into the trading database.")
+    parser.add_argument('--pairs', nargs='+', default=DEFAULT_PAIRS, help="Pairs such as USDTHB.")
+    parser.add_argument('--interval', default='1d', help="yfinance interval, e.g. 1d or 1h.")
+    parser.add_argument('--full', action='store_true', help="Re-download the full history.")
+    args = parser.parse_args()
+
+    engine = get_engine('trading')
+    ensure_schema(engine, rates_table(args.interval), lambda e: init_db(e, args.interval))
+    rows = ingest_rates(engine, [p.upper() for p in args.pairs], args.interval, args.full)
+    print(f"Stored {rows} FX points.")
@@ -0,0 +1,208 @@
+"""
+Gold prices: stored GC=F series, a cached latest price and vectorized
+conversion between ounces, grams and Thai baht weight, purity and currency.
+
+GC=F quotes USD per troy ounce of fine gold. gold_books records weight in
+GRAM/BAHT/OUNCE, a purity (96.50, 99.99) and usually THB prices, so every
+holding is converted through fine troy ounces. Baht-weight values are
+spot-equivalent and ignore the Thai gold traders' association premium.
+
+    python gold.py [--interval 1d|1h] [--full]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from sqlalchemy import text
+
+from bulk_load import copy_dataframe
+from intervals import DAILY, interval_table, range_kwargs
+from ohlcv_transform import to_long_frame
+from quote_cache import DEFAULT_CACHE
+from quote_engine import DEFAULT_PROVIDER
+from timescale_schema import init_price_schema
+from watermarks import read_watermarks
+
+GOLD_SYMBOL = 'GC=F'
+# Daily bars; intraday intervals get their own table (see price_table)
+GOLD_TABLE = 'gold_prices'
+QUOTE_CURRENCY = 'USD'
+
+TROY_OUNCE_GRAMS = 31.1034768
+# Thai bullion baht weight; ornaments use 15.16 g but trade on the bullion price
+UNIT_GRAMS = {'GRAM': 1.0, 'BAHT': 15.244, 'OUNCE': TROY_OUNCE_GRAMS}
+
+
+def price_table(interval=DAILY):
+    """Table holding one bar interval: 'gold_prices' for 1d, 'gold_prices_1h' for 1h."""
+    return interval_table(GOLD_TABLE, interval)
+
+
+def init_db(engine, interval=DAILY):
+    """
+    Creates the gold OHLCV hypertable for one interval.
+
+    Daily and intraday bars live in separate tables, so the GC=F bar at
+    00:00 UTC never overwrites a daily close. Only the daily table gets
+    weekly/monthly aggregates.
+    """
+    init_price_schema(engine, price_table(interval), 'symbol', aggregates=interval == DAILY)
+
+
+# --- Series ---
+
+def download_gold(interval='1d', period=None, start=None, symbol=GOLD_SYMBOL):
+    """Downloads GC=F bars as (time, symbol, open, high, low, close, volume) rows."""
+    wide = yf.download([symbol], interval=interval, group_by='ticker', progress=False,
+                       auto_adjust=False, threads=False, **range_kwargs(interval, period, start))
+    long = to_long_frame(wide, [symbol], price_dtype='float64')
+    return long.rename(columns={'ticker': 'symbol'}).astype({'symbol': str})
+
+
+def ingest_gold(engine, interval=DAILY, full=False, fetch=download_gold):
+    """
+    Merges new gold bars into the interval's table, resuming from the latest stored day.
+
+    Returns:
+        int: Rows written.
+    """
+    table = price_table(interval)
+    last = None if full else read_watermarks(engine, table, 'symbol').get(GOLD_SYMBOL)
+    df = fetch(interval=interval, start=last.isoformat() if last else None)
+    if df.empty:
+        print("No gold data returned.")
+        return 0
+    copy_dataframe(engine, df, table, conflict_columns=['time', 'symbol'])
+    return len(df)
+
+
+def load_series(engine, start=None, end=None, interval=DAILY):
+    """Stored GC=F closes of one interval as a Series indexed by bar open time (USD per ounce)."""
+    sql = f"SELECT time, close FROM {price_table(interval)} WHERE symbol = :symbol"
+    params = {'symbol': GOLD_SYMBOL}
+    if start:
+        sql += " AND time >= :start"
+        params['start'] = start
+    if end:
+        sql += " AND time <= :end"
+        params['end'] = end
+    sql += " ORDER BY time"
+    with engine.connect() as conn:
+        df = pd.read_sql(text(sql), conn, params=params)
+    return df.set_index('time')['close']
+
+
+def latest_stored_price(engine, interval=DAILY):
+    with engine.connect() as conn:
+        return conn.execute(
+            text(f"SELECT close FROM {price_table(interval)} WHERE symbol = :symbol ORDER BY time DESC LIMIT 1;"),
+            {'symbol': GOLD_SYMBOL},
+        ).scalar()
+
+
+def latest_price(cache=DEFAULT_CACHE, provider=DEFAULT_PROVIDER, engine=None):
+    """
+    Latest GC=F price in USD per ounce.
+
+    Served from the in-memory quote cache while fresh; otherwise one fast_info
+    lookup, no history download. If the provider has nothing and an engine is
+    given, the newest stored bar is used.
+    """
+    def load():
+        try:
+            return provider.get_price(GOLD_SYMBOL)
+        except Exception as e:
+            print(f"Gold quote failed: {e}")
+            return None
+
+    price = load() if cache is None else cache.get_or_fetch(provider.name, GOLD_SYMBOL, 'GOLD', load)
+    if price is None and engine is not None:
+        price = latest_stored_price(engine)
+    return None if price is None else float(price)
+
+
+# --- Conversion ---
+
+def unit_grams(units):
+    """Grams per unit for an array of unit codes (missing -> GRAM)."""
+    codes = pd.Series(units, dtype=object).fillna('GRAM').str.upper()
+    grams = codes.map(UNIT_GRAMS)
+    if grams.isna().any():
+        raise ValueError(f"Unknown gold units: {sorted(set(codes[grams.isna()]))}")
+    return grams.to_numpy(dtype='float64')
+
+
+def fine_ounces(amount, unit, purity):
+    """Fine troy ounces in `amount` of `unit` at `purity` percent (vectorized)."""
+    amount = np.asarray(amount, dtype='float64')
+    purity = np.asarray(purity, dtype='float64')
+    return amount * unit_grams(np.broadcast_to(unit, amount.shape)) / TROY_OUNCE_GRAMS * purity / 100.0
+
+
+def currency_factors(currencies, fx=None, times=None):
+    """USD -> currency multipliers; one RateTable lookup per distinct currency."""
+    currencies = pd.Series(currencies, dtype=object).fillna(QUOTE_CURRENCY).str.upper()
+    if fx is None:
+        if (currencies != QUOTE_CURRENCY).any():
+            raise ValueError("An FX RateTable is needed to price gold outside USD")
+        return np.ones(len(currencies))
+    factors = np.empty(len(currencies))
+    for currency, rows in currencies.groupby(currencies).indices.items():
+        if times is None:
+            factors[rows] = fx.latest(QUOTE_CURRENCY, currency)
+        else:
+            factors[rows] = fx.factor(QUOTE_CURRENCY, currency, pd.DatetimeIndex(times)[rows])
+    return factors
+
+
+def unit_prices(usd_per_ounce, unit, purity, currency, fx=None, times=None):
+    """
+    Price of one `unit` at `purity` in `currency`, for many rows at once.
+
+    Args:
+        usd_per_ounce (float or array): GC=F price(s).
+        unit, purity, currency: Per-row arrays (or scalars broadcast to all rows).
+        fx (RateTable): Needed when any currency isn't USD.
+        times: Per-row conversion times; latest rates when omitted.
+    """
+    purity = np.atleast_1d(np.asarray(purity, dtype='float64'))
+    n = len(purity)
+    ounces_per_unit = fine_ounces(np.ones(n), np.broadcast_to(unit, (n,)), purity)
+    factors = currency_factors(np.broadcast_to(currency, (n,)), fx, times)
+    return np.asarray(usd_per_ounce, dtype='float64') * ounces_per_unit * factors
+
+
+def value_holdings(holdings, usd_per_ounce, fx=None):
+    """
+    Values gold_books-style rows in one pass.
+
+    Args:
+        holdings (DataFrame): Columns amount, unit, gold_purity, currency.
+        usd_per_ounce (float): Current GC=F price.
+        fx (RateTable): For non-USD currencies.
+
+    Returns:
+        DataFrame: `holdings` plus fine_oz, unit_price and market_value (in each row's currency).
+    """
+    unit = holdings['unit'].to_numpy(dtype=object)
+    purity = holdings['gold_purity'].to_numpy(dtype='float64')
+    price = unit_prices(usd_per_ounce, unit, purity, holdings['currency'].to_numpy(dtype=object), fx)
+    return holdings.assign(
+        fine_oz=fine_ounces(holdings['amount'], unit, purity),
+        unit_price=price,
+        market_value=holdings['amount'].to_numpy(dtype='float64') * price,
+    )
+
+
+if __name__ == "__main__":
+    from db import ensure_schema, get_engine
+
+    parser = argparse.ArgumentParser(description="Ingest GC=F gold bars into the trading database.")
+    parser.add_argument('--interval', default='1d', help="yfinance interval, e.g. 1d or 1h.")
+    parser.add_argument('--full', action='store_true', help="Re-download the full history.")
+    args = parser.parse_args()
+
+    engine = get_engine('trading')
+    ensure_schema(engine, price_table(args.interval), lambda e: init_db(e, args.interval))
+    print(f"Stored {ingest_gold(engine, args.interval, args.full)} gold bars.")
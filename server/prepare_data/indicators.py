@@ -0,0 +1,260 @@
+"""
+Vectorized returns and technical indicators over the ingested OHLCV bars.
+
+Closes are loaded into one date x ticker NumPy matrix (from the hypertable
+or the local Parquet cache). Every indicator is a whole-matrix kernel built
+on cumulative sums, so all tickers are computed at once. Results go back into
+the sp500_indicators hypertable in bulk.
+
+    python indicators.py [--full] [--source db|parquet] [--root DIR]
+
+Incremental runs only emit bars newer than each ticker's latest indicator
+row. They reload just enough history for the longest window, and seed the
+drawdown peak from the stored one.
+"""
+import argparse
+import datetime
+import math
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from bulk_load import copy_dataframe, quote_ident
+from timescale_schema import ensure_hypertable
+from watermarks import read_watermarks
+
+INDICATOR_TABLE = 'sp500_indicators'
+PRICE_TABLE = 'sp500_stock_prices'
+
+SMA_WINDOWS = (20, 50, 200)
+VOLATILITY_WINDOW = 20
+TRADING_DAYS = 252
+
+# Incremental lookback padding on top of the 7/5 weekend ratio: exchange
+# holidays (about 10 a year) and trading halts
+LOOKBACK_MARGIN = 1.1
+LOOKBACK_EXTRA_DAYS = 21
+
+INDICATOR_COLUMNS = (['return_1d', 'log_return']
+                     + [f"sma_{w}" for w in SMA_WINDOWS]
+                     + [f"volatility_{VOLATILITY_WINDOW}", 'peak', 'drawdown'])
+
+
+def init_db(engine):
+    """Creates the indicator hypertable (compressed, segmented by ticker)."""
+    columns = ',\n'.join(f"                {c} DOUBLE PRECISION" for c in INDICATOR_COLUMNS)
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {INDICATOR_TABLE} (
+                time TIMESTAMPTZ NOT NULL,
+                ticker TEXT NOT NULL,
+{columns},
+                PRIMARY KEY (time, ticker)
+            );
+        """))
+        ensure_hypertable(conn, INDICATOR_TABLE, 'ticker')
+        conn.commit()
+
+
+# --- Kernels: 2-D float arrays, axis 0 is time, NaN where a ticker has no bar ---
+
+def simple_returns(close):
+    out = np.full_like(close, np.nan)
+    out[1:] = close[1:] / close[:-1] - 1.0
+    return out
+
+
+def log_returns(close):
+    out = np.full_like(close, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[1:] = np.log(close[1:] / close[:-1])
+    return out
+
+
+def _window_sums(values, window):
+    """Trailing window sums of values (NaN counted as 0) and of valid observations."""
+    valid = ~np.isnan(values)
+    padded = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    padded[1:] = np.cumsum(np.where(valid, values, 0.0), axis=0)
+    counts = np.zeros(padded.shape, dtype=np.int64)
+    counts[1:] = np.cumsum(valid, axis=0)
+
+    sums = np.full(values.shape, np.nan)
+    n = np.zeros(values.shape, dtype=np.int64)
+    if values.shape[0] >= window:
+        sums[window - 1:] = padded[window:] - padded[:-window]
+        n[window - 1:] = counts[window:] - counts[:-window]
+    return sums, n
+
+
+def rolling_mean(values, window):
+    """Trailing mean; NaN unless the window holds `window` valid values."""
+    sums, n = _window_sums(values, window)
+    return np.where(n == window, sums / window, np.nan)
+
+
+def rolling_std(values, window, ddof=1):
+    """Trailing standard deviation from windowed sums of x and x^2."""
+    sums, n = _window_sums(values, window)
+    squares, _ = _window_sums(values * values, window)
+    mean = sums / window
+    variance = (squares - window * mean * mean) / (window - ddof)
+    return np.where(n == window, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+
+def running_peak(close, seed=None):
+    """Running maximum per ticker, optionally starting from a previous peak per column."""
+    peak = np.fmax.accumulate(close, axis=0)
+    if seed is not None:
+        peak = np.fmax(peak, seed[np.newaxis, :])
+    return np.where(np.isnan(close), np.nan, peak)
+
+
+def compute_indicators(close, peak_seed=None):
+    """
+    Computes every indicator for a whole close matrix.
+
+    Args:
+        close (ndarray): (dates, tickers) closes.
+        peak_seed (ndarray): Per-ticker peak before the first row, for incremental runs.
+
+    Returns:
+        dict: {column: (dates, tickers) ndarray} for INDICATOR_COLUMNS.
+    """
+    close = np.asarray(close, dtype='float64')
+    returns = simple_returns(close)
+    result = {'return_1d': returns, 'log_return': log_returns(close)}
+    for window in SMA_WINDOWS:
+        result[f"sma_{window}"] = rolling_mean(close, window)
+    result[f"volatility_{VOLATILITY_WINDOW}"] = rolling_std(returns, VOLATILITY_WINDOW) * math.sqrt(TRADING_DAYS)
+    peak = running_peak(close, peak_seed)
+    result['peak'] = peak
+    result['drawdown'] = close / peak - 1.0
+    return result
+
+
+def to_rows(matrix, indicators, after=None):
+    """
+    Stacks indicator matrices into long (time, ticker, ...) rows.
+
+    Args:
+        matrix (DataFrame): The date x ticker close frame the indicators came from.
+        indicators (dict): compute_indicators output.
+        after (dict): {ticker: date}; only bars after it are emitted for that ticker.
+    """
+    keep = ~np.isnan(matrix.to_numpy(dtype='float64'))
+    if after:
+        # Watermarks are dates, so compare on the bar's calendar day
+        days = pd.DatetimeIndex(matrix.index).normalize().to_numpy(dtype='datetime64[D]')
+        cutoff = np.array([after.get(t, np.datetime64('NaT')) for t in matrix.columns], dtype='datetime64[D]')
+        keep &= (days[:, np.newaxis] > cutoff[np.newaxis, :]) | np.isnat(cutoff)[np.newaxis, :]
+
+    rows, cols = np.nonzero(keep)
+    long = pd.DataFrame({
+        'time': matrix.index[rows],
+        'ticker': pd.Categorical.from_codes(cols, categories=list(matrix.columns)),
+    })
+    for column in INDICATOR_COLUMNS:
+        long[column] = indicators[column][rows, cols]
+    return long
+
+
+# --- Loading and storage ---
+
+def load_close_matrix(engine=None, tickers=None, start=None, source='db', root=None):
+    """
+    Loads closes as a date x ticker frame from the hypertable or the Parquet cache.
+
+    Returns:
+        DataFrame: DatetimeIndex (UTC) rows, one column per ticker, NaN for missing bars.
+    """
+    if source == 'parquet':
+        from parquet_cache import DEFAULT_ROOT, read_matrix
+        return read_matrix('close', tickers=tickers, start=start, root=root or DEFAULT_ROOT)
+
+    sql = f"SELECT time, ticker, close FROM {PRICE_TABLE} WHERE TRUE"
+    params = {}
+    if tickers:
+        sql += " AND ticker = ANY(:tickers)"
+        params['tickers'] = list(tickers)
+    if start:
+        sql += " AND time >= :start"
+        params['start'] = start
+    with engine.connect() as conn:
+        df = pd.read_sql(text(sql), conn, params=params)
+    return df.pivot(index='time', columns='ticker', values='close').sort_index()
+
+
+def read_peaks(engine):
+    """Latest stored drawdown peak per ticker."""
+    sql = text(f"SELECT DISTINCT ON (ticker) ticker, peak FROM {quote_ident(INDICATOR_TABLE)} "
+               f"ORDER BY ticker, time DESC;")
+    with engine.connect() as conn:
+        return {row.ticker: row.peak for row in conn.execute(sql)}
+
+
+def lookback_start(after, window=max(SMA_WINDOWS)):
+    """
+    Calendar start date that still covers `window` trading days before the oldest watermark.
+
+    A bare 7/5 conversion lands on roughly `window` trading days once holidays
+    are taken out, which can leave the first new SMA-200 on a short window.
+    """
+    days = math.ceil(window * 7 / 5 * LOOKBACK_MARGIN) + LOOKBACK_EXTRA_DAYS
+    return min(after.values()) - datetime.timedelta(days=days)
+
+
+def update_indicators(engine, full=False, source='db', root=None):
+    """
+    Computes indicators and bulk-writes them into sp500_indicators.
+
+    Args:
+        engine: SQLAlchemy engine for the trading database.
+        full (bool): Recompute all history instead of only bars after each ticker's watermark.
+        source (str): 'db' or 'parquet' for the close prices.
+        root (str): Parquet cache root when source='parquet'.
+
+    Returns:
+        int: Rows written.
+    """
+    after = {} if full else read_watermarks(engine, INDICATOR_TABLE)
+    peaks = {} if full else read_peaks(engine)
+    prices = read_watermarks(engine, PRICE_TABLE)
+    new_tickers = [t for t in prices if t not in after]
+
+    # Known tickers reload only the lookback window; new ones need their full history
+    jobs = []
+    if after:
+        jobs.append((list(after), lookback_start(after)))
+    if new_tickers:
+        jobs.append((None if not after else new_tickers, None))
+
+    written = 0
+    for tickers, start in jobs:
+        matrix = load_close_matrix(engine, tickers, start, source, root)
+        if matrix.empty:
+            continue
+        seed = np.array([peaks.get(t, np.nan) for t in matrix.columns], dtype='float64')
+        indicators = compute_indicators(matrix.to_numpy(dtype='float64'), seed)
+        rows = to_rows(matrix, indicators, after)
+        if rows.empty:
+            continue
+        copy_dataframe(engine, rows, INDICATOR_TABLE, conflict_columns=['time', 'ticker'])
+        written += len(rows)
+    print(f"Indicators: wrote {written} rows.")
+    return written
+
+
+if __name__ == "__main__":
+    from db import ensure_schema, get_engine
+
+    parser = argparse.ArgumentParser(description="Compute returns, SMAs, volatility and drawdowns for all tickers.")
+    parser.add_argument('--full', action='store_true', help="Recompute the whole history.")
+    parser.add_argument('--source', choices=['db', 'parquet'], default='db', help="Where to read closes from.")
+    parser.add_argument('--root', help="Parquet cache root for --source parquet.")
+    args = parser.parse_args()
+
+    engine = get_engine('trading')
+    ensure_schema(engine, INDICATOR_TABLE, init_db)
+    update_indicators(engine, full=args.full, source=args.source, root=args.root)
@@ -0,0 +1,314 @@
+"""
+Multi-process historical backfill for any symbol universe.
+
+Symbols come from asset.sp500_symbols, asset.set_symbols or a text file
+(one symbol per line). The market suffix maps them to yfinance tickers, e.g.
+KTC -> KTC.BK. Download batches are spread round-robin over a process pool.
+Each process runs its own BatchDownloader (threads plus a share of the
+request-rate budget) and its own DB connections. Processes report every
+stored batch to the parent, which prints merged progress and keeps the
+single resumable checkpoint.
+
+    python backfill.py --source set_symbols --start 1990-01-01
+    python backfill.py --source sp500_symbols --start 2000-01-01 --end 2010-12-31 --processes 8 --rate 8
+    python backfill.py --source my_list.txt --suffix .BK --table set_stock_prices --incremental
+
+Rows are stored under the local symbol (the yfinance ticker without the
+suffix), so S&P 500 rows keep their BRK-B style tickers and SET rows use
+the books symbols. The checkpoint is keyed by the source symbols (BRK.B),
+and each source/table/range gets its own checkpoint file unless
+--checkpoint names one.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import yfinance as yf
+from sqlalchemy import text
+
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backfill_state import Checkpoint, default_path
+from batch_downloader import BatchDownloader, make_batches
+from bulk_load import copy_dataframe
+from db import dispose_engines, ensure_schema, get_engine
+from instrumentation import count, job_run
+from ohlcv_transform import to_long_frame
+from sp500_constituents import yfinance_ticker
+from timescale_schema import init_price_schema
+from watermarks import plan_incremental, read_watermarks
+
+# Symbol tables: where the universe lives, its yfinance suffix and the price table it fills
+SOURCES = {
+    'sp500_symbols': {'table': 'asset.sp500_symbols', 'suffix': '', 'target': 'sp500_stock_prices'},
+    'set_symbols': {'table': 'asset.set_symbols', 'suffix': '.BK', 'target': 'set_stock_prices'},
+}
+
+# Per-run settings shipped to every worker process
+BackfillOptions = namedtuple('BackfillOptions', ['table', 'suffix', 'threads', 'rate', 'fetch', 'load'])
+
+
+def load_symbols(source):
+    """
+    Local symbols of a source: a SOURCES name (read from the asset DB) or a file path.
+
+    Files hold one symbol per line; anything after a comma or '#' is ignored.
+    """
+    if source in SOURCES:
+        engine = get_engine('asset')
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT symbol FROM {SOURCES[source]['table']} ORDER BY symbol")).scalars()
+            return [s.strip().upper() for s in rows if s]
+
+    symbols = []
+    with open(source) as f:
+        for line in f:
+            symbol = line.split('#')[0].split(',')[0].strip().upper()
+            if symbol:
+                symbols.append(symbol)
+    return list(dict.fromkeys(symbols))
+
+
+def provider_tickers(symbols, suffix):
+    """Local symbol -> yfinance ticker, e.g. ('BRK.B', '') -> 'BRK-B', ('KTC', '.BK') -> 'KTC.BK'."""
+    return [yfinance_ticker(s) + suffix for s in symbols]
+
+
+def local_ticker(ticker, suffix):
+    return ticker[:-len(suffix)] if suffix and ticker.endswith(suffix) else ticker
+
+
+def checkpoint_name(source, table, start=None, end=None, period=None):
+    """Job name for a backfill, e.g. 'backfill-set_symbols-set_stock_prices-1990-01-01-latest'."""
+    source = os.path.splitext(os.path.basename(source))[0]
+    return f"backfill-{source}-{table}-{start or period or 'max'}-{end or 'latest'}"
+
+
+def download_range(tickers, period=None, start=None, end=None):
+    """Daily bars for a batch of yfinance tickers over a period or a start/end range."""
+    range_kwargs = {'start': start, 'end': end} if start else {'period': period or 'max', 'end': end}
+    return yf.download(tickers, group_by='ticker', progress=False, auto_adjust=True, threads=False,
+                       **{k: v for k, v in range_kwargs.items() if v is not None})
+
+
+def copy_prices(df, table):
+    """Default loader: COPY + merge into `table` over this process's own engine."""
+    copy_dataframe(get_engine('trading'), df, table, conflict_columns=['time', 'ticker'])
+
+
+def plan_batches(tickers, batch_size, start=None, end=None, period=None, watermarks=None):
+    """
+    Download batches for provider tickers.
+
+    With watermarks ({provider ticker: last date}) only bars from each
+    ticker's watermark day on are planned, as in the incremental S&P 500
+    ingester; otherwise every ticker
+    gets the same start/end or period.
+    """
+    if watermarks is not None:
+        batches = plan_incremental(tickers, watermarks, batch_size, full_period=period or 'max')
+        if start or end:
+            # Tickers without history honour the requested range instead of the full period
+            for batch in batches:
+                if 'period' in batch.kwargs and start:
+                    batch.kwargs.pop('period')
+                    batch.kwargs['start'] = start
+                if end:
+                    batch.kwargs['end'] = end
+        return batches
+    return make_batches(tickers, batch_size, period=period, start=start, end=end)
+
+
+def shard(items, n):
+    """Round-robin split, so every process gets a similar mix of old and new listings."""
+    return [items[i::n] for i in range(n) if items[i::n]]
+
+
+def _init_worker():
+    # Connections inherited through fork belong to the parent
+    dispose_engines()
+
+
+def run_shard(shard_id, batches, options, progress):
+    """
+    Worker process body: downloads and stores one shard of batches.
+
+    Every stored batch is reported on `progress` as
+    ('stored', shard_id, {ticker: (rows, last_date)}, missing tickers).
+
+    Returns:
+        dict: BatchDownloader summary with failed tickers in local form.
+    """
+    def store(batch, frame):
+        df = to_long_frame(frame, batch.tickers, price_dtype='float64')
+        df['ticker'] = df['ticker'].cat.rename_categories(lambda t: local_ticker(t, options.suffix))
+        if not df.empty:
+            options.load(df, options.table)
+        per_ticker = {}
+        if not df.empty:
+            grouped = df.groupby('ticker', observed=True)['time'].agg(['size', 'max'])
+            per_ticker = {str(t): (int(rows), last.date().isoformat()) for t, (rows, last) in grouped.iterrows()}
+        missing = [local_ticker(t, options.suffix) for t in batch.tickers
+                   if local_ticker(t, options.suffix) not in per_ticker]
+        progress.put(('stored', shard_id, per_ticker, missing))
+
+    downloader = BatchDownloader(options.fetch, store, workers=options.threads, rate=options.rate)
+    summary = downloader.run_batches(batches)
+    summary['failed'] = {local_ticker(t, options.suffix): e for t, e in summary['failed'].items()}
+    return summary
+
+
+def run_backfill(batches, options, processes, checkpoint=None, mp_context=None, poll=0.5, symbols=None,
+                 empty_ok=()):
+    """
+    Runs batches across a process pool and merges their progress.
+
+    Args:
+        batches (list): Batch tuples of provider tickers (see plan_batches).
+        options (BackfillOptions): Settings for every worker; `rate` is the total budget.
+        processes (int): Worker processes.
+        checkpoint (Checkpoint): Updated from the merged progress by this process only.
+        mp_context: multiprocessing context (default: the platform's).
+        symbols (dict): {local ticker: source symbol}, e.g. {'BRK-B': 'BRK.B'}; checkpoint
+            and failure keys use the source symbol. Defaults to the local ticker.
+        empty_ok (iterable): Local tickers for which no new rows is not a failure
+            (incremental top-ups of tickers that already have history).
+
+    Returns:
+        dict: {'tickers', 'rows', 'failed': {symbol: error}, 'seconds', 'processes'}
+    """
+    start = time.perf_counter()
+    shards = shard(batches, max(1, processes))
+    total = sum(len(b.tickers) for b in batches)
+    result = {'tickers': total, 'rows': 0, 'failed': {}, 'processes': len(shards)}
+    if not shards:
+        result['seconds'] = 0.0
+        return result
+
+    # Each process gets an equal share of the request budget
+    per_process = options._replace(rate=options.rate / len(shards))
+    context = mp_context or multiprocessing.get_context()
+    symbols = symbols or {}
+    empty_ok = set(empty_ok)
+    reported = set()
+
+    def merge(progress):
+        while True:
+            try:
+                _, shard_id, per_ticker, missing = progress.get_nowait()
+            except queue.Empty:
+                return
+            rows = sum(r for r, _ in per_ticker.values())
+            reported.update(per_ticker, missing)
+            result['rows'] += rows
+            count('rows', rows, table=options.table)
+            if checkpoint is not None:
+                for ticker, (n, last_date) in per_ticker.items():
+                    checkpoint.mark_done(symbols.get(ticker, ticker), n, last_date)
+                for ticker in missing:
+                    if ticker in empty_ok:
+                        checkpoint.mark_done(symbols.get(ticker, ticker), 0)
+                    else:
+                        checkpoint.mark_failed(symbols.get(ticker, ticker), 'no data returned')
+                checkpoint.save()
+            elapsed = time.perf_counter() - start
+            print(f"[{len(reported)}/{total}] shard {shard_id}: +{rows} rows "
+                  f"({result['rows']:,} total, {result['rows'] / elapsed:,.0f} rows/s)")
+
+    with context.Manager() as manager:
+        progress = manager.Queue()
+        with ProcessPoolExecutor(len(shards), mp_context=context, initializer=_init_worker) as pool:
+            futures = {pool.submit(run_shard, i, part, per_process, progress): part for i, part in enumerate(shards)}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+                merge(progress)
+                for future in done:
+                    try:
+                        failed = future.result()['failed']
+                    except Exception as e:
+                        print(f"Backfill worker crashed: {e}")
+                        count('errors', stage='backfill_worker', error=type(e).__name__)
+                        # Whatever the shard never reported did not run
+                        tickers = (local_ticker(t, options.suffix) for b in futures[future] for t in b.tickers)
+                        failed = {t: f"worker crashed: {e}" for t in tickers if t not in reported}
+                    result['failed'].update({symbols.get(t, t): error for t, error in failed.items()})
+            merge(progress)
+
+    if checkpoint is not None:
+        for ticker, error in result['failed'].items():
+            checkpoint.mark_failed(ticker, error)
+        checkpoint.finish()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def main(source, suffix=None, table=None, start=None, end=None, period=None, processes=None, threads=4,
+         rate=4.0, batch_size=50, incremental=False, fresh=False, report=None, checkpoint_path=None):
+    config = SOURCES.get(source, {})
+    suffix = config.get('suffix', '') if suffix is None else suffix
+    table = table or config.get('target')
+    if not table:
+        raise SystemExit("--table is required for file sources")
+
+    symbols = load_symbols(source)
+    print(f"{len(symbols)} symbols from {source}, suffix {suffix!r} -> {table}")
+
+    engine = get_engine('trading')
+    ensure_schema(engine, table, lambda e: init_price_schema(e, table, 'ticker'))
+
+    job = checkpoint_name(source, table, start, end, period)
+    checkpoint = Checkpoint(checkpoint_path or default_path(job), job=job, fresh=fresh)
+    symbols = checkpoint.pending(symbols)
+    tickers = provider_tickers(symbols, suffix)
+    # Checkpoint keys stay in source form (BRK.B) while rows use the local ticker (BRK-B)
+    local_symbols = {local_ticker(t, suffix): s for t, s in zip(tickers, symbols)}
+
+    watermarks, stored = None, {}
+    if incremental:
+        stored = read_watermarks(engine, table)
+        watermarks = {yfinance_ticker(s) + suffix: d for s, d in stored.items()}
+    batches = plan_batches(tickers, batch_size, start, end, period, watermarks)
+
+    options = BackfillOptions(table, suffix, threads, rate, download_range, copy_prices)
+    result = run_backfill(batches, options, processes or os.cpu_count() or 1, checkpoint,
+                          symbols=local_symbols, empty_ok=stored)
+
+    print(f"Backfill finished in {result['seconds']:.1f}s: {result['rows']:,} rows over "
+          f"{result['processes']} processes, {len(result['failed'])} tickers failed.")
+    for ticker, error in sorted(result['failed'].items()):
+        print(f"Failed: {ticker}: {error}")
+    if report:
+        checkpoint.write_report(report)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill daily price history for a symbol universe.")
+    parser.add_argument('--source', required=True,
+                        help=f"Symbol source: {', '.join(SOURCES)} or a file with one symbol per line.")
+    parser.add_argument('--suffix', help="yfinance market suffix, e.g. .BK (defaults per source).")
+    parser.add_argument('--table', help="Target price table (defaults per source).")
+    parser.add_argument('--start', help="First day to download, e.g. 1990-01-01.")
+    parser.add_argument('--end', help="Day after the last one to download (yfinance semantics).")
+    parser.add_argument('--period', default='max', help="yfinance period when --start is not given.")
+    parser.add_argument('--processes', type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument('--threads', type=int, default=4, help="Download threads per process.")
+    parser.add_argument('--rate', type=float, default=4.0, help="Requests per second across all processes.")
+    parser.add_argument('--batch-size', type=int, default=50, help="Tickers per yfinance request.")
+    parser.add_argument('--incremental', action='store_true', help="Only fetch bars from each ticker's latest stored day on.")
+    parser.add_argument('--checkpoint',
+                        help="Per-symbol job state file (default: one per source, table and range).")
+    parser.add_argument('--fresh', action='store_true', help="Ignore any existing checkpoint.")
+    parser.add_argument('--report', help="Write a JSON report of done and failed tickers to this path.")
+    args = parser.parse_args()
+
+    with job_run('backfill'):
+        main(args.source, args.suffix, args.table, args.start, args.end, args.period, args.processes,
+             args.threads, args.rate, args.batch_size, args.incremental, args.fresh, args.report,
+             args.checkpoint)
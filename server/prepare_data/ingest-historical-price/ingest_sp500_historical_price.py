@@ -1,135 +1,154 @@
 import yfinance as yf
-import pandas as pd
-from sqlalchemy import create_engine, text
-import time
-import requests
-import io  # Add this import at the top of your file
-from dotenv import load_dotenv
+import argparse
 import os
+import sys
 
-# Load variables from .env file
-load_dotenv()
-# --- Configuration ---
-DB_USER = os.getenv('TRADING_DB_USER')
-DB_PASS = os.getenv('TRADING_DB_PASSWORD')
-DB_HOST = os.getenv('TRADING_DB_HOST')
-DB_PORT = os.getenv('TRADING_DB_PORT')
-DB_NAME = os.getenv('TRADING_DB_NAME')
+# Shared prepare_data modules live one directory up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backfill_state import Checkpoint, default_path, record_stored
+from batch_downloader import BatchDownloader
+from bulk_load import copy_dataframe
+from db import ensure_schema, get_engine
+from instrumentation import job_run
+from ohlcv_transform import to_long_frame
+from parquet_cache import write_prices
+from sp500_constituents import constituent_tickers, sync_constituents, yfinance_ticker
+from sp500_constituents import init_db as init_symbols_db
+from timescale_schema import init_price_schema
+from watermarks import plan_incremental, read_watermarks
 
-# Connection String
-DATABASE_URI = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+# --- Configuration ---
+# Connection settings come from the shared db module (TRADING_DB_* env vars / .env)
 
 def get_sp500_tickers():
-    """Scrapes the list of S&P 500 tickers from Wikipedia using a browser header."""
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    
-    # Fake a browser visit
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
-    }
-
+    """S&P 500 tickers in yfinance format, from the shared hash-cached Wikipedia page."""
     try:
-        # 1. Get the HTML content manually
-        response = requests.get(url, headers=headers)
-        response.raise_for_status() # Check if the request was actually successful
-        
-        # 2. Parse it with Pandas (wrapping raw text in StringIO/BytesIO avoids warnings)
-        table = pd.read_html(io.StringIO(response.text))
-        
-        df = table[0]
-        tickers = df['Symbol'].tolist()
-        
-        # Clean tickers (e.g., BRK.B -> BRK-B for yfinance)
-        tickers = [ticker.replace('.', '-') for ticker in tickers]
-        return tickers
-
+        return constituent_tickers()
     except Exception as e:
         print(f"Error fetching S&P 500 list: {e}")
         return []
 
 def init_db(engine):
-    """Creates the table and converts it to a TimescaleDB hypertable."""
-    with engine.connect() as conn:
-        # 1. Create standard table
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS sp500_stock_prices (
-                time TIMESTAMPTZ NOT NULL,
-                ticker TEXT NOT NULL,
-                open DOUBLE PRECISION,
-                high DOUBLE PRECISION,
-                low DOUBLE PRECISION,
-                close DOUBLE PRECISION,
-                volume BIGINT,
-                PRIMARY KEY (time, ticker)
-            );
-        """))
-        
-        # 2. Convert to Hypertable (TimescaleDB magic)
-        # We wrap this in a try/except because it fails if it's already a hypertable
-        try:
-            conn.execute(text("SELECT create_hypertable('stock_prices', 'time', if_not_exists => TRUE);"))
-            conn.commit()
-            print("Database initialized and Hypertable created.")
-        except Exception as e:
-            print(f"Hypertable creation note: {e}")
-            conn.rollback()
-
-def fetch_and_store_data(engine, tickers):
-    """Fetches 5y data for each ticker and stores it."""
-    
+    """Creates the table as a compressed TimescaleDB hypertable with weekly/monthly aggregates."""
+    init_price_schema(engine, 'sp500_stock_prices', 'ticker')
+
+def download_prices(tickers, period="5y", start=None):
+    """Downloads daily bars for a batch of tickers in one yfinance call."""
+    # A start date (incremental mode) takes precedence over the period
+    range_kwargs = {'start': start} if start else {'period': period}
+
+    # auto_adjust=True handles stock splits automatically.
+    # threads=False because BatchDownloader already runs batches concurrently.
+    return yf.download(tickers, group_by='ticker', progress=False,
+                       auto_adjust=True, threads=False, **range_kwargs)
+
+def fetch_and_store_data(engine, tickers, batch_size=50, workers=4, rate=2.0, fetch=download_prices,
+                         incremental=False, parquet_dir=None, checkpoint=None):
+    """
+    Fetches 5y data for all tickers in concurrent batches and stores it.
+
+    In incremental mode only the bars after each ticker's latest stored row
+    are downloaded; tickers with no rows yet still get the full 5 years.
+
+    With a checkpoint, tickers it already records as done are skipped,
+    failures of the previous job are retried and every stored batch is
+    recorded, so a killed run resumes where it stopped.
+
+    Args:
+        engine: SQLAlchemy engine for the trading database.
+        tickers (list): Ticker symbols to ingest.
+        batch_size (int): Tickers per yfinance request.
+        workers (int): Concurrent download workers.
+        rate (float): Maximum requests per second across all workers.
+        fetch (callable): Price source, fetch(tickers, **kwargs) -> wide DataFrame.
+        incremental (bool): Only fetch bars from each ticker's latest stored day on.
+        parquet_dir (str): Also merge every stored batch into this local Parquet cache.
+        checkpoint (Checkpoint): Per-ticker job state to resume from and update.
+
+    Returns:
+        dict: Run summary from BatchDownloader (failed tickers, timings).
+    """
+    if checkpoint is not None:
+        remaining = checkpoint.pending(tickers)
+        skipped = len(set(tickers) - set(remaining))
+        if skipped:
+            print(f"Checkpoint: skipping {skipped} completed tickers.")
+        tickers = remaining
+
     total = len(tickers)
     print(f"Starting ingestion for {total} tickers...")
 
-    for i, ticker in enumerate(tickers):
-        try:
-            print(f"[{i+1}/{total}] Processing {ticker}...", end=" ")
-            
-            # 1. Fetch Data
-            # auto_adjust=True handles stock splits automatically
-            hist = yf.download(ticker, period="5y", progress=False, auto_adjust=True)
-            
-            if hist.empty:
-                print("No data found.")
-                continue
-
-            # 2. Format Data for DB
-            # Reset index to make 'Date' a column
-            hist = hist.reset_index()
-            
-            # Ensure columns match our DB schema
-            # yfinance returns: Date, Open, High, Low, Close, Volume
-            df_insert = pd.DataFrame()
-            df_insert['time'] = hist['Date']
-            df_insert['ticker'] = ticker
-            df_insert['open'] = hist['Open']
-            df_insert['high'] = hist['High']
-            df_insert['low'] = hist['Low']
-            df_insert['close'] = hist['Close']
-            df_insert['volume'] = hist['Volume']
-
-            # 3. Insert into DB
-            # 'append' adds to existing data
-            df_insert.to_sql('stock_prices', engine, if_exists='append', index=False, method='multi', chunksize=1000)
-            
-            print("Done.")
-            
-            # Sleep briefly to be nice to the API
-            time.sleep(0.5)
-
-        except Exception as e:
-            print(f"Failed: {e}")
+    def store(batch, frame):
+        # One vectorized wide -> long reshape for the whole batch, full precision for the DB
+        df_insert = to_long_frame(frame, batch.tickers, price_dtype='float64')
+        stored = set(df_insert['ticker'].unique())
+        missing = [t for t in batch.tickers if t not in stored]
+        if missing:
+            print(f"No data found for: {', '.join(missing)}")
+        if not df_insert.empty:
+            # COPY into a staging table and merge on the primary key,
+            # so re-running the ingestion updates rows instead of failing
+            copy_dataframe(engine, df_insert, 'sp500_stock_prices', conflict_columns=['time', 'ticker'])
+            if parquet_dir:
+                write_prices(df_insert, parquet_dir)
+        # Only reached once the rows are committed. An incremental top-up
+        # (start date) may legitimately be empty on weekends and holidays.
+        if checkpoint is not None:
+            record_stored(checkpoint, df_insert, batch.tickers, empty_ok='start' in batch.kwargs)
+
+    downloader = BatchDownloader(fetch, store, batch_size=batch_size, workers=workers, rate=rate)
+    if incremental:
+        watermarks = read_watermarks(engine, 'sp500_stock_prices')
+        batches = plan_incremental(tickers, watermarks, batch_size)
+        print(f"Incremental mode: {sum(len(b.tickers) for b in batches)} tickers need new bars.")
+        summary = downloader.run_batches(batches)
+    else:
+        summary = downloader.run(tickers)
+
+    if checkpoint is not None:
+        # Fetch and write errors never reach store(), record them here
+        for ticker, error in summary['failed'].items():
+            checkpoint.mark_failed(ticker, error)
+        checkpoint.finish()
+        summary['report'] = checkpoint.report()
+
+    print(f"Ingestion finished in {summary['seconds']:.1f}s, {len(summary['failed'])} tickers failed.")
+    for ticker, error in summary['failed'].items():
+        print(f"Failed: {ticker}: {error}")
+    return summary
 
 if __name__ == "__main__":
-    # 1. Connect to Database
-    engine = create_engine(DATABASE_URI)
-    
-    # 2. Setup Schema
-    init_db(engine)
-    
-    # 3. Get Tickers
-    sp500_tickers = get_sp500_tickers()
-    print(f"Found {len(sp500_tickers)} tickers.")
-    
-    # 4. Run Ingestion
-    if sp500_tickers:
-        fetch_and_store_data(engine, sp500_tickers)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest S&P 500 daily price history.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only download bars from the latest stored day per ticker on.")
+    parser.add_argument('--parquet-dir', help="Also write bars into a local Parquet cache at this path.")
+    parser.add_argument('--checkpoint', default=default_path('sp500_stock_prices'),
+                        help="Per-ticker job state file; an unfinished run resumes from it.")
+    parser.add_argument('--fresh', action='store_true', help="Ignore any existing checkpoint.")
+    parser.add_argument('--report', help="Write a JSON report of done and failed tickers to this path.")
+    parser.add_argument('--added-only', action='store_true',
+                        help="Sync asset.sp500_symbols and only backfill tickers that just joined the index.")
+    args = parser.parse_args()
+
+    with job_run('sp500_stock_prices'):
+        # 1. Connect to Database
+        engine = get_engine('trading')
+
+        # 2. Setup Schema
+        ensure_schema(engine, 'sp500_stock_prices', init_db)
+
+        # 3. Get Tickers
+        if args.added_only:
+            asset_engine = get_engine('asset')
+            ensure_schema(asset_engine, 'asset.sp500_symbols', init_symbols_db)
+            sp500_tickers = [yfinance_ticker(s) for s in sync_constituents(asset_engine).added]
+        else:
+            sp500_tickers = get_sp500_tickers()
+        print(f"Found {len(sp500_tickers)} tickers.")
+
+        # 4. Run Ingestion (also with no new tickers, so earlier failures are retried)
+        checkpoint = Checkpoint(args.checkpoint, job='sp500_stock_prices', fresh=args.fresh)
+        fetch_and_store_data(engine, sp500_tickers, incremental=args.incremental,
+                             parquet_dir=args.parquet_dir, checkpoint=checkpoint)
+        if args.report:
+            checkpoint.write_report(args.report)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from backfill import (BackfillOptions, checkpoint_name, load_symbols, local_ticker, plan_batches, provider_tickers,
+                      run_backfill, shard)
+from backfill_state import Checkpoint
+
+
+def fake_download(tickers, **kwargs):
+    # yf.download(group_by='ticker') layout; GONE.BK has no data
+    dates = pd.date_range('2024-01-01', periods=3, name='Date')
+    frames = {t: pd.DataFrame({'Open': np.arange(3.0), 'High': np.arange(3.0), 'Low': np.arange(3.0),
+                               'Close': np.arange(3.0) + 1, 'Volume': np.arange(3) * 100}, index=dates)
+              for t in tickers if t != 'GONE.BK'}
+    return pd.concat(frames, axis=1, names=['Ticker', 'Price'])
+
+
+def crashing_download(tickers, **kwargs):
+    if 'BOOM.BK' in tickers:
+        # Let the earlier batch be stored, then kill the worker process
+        time.sleep(0.3)
+        os._exit(1)
+    return fake_download(tickers, **kwargs)
+
+
+def discard(df, table):
+    assert table == 'set_stock_prices'
+    assert not df['ticker'].astype(str).str.endswith('.BK').any()
+
+
+def test_symbol_mapping_and_file_source(tmp_path):
+    path = tmp_path / 'symbols.txt'
+    path.write_text("ktc\n# comment\nBRK.B, Berkshire\nKTC\n\n")
+
+    symbols = load_symbols(str(path))
+
+    assert symbols == ['KTC', 'BRK.B']
+    assert provider_tickers(symbols, '.BK') == ['KTC.BK', 'BRK-B.BK']
+    assert local_ticker('KTC.BK', '.BK') == 'KTC' and local_ticker('AAPL', '') == 'AAPL'
+
+
+def test_plan_batches_range_and_incremental():
+    batches = plan_batches(['A.BK', 'B.BK', 'C.BK'], 2, start='1990-01-01', end='2000-01-01')
+    assert [b.tickers for b in batches] == [['A.BK', 'B.BK'], ['C.BK']]
+    assert batches[0].kwargs == {'period': None, 'start': '1990-01-01', 'end': '2000-01-01'}
+
+    watermarks = {'A.BK': pd.Timestamp('2024-01-02').date()}
+    incremental = plan_batches(['A.BK', 'B.BK'], 10, start='1990-01-01', watermarks=watermarks)
+    kwargs = {tuple(b.tickers): b.kwargs for b in incremental}
+    assert kwargs[('B.BK',)] == {'start': '1990-01-01'}
+    assert kwargs[('A.BK',)]['start'] == '2024-01-02'
+
+    assert shard(list(range(5)), 2) == [[0, 2, 4], [1, 3]]
+    assert shard([1], 4) == [[1]]
+
+
+def test_checkpoint_name_separates_sources_and_ranges():
+    assert checkpoint_name('sp500_symbols', 'sp500_stock_prices', '1990-01-01') == \
+        'backfill-sp500_symbols-sp500_stock_prices-1990-01-01-latest'
+    assert checkpoint_name('/tmp/my_list.txt', 'set_stock_prices', period='max', end='2010-12-31') == \
+        'backfill-my_list-set_stock_prices-max-2010-12-31'
+
+
+def test_run_backfill_merges_progress_from_processes(tmp_path):
+    symbols = ['KTC', 'LH', 'PTT', 'GONE', 'AOT']
+    batches = plan_batches(provider_tickers(symbols, '.BK'), 2, start='2024-01-01')
+    options = BackfillOptions('set_stock_prices', '.BK', threads=2, rate=100.0, fetch=fake_download, load=discard)
+    checkpoint = Checkpoint(str(tmp_path / 'state.json'), job='set_stock_prices')
+
+    result = run_backfill(batches, options, processes=2, checkpoint=checkpoint,
+                          mp_context=multiprocessing.get_context('fork'), poll=0.05)
+
+    assert result['processes'] == 2
+    assert result['rows'] == 12
+    assert checkpoint.done() == {'KTC', 'LH', 'PTT', 'AOT'}
+    assert set(checkpoint.failed()) == {'GONE'}
+    assert checkpoint.tickers['KTC']['last_date'] == '2024-01-03'
+    assert checkpoint.state['finished'] and checkpoint.retry() == ['GONE']
+
+
+def test_checkpoint_uses_source_symbols_and_allows_empty_top_ups(tmp_path):
+    symbols = ['BRK.B', 'GONE']
+    tickers = provider_tickers(symbols, '.BK')
+    batches = plan_batches(tickers, 5, start='2024-01-01')
+    options = BackfillOptions('set_stock_prices', '.BK', threads=1, rate=100.0, fetch=fake_download, load=discard)
+    checkpoint = Checkpoint(str(tmp_path / 'state.json'))
+
+    run_backfill(batches, options, processes=1, checkpoint=checkpoint, mp_context=multiprocessing.get_context('fork'),
+                 poll=0.05, symbols=dict(zip(['BRK-B', 'GONE'], symbols)), empty_ok={'GONE'})
+
+    assert checkpoint.done() == {'BRK.B', 'GONE'}
+    assert checkpoint.tickers['GONE']['rows'] == 0
+    # A resumed run skips the dotted symbol instead of downloading it again
+    assert checkpoint.pending(symbols) == []
+    assert checkpoint.finish()
+
+
+def test_crashed_worker_marks_its_unreported_tickers_failed(tmp_path):
+    batches = plan_batches(provider_tickers(['KTC', 'LH', 'BOOM', 'PTT'], '.BK'), 2, start='2024-01-01')
+    options = BackfillOptions('set_stock_prices', '.BK', threads=1, rate=100.0, fetch=crashing_download,
+                              load=discard)
+    checkpoint = Checkpoint(str(tmp_path / 'state.json'))
+
+    result = run_backfill(batches, options, processes=1, checkpoint=checkpoint,
+                          mp_context=multiprocessing.get_context('fork'), poll=0.05)
+
+    assert checkpoint.done() == {'KTC', 'LH'}
+    assert set(result['failed']) == set(checkpoint.failed()) == {'BOOM', 'PTT'}
+    assert result['failed']['BOOM'].startswith('worker crashed')
+    assert not checkpoint.finish() and checkpoint.retry() == ['BOOM', 'PTT']
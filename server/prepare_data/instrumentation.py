@@ -0,0 +1,285 @@
+"""
+Stage timings and counters for the prepare_data jobs.
+
+Code marks its work with `stage()` / `@timed()` (fetch, parse, transform,
+load) and `count()` (rows, retries, cache hits, errors). Everything goes
+into one process-wide registry. A job entry point wraps its run in
+`job_run()`, which:
+
+    - appends a JSON line per finished stage, plus a summary line, to <job>.jsonl
+    - writes the counters and stage timings as Prometheus text to <job>.prom
+      (node_exporter textfile-collector format)
+    - optionally profiles the run with cProfile and/or tracemalloc
+
+Files go to METRICS_DIR (default data/metrics). METRICS_PROFILE=cpu|memory|all
+turns on the one-off deep profile.
+"""
+import contextlib
+import cProfile
+import datetime
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+DEFAULT_DIR = os.getenv(
+    'METRICS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'metrics'),
+)
+PREFIX = 'prepare_data'
+PROFILE_MODES = ('cpu', 'memory', 'all')
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    """Prometheus label set, e.g. {stage="fetch",table="x"}."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class Registry:
+    """
+    Thread-safe counters and stage timers.
+
+    Counters are monotonically increasing totals. Stage timers keep count,
+    sum and max seconds per (stage, labels), which is what a Prometheus
+    summary without quantiles carries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._log = None
+        self.job = None
+
+    # --- Recording ---
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def count_error(self, error, stage, **labels):
+        """
+        Counts `error` under the innermost stage that saw it.
+
+        An exception that passes through nested stages (a COPY failing inside
+        a 'store' stage, inside the job) is counted once, not once per level.
+        """
+        if getattr(error, '_metrics_registry', None) is self:
+            return
+        try:
+            error._metrics_registry = self
+        except AttributeError:
+            pass
+        self.count('errors', stage=stage, error=type(error).__name__, **labels)
+
+    def observe(self, stage, seconds, ok=True, **labels):
+        key = _key(stage, labels)
+        with self._lock:
+            n, total, peak = self._timers.get(key, (0, 0.0, 0.0))
+            self._timers[key] = (n + 1, total + seconds, max(peak, seconds))
+            logging = self._log is not None
+        if logging:
+            self.log_event('stage', stage=stage, seconds=round(seconds, 6), ok=ok, **labels)
+
+    @contextlib.contextmanager
+    def stage(self, name, **labels):
+        """Times the block as stage `name`; an exception also counts an error (see count_error)."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.observe(name, time.perf_counter() - start, ok=False, **labels)
+            self.count_error(e, name)
+            raise
+        self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name=None, **labels):
+        """Decorator form of stage(); defaults the stage name to the function name. Handles async functions."""
+        def decorate(func):
+            stage_name = name or func.__name__
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(stage_name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # --- Output ---
+
+    def open_log(self, path):
+        """Starts appending JSON-lines events to `path`."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            self._log = open(path, 'a', buffering=1)
+
+    def close_log(self):
+        with self._lock:
+            log, self._log = self._log, None
+        if log is not None:
+            log.close()
+
+    def log_event(self, event, **fields):
+        record = {'ts': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+                  'job': self.job, 'event': event, **fields}
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            if self._log is not None:
+                self._log.write(line)
+
+    def snapshot(self):
+        """{'counters': {name: {labels: value}}, 'stages': {name: {labels: {count, seconds, max}}}}"""
+        with self._lock:
+            counters, timers = dict(self._counters), dict(self._timers)
+        out = {'counters': {}, 'stages': {}}
+        for (name, labels), value in counters.items():
+            out['counters'].setdefault(name, {})[_label_key(labels)] = value
+        for (name, labels), (n, total, peak) in timers.items():
+            out['stages'].setdefault(name, {})[_label_key(labels)] = {
+                'count': n, 'seconds': round(total, 6), 'max': round(peak, 6)}
+        return out
+
+    def to_prometheus(self):
+        """Prometheus text exposition of every counter and stage timer."""
+        with self._lock:
+            counters, timers = sorted(self._counters.items()), sorted(self._timers.items())
+        base = (('job', self.job),) if self.job else ()
+        lines = []
+
+        by_name = {}
+        for (name, labels), value in counters:
+            by_name.setdefault(name, []).append((labels, value))
+        for name, samples in by_name.items():
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{_label_text(base + labels)} {value}" for labels, value in samples)
+
+        metric = f"{PREFIX}_stage_seconds"
+        if timers:
+            lines.append(f"# TYPE {metric} summary")
+            for (name, labels), (n, total, _) in timers:
+                label_text = _label_text(base + (('stage', name),) + labels)
+                lines.append(f"{metric}_count{label_text} {n}")
+                lines.append(f"{metric}_sum{label_text} {total:.6f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            for (name, labels), (_, _, peak) in timers:
+                lines.append(f"{metric}_max{_label_text(base + (('stage', name),) + labels)} {peak:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Writes to_prometheus() atomically, so a scraper never sees a partial file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(path + '.tmp', path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+
+def _label_key(labels):
+    return ','.join(f"{k}={v}" for k, v in labels)
+
+
+METRICS = Registry()
+
+# Module-level shortcuts onto the shared registry
+count = METRICS.count
+count_error = METRICS.count_error
+stage = METRICS.stage
+timed = METRICS.timed
+
+
+@contextlib.contextmanager
+def profile(path, cpu=True, memory=False, top=25):
+    """
+    One-off deep profile of the block.
+
+    cpu writes `<path>.pstats` (open with pstats or snakeviz) and prints the
+    top functions by cumulative time. memory traces allocations with
+    tracemalloc and writes the top allocation sites to `<path>.memory.txt`.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    profiler = cProfile.Profile() if cpu else None
+    if memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(path + '.pstats')
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(top)
+            print(report.getvalue())
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(path + '.memory.txt', 'w') as f:
+                f.write(f"peak traced: {peak / 2**20:.1f} MiB\n")
+                for stat in snapshot.statistics('lineno')[:top]:
+                    f.write(f"{stat}\n")
+            print(f"Peak traced memory {peak / 2**20:.1f} MiB; top allocations in {path}.memory.txt")
+
+
+@contextlib.contextmanager
+def job_run(job, directory=None, profile_mode=None, registry=METRICS):
+    """
+    Instruments a whole job run.
+
+    Args:
+        job (str): Job name, used as the `job` label and the file names.
+        directory (str): Output directory (defaults to METRICS_DIR).
+        profile_mode (str): 'cpu', 'memory' or 'all' (defaults to METRICS_PROFILE, off when unset).
+
+    Yields:
+        Registry: The registry being recorded into.
+    """
+    directory = directory or DEFAULT_DIR
+    profile_mode = profile_mode or os.getenv('METRICS_PROFILE')
+    if profile_mode and profile_mode not in PROFILE_MODES:
+        raise ValueError(f"METRICS_PROFILE must be one of {PROFILE_MODES}")
+
+    registry.job = job
+    registry.open_log(os.path.join(directory, f"{job}.jsonl"))
+    registry.log_event('start')
+    profiler = (profile(os.path.join(directory, job), cpu=profile_mode in ('cpu', 'all'),
+                        memory=profile_mode in ('memory', 'all'))
+                if profile_mode else contextlib.nullcontext())
+    ok = False
+    try:
+        with profiler, registry.stage('job'):
+            yield registry
+        ok = True
+    finally:
+        registry.log_event('summary', ok=ok, **registry.snapshot())
+        registry.close_log()
+        registry.write_prometheus(os.path.join(directory, f"{job}.prom"))
+        print(f"Metrics written to {os.path.join(directory, job)}.{{jsonl,prom}}")
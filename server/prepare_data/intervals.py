@@ -0,0 +1,36 @@
+"""
+Bar intervals shared by the series pipelines (fx, gold).
+
+Every interval is stored in its own table: the daily one keeps the base
+name and intraday ones add the interval (fx_rates, fx_rates_1h), so a daily
+bar at 00:00 UTC never collides with the intraday bar at the same time.
+"""
+import pandas as pd
+
+DAILY = '1d'
+
+# yfinance only serves limited history for intraday intervals
+FULL_PERIODS = {'1d': '5y', '1h': '730d'}
+DEFAULT_PERIOD = '60d'
+
+# yfinance interval suffix -> pandas Timedelta unit
+INTERVAL_UNITS = {'m': 'min', 'h': 'h', 'd': 'D'}
+
+
+def interval_table(base, interval=DAILY):
+    """Table holding one bar interval: `base` for 1d, `base`_1h for 1h."""
+    if not interval.isalnum():
+        raise ValueError(f"Invalid interval {interval!r}")
+    return base if interval == DAILY else f"{base}_{interval}"
+
+
+def bar_length(interval):
+    """'1d' -> 1 day, '1h' -> 1 hour, '5m' -> 5 minutes."""
+    return pd.Timedelta(int(interval[:-1]), unit=INTERVAL_UNITS[interval[-1]])
+
+
+def range_kwargs(interval, period=None, start=None):
+    """yf.download range arguments: `start` when resuming, else `period` (the interval's full history)."""
+    if start:
+        return {'start': start}
+    return {'period': period or FULL_PERIODS.get(interval, DEFAULT_PERIOD)}
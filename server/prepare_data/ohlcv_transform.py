@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# yfinance field name -> DB column, in output order
+FIELDS = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+
+
+def _ticker_field_columns(wide, tickers):
+    """Returns `wide` with (ticker, field) MultiIndex columns, whatever layout yfinance used."""
+    columns = wide.columns
+    if not isinstance(columns, pd.MultiIndex):
+        # Flat single-ticker frame from older yfinance versions
+        if not tickers or len(tickers) != 1:
+            raise ValueError("flat columns need exactly one ticker")
+        return pd.concat({tickers[0]: wide}, axis=1)
+
+    # group_by='column' (yfinance default) puts the field on the first level
+    if set(columns.get_level_values(0)) & set(FIELDS):
+        return wide.swaplevel(0, 1, axis=1)
+    return wide
+
+
+@timed('transform')
+def to_long_frame(wide, tickers=None, price_dtype='float32'):
+    """
+    Converts a wide multi-ticker download into long DB rows in one vectorized step.
+
+    Accepts yf.download output with either column layout ((ticker, field) or
+    (field, ticker)) or a flat single-ticker frame. The values are reshaped
+    as one (dates x tickers x fields) NumPy block, so there is no per-ticker
+    Python loop.
+
+    Args:
+        wide (DataFrame): Date-indexed frame from yf.download.
+        tickers (list): Tickers to keep, in output order; defaults to all in the frame.
+        price_dtype (str): Price column dtype. float32 halves memory for in-memory
+            analysis; rows headed for DOUBLE PRECISION columns should use 'float64'.
+
+    Returns:
+        DataFrame: Columns time, ticker (categorical), open/high/low/close
+        (price_dtype) and volume (Int64). Rows where every price is missing are dropped.
+    """
+    columns = list(FIELDS.values())
+    if wide is None or wide.empty:
+        return pd.DataFrame({c: pd.Series(dtype=price_dtype) for c in ['time', 'ticker'] + columns})
+
+    wide = _ticker_field_columns(wide, tickers)
+    available = list(dict.fromkeys(wide.columns.get_level_values(0)))
+    tickers = [t for t in (tickers or available) if t in available]
+
+    # Fixed (ticker, field) grid; fields a download lacks become NaN
+    grid = pd.MultiIndex.from_product([tickers, list(FIELDS)])
+    values = wide.reindex(columns=grid).to_numpy(dtype='float64', na_value=np.nan)
+
+    n_dates, n_tickers, n_fields = len(wide.index), len(tickers), len(FIELDS)
+    # (dates, tickers, fields) -> (tickers, dates, fields) -> one row per (ticker, date)
+    block = values.reshape(n_dates, n_tickers, n_fields).transpose(1, 0, 2).reshape(-1, n_fields)
+
+    long = pd.DataFrame({
+        'time': np.tile(wide.index.to_numpy(), n_tickers),
+        'ticker': pd.Categorical.from_codes(np.repeat(np.arange(n_tickers), n_dates), categories=tickers),
+    })
+    for i, column in enumerate(columns):
+        if column == 'volume':
+            long[column] = pd.array(np.round(block[:, i]), dtype='Float64').astype('Int64')
+        else:
+            long[column] = block[:, i].astype(price_dtype)
+
+    return long[long[PRICE_FIELDS].notna().any(axis=1)].reset_index(drop=True)
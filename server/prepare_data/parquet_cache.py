@@ -0,0 +1,205 @@
+"""
+Local Parquet cache of daily OHLCV bars, partitioned by ticker and year.
+
+Layout: <root>/ticker=AAPL/year=2024/part-0.parquet (hive partitioning).
+Reads prune partitions by ticker/year and files by their time statistics,
+and memory-map the files, so research queries never touch Postgres. A
+ticker/year file holds ~252 daily bars, so it is written as a single row
+group; smaller groups would only add metadata.
+
+    python parquet_cache.py export [--root DIR] [--start 2020-01-01] [--tickers AAPL MSFT]
+"""
+import argparse
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+from sqlalchemy import text
+
+DEFAULT_ROOT = os.getenv(
+    'PRICE_PARQUET_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sp500_prices'),
+)
+
+PRICE_COLUMNS = ['time', 'ticker', 'open', 'high', 'low', 'close', 'volume']
+
+SCHEMA = pa.schema([
+    ('time', pa.timestamp('us', tz='UTC')),
+    ('ticker', pa.string()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.int64()),
+    ('year', pa.int16()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('ticker', pa.string()), ('year', pa.int16())]), flavor='hive')
+
+
+def _normalise(df):
+    """Coerces long OHLCV rows to the cache schema (UTC times, plain-string tickers, year column)."""
+    df = df[PRICE_COLUMNS].copy()
+    times = pd.to_datetime(df['time'])
+    df['time'] = times.dt.tz_localize('UTC') if times.dt.tz is None else times.dt.tz_convert('UTC')
+    df['ticker'] = df['ticker'].astype(str)
+    df['volume'] = df['volume'].astype('Int64')
+    df['year'] = df['time'].dt.year.astype('int16')
+    return df
+
+
+def _dataset(root, memory_map=True):
+    return ds.dataset(
+        root,
+        schema=SCHEMA,
+        format='parquet',
+        partitioning=PARTITIONING,
+        filesystem=fs.LocalFileSystem(use_mmap=memory_map),
+    )
+
+
+def write_prices(df, root=DEFAULT_ROOT):
+    """
+    Merges long OHLCV rows into the cache.
+
+    Every ticker/year partition touched by `df` is rewritten with the
+    existing rows plus the new ones (new rows win on the same time), so
+    incremental writes never duplicate bars.
+
+    Args:
+        df (DataFrame): Columns time, ticker, open, high, low, close, volume.
+        root (str): Dataset directory.
+
+    Returns:
+        int: Rows in the rewritten partitions.
+    """
+    if df.empty:
+        return 0
+
+    df = _normalise(df)
+    touched = df[['ticker', 'year']].drop_duplicates()
+
+    if os.path.isdir(root):
+        existing = _dataset(root, memory_map=False).to_table(
+            filter=ds.field('ticker').isin(touched['ticker'].unique().tolist())
+            & ds.field('year').isin(touched['year'].unique().tolist())
+        ).to_pandas()
+        if not existing.empty:
+            existing['year'] = existing['year'].astype('int16')
+            existing = existing.merge(touched, on=['ticker', 'year'])
+            df = pd.concat([existing[df.columns], df], ignore_index=True)
+            df = df.drop_duplicates(['ticker', 'time'], keep='last')
+
+    df = df.sort_values(['ticker', 'time'], ignore_index=True)
+    ds.write_dataset(
+        pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False),
+        root,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+    )
+    return len(df)
+
+
+def _utc(value):
+    """A bound in the cache's timezone (UTC); naive values are taken as UTC already."""
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+
+
+def read_prices(tickers=None, start=None, end=None, columns=None, root=DEFAULT_ROOT, memory_map=True):
+    """
+    Reads bars for a ticker set and date range from the cache.
+
+    Bounds are converted to UTC before comparing. An `end` at midnight
+    (e.g. '2024-01-05') covers that whole day, so a bar stamped at the
+    exchange's midnight (05:00 UTC for New York) is included whichever way
+    the download was timestamped.
+
+    Args:
+        tickers (list): Tickers to read, or None for all.
+        start, end (str/date/Timestamp): Inclusive time bounds, or None for open-ended.
+        columns (list): Columns to return (always includes time and ticker).
+        root (str): Dataset directory.
+        memory_map (bool): Memory-map Parquet files instead of reading them into buffers.
+
+    Returns:
+        DataFrame: Long rows sorted by ticker and time.
+    """
+    wanted = list(dict.fromkeys(['time', 'ticker'] + list(columns or PRICE_COLUMNS)))
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=wanted)
+
+    condition = None
+
+    def both(expr):
+        return expr if condition is None else condition & expr
+
+    if tickers is not None:
+        condition = both(ds.field('ticker').isin(list(tickers)))
+    if start is not None:
+        start = _utc(start)
+        # year prunes directories, time prunes files by their statistics
+        condition = both((ds.field('year') >= start.year) & (ds.field('time') >= start))
+    if end is not None:
+        end = pd.Timestamp(end)
+        if end == end.normalize():
+            # Whole day, in the bound's own timezone
+            end = _utc(end + pd.Timedelta(days=1))
+            last = end - pd.Timedelta(microseconds=1)
+            condition = both((ds.field('year') <= last.year) & (ds.field('time') < end))
+        else:
+            end = _utc(end)
+            condition = both((ds.field('year') <= end.year) & (ds.field('time') <= end))
+
+    table = _dataset(root, memory_map).to_table(columns=wanted, filter=condition)
+    return table.to_pandas().sort_values(['ticker', 'time'], ignore_index=True)
+
+
+def read_matrix(field='close', tickers=None, start=None, end=None, root=DEFAULT_ROOT):
+    """Reads one field as a date x ticker frame (NaN where a ticker has no bar)."""
+    df = read_prices(tickers, start, end, columns=[field], root=root)
+    return df.pivot(index='time', columns='ticker', values=field)
+
+
+def export_from_db(engine, root=DEFAULT_ROOT, tickers=None, start=None, table='sp500_stock_prices',
+                   chunksize=500_000):
+    """
+    Streams rows out of the hypertable into the Parquet cache.
+
+    Returns:
+        int: Rows exported.
+    """
+    sql = f"SELECT {', '.join(PRICE_COLUMNS)} FROM {table} WHERE TRUE"
+    params = {}
+    if tickers:
+        sql += " AND ticker = ANY(:tickers)"
+        params['tickers'] = list(tickers)
+    if start:
+        sql += " AND time >= :start"
+        params['start'] = start
+    sql += " ORDER BY ticker, time"
+
+    total = 0
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(sql), conn, params=params, chunksize=chunksize):
+            write_prices(chunk, root)
+            total += len(chunk)
+            print(f"Exported {total} rows to {root}")
+    return total
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="Manage the local Parquet price cache.")
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--root', default=DEFAULT_ROOT)
+    parser.add_argument('--start', help="Only export rows from this date on.")
+    parser.add_argument('--tickers', nargs='*', help="Only export these tickers.")
+    args = parser.parse_args()
+
+    export_from_db(get_engine('trading'), args.root, args.tickers, args.start)
@@ -0,0 +1,317 @@
+"""
+Compact in-memory price store shared by the prepare_data consumers.
+
+Symbols are interned to integer IDs. All bars live in a few contiguous
+arrays: int64 nanosecond times, one float64 array per field, and an
+offsets array. offsets[id]:offsets[id + 1] is that symbol's slice, sorted
+by time. Lookups are a binary search inside that slice, and range queries
+return views, not copies.
+
+Appends are buffered and merged on the next read (newest value wins for a
+repeated (symbol, time)). to_shared() copies the packed arrays into one
+multiprocessing.shared_memory block. A worker process given the returned
+SharedSpec maps the same memory read-only with PriceStore.attach(spec).
+
+    store = PriceStore.from_db(get_engine('trading'), fields=['close'])
+    store.asof('AAPL', ['2024-03-01', '2024-03-04'])      # -> ndarray
+    times, closes = store.range('AAPL', '2024-01-01', '2024-06-30')
+"""
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from timestamps import to_ns
+
+PRICE_TABLE = 'sp500_stock_prices'
+DEFAULT_FIELDS = ('close',)
+
+# What a worker needs to map a shared store: block name, layout and symbol order
+SharedSpec = namedtuple('SharedSpec', ['name', 'symbols', 'rows', 'fields'])
+
+
+class PriceStore:
+    """
+    Packed per-symbol time series with as-of and range lookups.
+
+    Args:
+        fields (iterable): Value columns kept for every bar, e.g. ('close',) or OHLC.
+    """
+
+    def __init__(self, fields=DEFAULT_FIELDS):
+        self.fields = tuple(fields)
+        self._ids = {}
+        self._symbols = []
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._times = np.empty(0, dtype=np.int64)
+        self._values = {f: np.empty(0, dtype=np.float64) for f in self.fields}
+        self._pending = []
+        self._shm = None
+        self._owner = False
+
+    # --- Symbols ---
+
+    def intern(self, symbols):
+        """IDs for symbols, assigning new IDs in first-seen order."""
+        symbols = np.atleast_1d(np.asarray(symbols, dtype=object))
+        codes, uniques = pd.factorize(symbols)
+        unique_ids = np.empty(len(uniques), dtype=np.int64)
+        for i, symbol in enumerate(uniques):
+            sid = self._ids.get(symbol)
+            if sid is None:
+                if self._shm is not None:
+                    raise TypeError("A shared price store is read-only")
+                sid = self._ids[symbol] = len(self._symbols)
+                self._symbols.append(symbol)
+            unique_ids[i] = sid
+        # New symbols start with an empty slice until their bars are merged
+        missing = len(self._symbols) + 1 - len(self._offsets)
+        if missing > 0:
+            self._offsets = np.concatenate([self._offsets, np.repeat(self._offsets[-1], missing)])
+        return unique_ids[codes]
+
+    def symbol_id(self, symbol):
+        try:
+            return self._ids[symbol]
+        except KeyError:
+            raise KeyError(f"No prices for {symbol!r}") from None
+
+    @property
+    def symbols(self):
+        return list(self._symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._ids
+
+    def __len__(self):
+        self._merge()
+        return len(self._times)
+
+    # --- Writes ---
+
+    def append(self, symbols, times, **values):
+        """
+        Adds bars in bulk.
+
+        Args:
+            symbols: One symbol for all rows, or a symbol per row.
+            times: Bar timestamps.
+            **values: An array per field (missing fields are stored as NaN).
+        """
+        if self._shm is not None:
+            raise TypeError("A shared price store is read-only")
+        times = to_ns(times)
+        n = len(times)
+        ids = self.intern(symbols if np.ndim(symbols) else [symbols])
+        if len(ids) == 1 and n != 1:
+            ids = np.repeat(ids, n)
+        unknown = set(values) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)}; store holds {self.fields}")
+        columns = {f: np.asarray(values[f], dtype=np.float64) if f in values else np.full(n, np.nan)
+                   for f in self.fields}
+        self._pending.append((ids, times, columns))
+        return self
+
+    def _merge(self):
+        """Folds pending appends into the packed arrays."""
+        if not self._pending:
+            return
+        ids = np.concatenate([np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))]
+                             + [p[0] for p in self._pending])
+        times = np.concatenate([self._times] + [p[1] for p in self._pending])
+        values = {f: np.concatenate([self._values[f]] + [p[2][f] for p in self._pending]) for f in self.fields}
+        self._pending = []
+
+        # Stable sort keeps append order within a (symbol, time), so the last one wins below
+        order = np.lexsort((times, ids))
+        ids, times = ids[order], times[order]
+        last = np.ones(len(ids), dtype=bool)
+        last[:-1] = (ids[1:] != ids[:-1]) | (times[1:] != times[:-1])
+
+        self._times = times[last]
+        self._values = {f: v[order][last] for f, v in values.items()}
+        counts = np.bincount(ids[last], minlength=len(self._symbols))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    # --- Reads ---
+
+    def _slice(self, symbol):
+        self._merge()
+        sid = self.symbol_id(symbol)
+        return slice(self._offsets[sid], self._offsets[sid + 1])
+
+    def series(self, symbol, field=None):
+        """(times, values) views for one symbol; values is one field or a {field: array} dict."""
+        part = self._slice(symbol)
+        if field is None:
+            return self._times[part], {f: v[part] for f, v in self._values.items()}
+        return self._times[part], self._values[field][part]
+
+    def asof(self, symbol, times, field=None):
+        """
+        Latest value at or before each time, by binary search (NaN before the first bar).
+
+        Returns:
+            ndarray: One value per requested time.
+        """
+        field = field or self.fields[0]
+        bar_times, values = self.series(symbol, field)
+        idx = np.searchsorted(bar_times, to_ns(times), side='right') - 1
+        return np.where(idx >= 0, values[np.maximum(idx, 0)] if len(values) else np.nan, np.nan)
+
+    def asof_many(self, symbols, time, field=None):
+        """One as-of value per symbol at a single time (NaN for unknown symbols)."""
+        field = field or self.fields[0]
+        self._merge()
+        at = to_ns(time)[0]
+        values = self._values[field]
+        out = np.full(len(symbols), np.nan)
+        for i, symbol in enumerate(symbols):
+            sid = self._ids.get(symbol)
+            if sid is None:
+                continue
+            lo, hi = self._offsets[sid], self._offsets[sid + 1]
+            idx = lo + np.searchsorted(self._times[lo:hi], at, side='right') - 1
+            if idx >= lo:
+                out[i] = values[idx]
+        return out
+
+    def latest(self, symbols=None, field=None):
+        """{symbol: last value}, the replacement for [{symbol: price}] quote lists."""
+        field = field or self.fields[0]
+        self._merge()
+        values = self._values[field]
+        out = {}
+        for symbol in (self._symbols if symbols is None else symbols):
+            sid = self._ids.get(symbol)
+            end = None if sid is None else self._offsets[sid + 1]
+            out[symbol] = float(values[end - 1]) if sid is not None and end > self._offsets[sid] else None
+        return out
+
+    def range(self, symbol, start=None, end=None, field=None):
+        """(times, values) views for start <= time <= end (either bound may be None)."""
+        field = field or self.fields[0]
+        bar_times, values = self.series(symbol, field)
+        lo = 0 if start is None else np.searchsorted(bar_times, to_ns(start)[0], side='left')
+        hi = len(bar_times) if end is None else np.searchsorted(bar_times, to_ns(end)[0], side='right')
+        return bar_times[lo:hi], values[lo:hi]
+
+    def to_frame(self):
+        """Long (time, symbol, *fields) frame of everything in the store."""
+        self._merge()
+        ids = np.repeat(np.arange(len(self._symbols)), np.diff(self._offsets))
+        df = pd.DataFrame({
+            'time': pd.to_datetime(self._times, utc=True),
+            'symbol': pd.Categorical.from_codes(ids, categories=self._symbols),
+        })
+        for field, values in self._values.items():
+            df[field] = values
+        return df
+
+    # --- Loading ---
+
+    @classmethod
+    def from_frame(cls, df, symbol_column='ticker', time_column='time', fields=DEFAULT_FIELDS):
+        store = cls(fields)
+        if len(df):
+            store.append(df[symbol_column].astype(str).to_numpy(dtype=object), df[time_column],
+                         **{f: df[f].to_numpy(dtype=np.float64) for f in store.fields})
+        store._merge()
+        return store
+
+    @classmethod
+    def from_db(cls, engine, table=PRICE_TABLE, symbol_column='ticker', tickers=None, start=None,
+                fields=DEFAULT_FIELDS):
+        """Loads bars from a hypertable such as sp500_stock_prices."""
+        sql = f"SELECT time, {symbol_column}, {', '.join(fields)} FROM {table} WHERE TRUE"
+        params = {}
+        if tickers:
+            sql += f" AND {symbol_column} = ANY(:tickers)"
+            params['tickers'] = list(tickers)
+        if start:
+            sql += " AND time >= :start"
+            params['start'] = start
+        with engine.connect() as conn:
+            df = pd.read_sql(text(sql), conn, params=params)
+        return cls.from_frame(df, symbol_column, fields=fields)
+
+    @classmethod
+    def from_parquet(cls, tickers=None, start=None, end=None, root=None, fields=DEFAULT_FIELDS):
+        """Loads bars from the local Parquet cache (see parquet_cache)."""
+        from parquet_cache import DEFAULT_ROOT, read_prices
+        df = read_prices(tickers, start, end, columns=list(fields), root=root or DEFAULT_ROOT)
+        return cls.from_frame(df, fields=fields)
+
+    # --- Shared memory ---
+
+    def _layout(self, rows):
+        """Byte offsets of offsets/times/fields inside the shared block (all 8-byte items)."""
+        n_offsets = len(self._symbols) + 1
+        layout, position = {}, 0
+        for name, length in [('offsets', n_offsets), ('times', rows)] + [(f, rows) for f in self.fields]:
+            layout[name] = (position, length)
+            position += 8 * length
+        return layout, max(position, 1)
+
+    def to_shared(self, name=None):
+        """
+        Copies the store into one shared-memory block.
+
+        The caller owns the block: keep this store alive while workers use
+        it, then call unlink(). Returns the SharedSpec to pass to workers.
+        """
+        self._merge()
+        layout, size = self._layout(len(self._times))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        arrays = {'offsets': self._offsets, 'times': self._times, **self._values}
+        for key, (offset, length) in layout.items():
+            view = np.ndarray(length, dtype=np.int64 if key in ('offsets', 'times') else np.float64,
+                              buffer=shm.buf, offset=offset)
+            view[:] = arrays[key]
+        self._shm, self._owner = shm, True
+        self._attach_arrays(layout)
+        return SharedSpec(shm.name, list(self._symbols), len(self._times), self.fields)
+
+    @classmethod
+    def attach(cls, spec):
+        """Maps a store created by to_shared() in another process, without copying."""
+        store = cls(spec.fields)
+        store._symbols = list(spec.symbols)
+        store._ids = {s: i for i, s in enumerate(store._symbols)}
+        # Pool workers share the owner's resource tracker, so the block is freed once, by unlink()
+        store._shm = shared_memory.SharedMemory(name=spec.name)
+        store._attach_arrays(store._layout(spec.rows)[0])
+        return store
+
+    def _attach_arrays(self, layout):
+        def view(key, dtype):
+            offset, length = layout[key]
+            array = np.ndarray(length, dtype=dtype, buffer=self._shm.buf, offset=offset)
+            array.flags.writeable = False
+            return array
+
+        self._offsets = view('offsets', np.int64)
+        self._times = view('times', np.int64)
+        self._values = {f: view(f, np.float64) for f in self.fields}
+
+    def close(self):
+        """Releases this process's mapping of a shared store; the data is kept as private copies."""
+        if self._shm is None:
+            return
+        # Views must go before the buffer can be released
+        self._offsets = self._offsets.copy()
+        self._times = self._times.copy()
+        self._values = {f: v.copy() for f, v in self._values.items()}
+        self._shm.close()
+        self._shm = None
+
+    def unlink(self):
+        """Closes and frees the shared block; only the creating store should call this."""
+        shm, owner = self._shm, self._owner
+        self.close()
+        if shm is not None and owner:
+            shm.unlink()
+        self._shm, self._owner = None, False
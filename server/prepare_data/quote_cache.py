@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import count
+
+# Seconds a cached quote stays fresh, per market
+MARKET_TTLS = {
+    'SET': 60.0,
+    'MAI': 60.0,
+    'NASDAQ': 60.0,
+    'NYSE': 60.0,
+    'US': 60.0,
+    'GOLD': 60.0,
+    'CRYPTO': 30.0,
+}
+
+
+class _Flight:
+    """An in-progress fetch that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """
+    Thread-safe TTL + LRU cache for latest quotes, keyed by (provider, symbol).
+
+    Concurrent `get_or_fetch` calls for the same key are coalesced: one
+    caller runs the loader, the others wait and share its result. Failed or
+    empty (None) results are never cached.
+
+    Args:
+        ttls (dict): Per-market TTL overrides in seconds (see MARKET_TTLS).
+        default_ttl (float): TTL for markets not listed in `ttls`.
+        maxsize (int): Maximum entries kept in memory before LRU eviction.
+        path (str): Optional SQLite file that also persists quotes across processes.
+    """
+
+    def __init__(self, ttls=None, default_ttl=60.0, maxsize=4096, path=None, clock=time.time):
+        self.ttls = dict(MARKET_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (price, fetched_at, market)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'disk_hits': 0, 'evictions': 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS quotes (
+                    provider TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    market TEXT,
+                    price REAL NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (provider, symbol)
+                )
+            """)
+            self._db.commit()
+
+    def ttl_for(self, market):
+        return self.ttls.get((market or '').upper(), self.default_ttl)
+
+    def get(self, provider, symbol, market=None):
+        """Returns the cached price if still fresh, otherwise None. Counts a hit or miss."""
+        with self._lock:
+            price = self._lookup((provider, symbol), market)
+            self.stats['hits' if price is not None else 'misses'] += 1
+        count('cache_hits' if price is not None else 'cache_misses', cache='quote')
+        return price
+
+    def put(self, provider, symbol, market, price):
+        if price is None:
+            return
+        with self._lock:
+            self._store((provider, symbol), market, price, self._clock())
+
+    def get_or_fetch(self, provider, symbol, market, loader):
+        """
+        Returns a fresh cached price or calls `loader()` once for all concurrent callers.
+
+        Args:
+            provider (str): Provider name, part of the cache key.
+            symbol (str): Provider symbol, e.g. 'KTC.BK'.
+            market (str): Market code selecting the TTL.
+            loader (callable): Zero-argument function returning the price.
+        """
+        key = (provider, symbol)
+        with self._lock:
+            price = self._lookup(key, market)
+            if price is not None:
+                self.stats['hits'] += 1
+                count('cache_hits', cache='quote')
+                return price
+            self.stats['misses'] += 1
+            count('cache_misses', cache='quote')
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            if flight.value is not None:
+                with self._lock:
+                    self._store(key, market, flight.value, self._clock())
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM quotes")
+                self._db.commit()
+
+    # --- internal helpers, called with self._lock held ---
+
+    def _lookup(self, key, market):
+        ttl = self.ttl_for(market)
+        now = self._clock()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            price, fetched_at, _ = entry
+            if now - fetched_at <= ttl:
+                self._entries.move_to_end(key)
+                return price
+            del self._entries[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT price, fetched_at FROM quotes WHERE provider = ? AND symbol = ?", key
+            ).fetchone()
+            if row is not None and now - row[1] <= ttl:
+                self.stats['disk_hits'] += 1
+                self._remember(key, market, row[0], row[1])
+                return row[0]
+        return None
+
+    def _store(self, key, market, price, fetched_at):
+        self._remember(key, market, price, fetched_at)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO quotes (provider, symbol, market, price, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (key[0], key[1], market, float(price), fetched_at),
+            )
+            self._db.commit()
+
+    def _remember(self, key, market, price, fetched_at):
+        self._entries[key] = (price, fetched_at, market)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+
+# Process-wide cache shared by the daily-update fetchers.
+# Set QUOTE_CACHE_PATH to also persist quotes in a SQLite file.
+DEFAULT_CACHE = QuoteCache(path=os.getenv('QUOTE_CACHE_PATH'))
@@ -0,0 +1,125 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import yfinance as yf
+
+from instrumentation import count, stage
+
+# Suffix the quote provider expects after the local symbol, per market
+MARKET_SUFFIXES = {
+    'SET': '.BK',
+    'MAI': '.BK',
+    'NASDAQ': '',
+    'NYSE': '',
+    'US': '',
+    'CRYPTO': '-USD',
+}
+
+
+class QuoteProvider:
+    """
+    Interface for latest-price sources.
+
+    Subclasses implement `get_price(symbol)` for a provider-native symbol
+    (e.g. 'KTC.BK') and return a float or None. Calls are blocking; the
+    engine runs them on worker threads.
+    """
+
+    name = 'base'
+
+    def get_price(self, symbol):
+        raise NotImplementedError
+
+
+class YFinanceProvider(QuoteProvider):
+    """Latest price from yfinance's fast_info (last trade or close)."""
+
+    name = 'yfinance'
+
+    def get_price(self, symbol):
+        # fast_info avoids downloading a history DataFrame
+        return yf.Ticker(symbol).fast_info.last_price
+
+
+DEFAULT_PROVIDER = YFinanceProvider()
+
+
+def provider_symbol(symbol, market):
+    """Maps a local symbol to the provider symbol, e.g. ('KTC', 'SET') -> 'KTC.BK'."""
+    return f"{symbol}{MARKET_SUFFIXES.get((market or '').upper(), '')}"
+
+
+async def fetch_prices_async(symbols, market='US', provider=None, max_concurrency=16, timeout=10.0,
+                             cache=None):
+    """
+    Fetches latest prices concurrently.
+
+    Args:
+        symbols (list): Local symbols, e.g. ['KTC', 'LH'].
+        market (str): Market code used for suffix mapping (see MARKET_SUFFIXES).
+        provider (QuoteProvider): Price source, defaults to yfinance.
+        max_concurrency (int): Maximum requests in flight.
+        timeout (float): Seconds allowed per symbol before giving up.
+        cache (QuoteCache): Optional cache; fresh entries skip the provider and
+            concurrent requests for the same symbol share one fetch.
+
+    Returns:
+        list: Raw prices (float or None), in the same order as `symbols`.
+    """
+    provider = provider or DEFAULT_PROVIDER
+    if not symbols:
+        return []
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='quote')
+
+    def load(symbol):
+        native = provider_symbol(symbol, market)
+        if cache is None:
+            return provider.get_price(native)
+        return cache.get_or_fetch(provider.name, native, market,
+                                  functools.partial(provider.get_price, native))
+
+    async def fetch_one(symbol):
+        async with semaphore:
+            try:
+                call = loop.run_in_executor(executor, load, symbol)
+                return await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                print(f"Error fetching {symbol}: timed out after {timeout}s")
+                count('errors', stage='quote', error='timeout')
+            except Exception as e:
+                print(f"Error fetching {symbol}: {e}")
+                count('errors', stage='quote', error=type(e).__name__)
+            return None
+
+    try:
+        with stage('quote', provider=provider.name, market=market):
+            prices = await asyncio.gather(*(fetch_one(s) for s in symbols))
+        count('quotes', sum(p is not None for p in prices), provider=provider.name, result='priced')
+        count('quotes', sum(p is None for p in prices), provider=provider.name, result='missing')
+        return prices
+    finally:
+        # Don't wait for threads stuck past their timeout
+        executor.shutdown(wait=False)
+
+
+def format_quotes(symbols, prices):
+    """Builds the [{symbol: price}] result format, rounding to 2 decimals."""
+    return [
+        {symbol: round(price, 2) if price else None}
+        for symbol, price in zip(symbols, prices)
+    ]
+
+
+def fetch_quotes(symbols, market='US', provider=None, max_concurrency=16, timeout=10.0, cache=None):
+    """
+    Synchronous entry point: fetches quotes and returns [{symbol: price}] in input order.
+
+    Must not be called from inside a running event loop; use
+    `fetch_prices_async` there instead.
+    """
+    prices = asyncio.run(fetch_prices_async(symbols, market, provider, max_concurrency, timeout, cache))
+    return format_quotes(symbols, prices)
@@ -0,0 +1,261 @@
+"""
+Record/replay of network responses for offline tests and benchmarks.
+
+A Cassette is a fixture directory of recorded responses keyed by request.
+Wrappers put one in front of each network source:
+
+    ReplayProvider  QuoteProvider.get_price (yfinance quotes)
+    ReplaySession   requests-style session.get (SET pages, Wikipedia, SET API)
+    ReplayDownload  yf.download-style fetch(tickers, **kwargs) -> DataFrame
+
+In 'record' mode the wrapped source is called and its response saved. In
+'replay' mode only the fixtures are used, and a missing key raises
+ReplayMissError. Injected latency (a fixed delay plus uniform jitter)
+stands in for the network, so timings are reproducible.
+
+    REPLAY_MODE=record pytest daily-update/test_get_usa_stock.py   # refresh fixtures
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+
+import pandas as pd
+
+from quote_engine import QuoteProvider
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'replay')
+MODES = ('replay', 'record')
+
+
+class ReplayMissError(KeyError):
+    """A request had no recorded response in replay mode."""
+
+
+class Latency:
+    """
+    Injected delay per replayed call: `delay` seconds plus uniform jitter in [0, jitter).
+
+    Seeded, so a benchmark sees the same delays on every run.
+    """
+
+    def __init__(self, delay=0.0, jitter=0.0, seed=0, sleep=time.sleep):
+        self.delay = delay
+        self.jitter = jitter
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.delay and not self.jitter:
+            return
+        with self._lock:
+            extra = self._random.random() * self.jitter
+        self.sleep(self.delay + extra)
+
+
+NO_LATENCY = Latency()
+
+
+class Cassette:
+    """
+    Recorded responses stored as <root>/<name>/index.json plus body files.
+
+    Small JSON-able payloads live in the index; bytes and DataFrames are
+    written to content-addressed files next to it.
+    """
+
+    def __init__(self, name, root=DEFAULT_DIR, mode=None):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.mode = mode or os.getenv('REPLAY_MODE', 'replay')
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown replay mode {self.mode!r}; expected one of {MODES}")
+        self._lock = threading.Lock()
+        self._index = {}
+        index_path = os.path.join(self.path, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self._index = json.load(f)
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, key):
+        try:
+            return self._index[key]
+        except KeyError:
+            raise ReplayMissError(f"{self.name}: no recording for {key!r}") from None
+
+    def put(self, key, entry):
+        with self._lock:
+            self._index[key] = entry
+        return entry
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        index_path = os.path.join(self.path, 'index.json')
+        # Recorders run on worker threads; write whole snapshots, one at a time
+        with self._lock:
+            with open(index_path + '.tmp', 'w') as f:
+                json.dump(self._index, f, indent=1, sort_keys=True)
+            os.replace(index_path + '.tmp', index_path)
+
+    def write_blob(self, data, suffix):
+        name = hashlib.sha256(data).hexdigest()[:16] + suffix
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+        return name
+
+    def read_blob(self, name):
+        with open(os.path.join(self.path, name), 'rb') as f:
+            return f.read()
+
+
+class ReplayProvider(QuoteProvider):
+    """QuoteProvider serving recorded prices; records through `provider` in record mode."""
+
+    def __init__(self, cassette, provider=None, latency=NO_LATENCY):
+        self.cassette = cassette
+        self.provider = provider
+        self.latency = latency
+        self.name = f"replay-{provider.name}" if provider else 'replay'
+
+    def get_price(self, symbol):
+        key = f"quote:{symbol}"
+        if self.cassette.recording:
+            try:
+                price = self.provider.get_price(symbol)
+            except Exception as e:
+                # Failures are part of the recording, so replays hit the same error paths
+                self.cassette.put(key, {'error': str(e)})
+                self.cassette.save()
+                raise
+            self.cassette.put(key, {'price': price})
+            self.cassette.save()
+            return price
+        entry = self.cassette.get(key)
+        self.latency.wait()
+        if 'error' in entry:
+            raise RuntimeError(entry['error'])
+        return entry['price']
+
+
+class RecordedResponse:
+    """The parts of requests.Response the scrapers use."""
+
+    def __init__(self, status_code, content=b'', headers=None, url=''):
+        self.status_code = status_code
+        self.content = content
+        self.headers = dict(headers or {})
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code} for {self.url}")
+
+
+class ReplaySession:
+    """
+    requests.Session stand-in for GET requests.
+
+    Responses are keyed by URL (and query params), not headers, so conditional
+    requests replay the recorded full response.
+    """
+
+    SAVED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+    def __init__(self, cassette, session=None, latency=NO_LATENCY):
+        self.cassette = cassette
+        self.session = session
+        self.latency = latency
+        self.headers = {}
+
+    @staticmethod
+    def key(url, params=None):
+        query = '&'.join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        return f"GET {url}" + (f"?{query}" if query else '')
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        key = self.key(url, params)
+        if self.cassette.recording:
+            response = self.session.get(url, params=params, headers=headers, timeout=timeout, **kwargs)
+            self.cassette.put(key, {
+                'status': response.status_code,
+                'headers': {h: response.headers[h] for h in self.SAVED_HEADERS if h in response.headers},
+                'body': self.cassette.write_blob(response.content, '.body'),
+            })
+            self.cassette.save()
+            return response
+        entry = self.cassette.get(key)
+        self.latency.wait()
+        return RecordedResponse(entry['status'], self.cassette.read_blob(entry['body']), entry['headers'], url)
+
+    def mount(self, prefix, adapter):
+        """Accepted for compatibility with code that configures a real session."""
+
+
+class ReplayDownload:
+    """yf.download-style fetch(tickers, **kwargs) serving recorded DataFrames (Parquet blobs)."""
+
+    def __init__(self, cassette, fetch=None, latency=NO_LATENCY):
+        self.cassette = cassette
+        self.fetch = fetch
+        self.latency = latency
+
+    @staticmethod
+    def key(tickers, **kwargs):
+        options = ','.join(f"{k}={kwargs[k]}" for k in sorted(kwargs))
+        return f"download:{','.join(tickers)}:{options}"
+
+    def __call__(self, tickers, **kwargs):
+        key = self.key(tickers, **kwargs)
+        if self.cassette.recording:
+            frame = self.fetch(tickers, **kwargs)
+            self.put(key, frame)
+            self.cassette.save()
+            return frame
+        entry = self.cassette.get(key)
+        self.latency.wait()
+        return _frame_from_parquet(self.cassette.read_blob(entry['frame']))
+
+    def put(self, key, frame):
+        """Stores a frame under `key` (also used to build fixtures programmatically)."""
+        self.cassette.put(key, {'frame': self.cassette.write_blob(_frame_to_parquet(frame), '.parquet')})
+
+
+def _frame_to_parquet(frame):
+    # Parquet needs string column labels; MultiIndex levels are joined and split back on load
+    flat = frame.copy()
+    if isinstance(flat.columns, pd.MultiIndex):
+        flat.attrs['replay_levels'] = list(flat.columns.names)
+        flat.columns = ['\x1f'.join(map(str, c)) for c in flat.columns]
+    buffer = io.BytesIO()
+    flat.to_parquet(buffer)
+    return buffer.getvalue()
+
+
+def _frame_from_parquet(data):
+    frame = pd.read_parquet(io.BytesIO(data))
+    levels = frame.attrs.get('replay_levels')
+    if levels:
+        frame.columns = pd.MultiIndex.from_tuples([tuple(c.split('\x1f')) for c in frame.columns], names=levels)
+    return frame
@@ -0,0 +1,267 @@
+"""
+S&P 500 constituent sync shared by the symbol scraper and the price ingester.
+
+The Wikipedia list is fetched once, with a conditional request. The raw page
+and its SHA-256 are cached, so an unchanged page is never re-parsed. The parsed table is diffed
+against asset.sp500_symbols and only inserted, changed and removed rows are
+written. The sync result lists the added tickers, so the historical
+backfill can target only those.
+"""
+import datetime
+import hashlib
+import json
+import os
+from collections import namedtuple
+from io import StringIO
+
+import pandas as pd
+import requests
+from sqlalchemy import text
+
+from bulk_load import upsert_records, validate_records
+
+WIKI_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+TABLE = 'asset.sp500_symbols'
+COLUMNS = ['symbol', 'security_name', 'gics_sector', 'gics_sub_industry', 'headquarters',
+           'date_added', 'cik', 'founded']
+MAX_LENGTHS = {'symbol': 10, 'security_name': 255, 'gics_sector': 100,
+               'gics_sub_industry': 100, 'headquarters': 255, 'cik': 20, 'founded': 50}
+
+# Handles the column name variations Wikipedia has used
+RENAME_MAP = {
+    "Symbol": "symbol",
+    "Security": "security_name",
+    "Company": "security_name",
+    "GICS Sector": "gics_sector",
+    "GICS Sub-Industry": "gics_sub_industry",
+    "Headquarters Location": "headquarters",
+    "Date first added": "date_added",
+    "Date added": "date_added",
+    "CIK": "cik",
+    "Founded": "founded",
+}
+
+DEFAULT_CACHE_DIR = os.getenv(
+    'SP500_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sp500_constituents'),
+)
+
+SyncResult = namedtuple('SyncResult', ['added', 'updated', 'removed', 'page_changed', 'errors'])
+
+
+def init_db(engine):
+    """Creates the asset schema and asset.sp500_symbols."""
+    with engine.connect() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS asset;"))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS asset.sp500_symbols (
+                symbol VARCHAR(10) PRIMARY KEY,
+                security_name VARCHAR(255),
+                gics_sector VARCHAR(100),
+                gics_sub_industry VARCHAR(100),
+                headquarters VARCHAR(255),
+                date_added DATE,
+                cik VARCHAR(20),
+                founded VARCHAR(50),
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """))
+        conn.commit()
+    print("Schema 'asset' and table 'sp500_symbols' are ready.")
+
+
+def yfinance_ticker(symbol):
+    """Wikipedia/exchange symbol -> yfinance ticker, e.g. BRK.B -> BRK-B."""
+    return symbol.replace('.', '-')
+
+
+def _paths(cache_dir):
+    return (os.path.join(cache_dir, 'page.html'),
+            os.path.join(cache_dir, 'page.json'),
+            os.path.join(cache_dir, 'constituents.parquet'))
+
+
+def _read_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def fetch_page(session=None, cache_dir=DEFAULT_CACHE_DIR, timeout=30):
+    """
+    Downloads the constituent page unless the cached copy is still current.
+
+    Sends If-None-Match / If-Modified-Since from the previous response. A 304,
+    or a body with the same SHA-256 as the cached page, counts as unchanged.
+
+    Returns:
+        tuple: (html bytes, changed bool)
+    """
+    page_path, meta_path, _ = _paths(cache_dir)
+    meta = _read_meta(meta_path)
+    cached = os.path.exists(page_path) and meta
+
+    headers = dict(HEADERS)
+    if cached and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if cached and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    response = (session or requests).get(WIKI_URL, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        with open(page_path, 'rb') as f:
+            return f.read(), False
+    response.raise_for_status()
+
+    html = response.content
+    digest = hashlib.sha256(html).hexdigest()
+    changed = not cached or digest != meta.get('sha256')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if changed:
+        with open(page_path, 'wb') as f:
+            f.write(html)
+    with open(meta_path, 'w') as f:
+        json.dump({
+            'sha256': digest,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        }, f, indent=1)
+    return html, changed
+
+
+def parse_constituents(html):
+    """
+    Parses the first table of the page into COLUMNS.
+
+    Values are normalised to str/None (date_added to a date) so they
+    compare equal to what is stored in asset.sp500_symbols.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    df = pd.read_html(StringIO(html))[0].rename(columns=RENAME_MAP)
+
+    if 'date_added' not in df.columns:
+        print("Warning: 'date_added' column not found. Setting to NULL.")
+        df['date_added'] = None
+    df['date_added'] = pd.to_datetime(df['date_added'], errors='coerce').dt.date
+    return normalize(df.reindex(columns=COLUMNS))
+
+
+def normalize(df):
+    """Object columns holding str or None, date_added as datetime.date or None."""
+    out = df.reindex(columns=COLUMNS).astype(object)
+    for column in COLUMNS:
+        values = out[column]
+        present = values.notna()
+        if column == 'date_added':
+            values = values.map(lambda v: v.date() if isinstance(v, datetime.datetime) else v)
+        else:
+            values = values.map(lambda v: str(v).strip() if isinstance(v, str) else
+                                str(int(v)) if isinstance(v, float) and v.is_integer() else str(v))
+        out[column] = values.where(present, None)
+    return out.drop_duplicates('symbol', keep='last').reset_index(drop=True)
+
+
+def load_constituents(session=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Current constituents, parsing the page only when its content changed.
+
+    Returns:
+        tuple: (DataFrame of COLUMNS, page_changed bool)
+    """
+    html, changed = fetch_page(session, cache_dir)
+    _, _, parsed_path = _paths(cache_dir)
+    if not changed and os.path.exists(parsed_path):
+        return normalize(pd.read_parquet(parsed_path)), False
+
+    df = parse_constituents(html)
+    df.astype({'date_added': 'datetime64[ns]'}).to_parquet(parsed_path, index=False)
+    return df, True
+
+
+def constituent_tickers(session=None, cache_dir=DEFAULT_CACHE_DIR):
+    """yfinance tickers of the current constituents."""
+    df, _ = load_constituents(session, cache_dir)
+    return [yfinance_ticker(s) for s in df['symbol']]
+
+
+def read_stored(engine):
+    with engine.connect() as conn:
+        df = pd.read_sql(text(f"SELECT {', '.join(COLUMNS)} FROM {TABLE}"), conn)
+    return normalize(df)
+
+
+def diff_constituents(current, stored):
+    """
+    Compares parsed and stored constituents.
+
+    Returns:
+        tuple: (added DataFrame, updated DataFrame, removed symbol list)
+    """
+    merged = current.merge(stored, on='symbol', how='outer', suffixes=('', '_stored'), indicator=True)
+    added = merged[merged['_merge'] == 'left_only']
+    both = merged[merged['_merge'] == 'both']
+    removed = merged.loc[merged['_merge'] == 'right_only', 'symbol'].tolist()
+
+    changed = pd.Series(False, index=both.index)
+    for column in COLUMNS[1:]:
+        # None == None counts as equal
+        new, old = both[column], both[f"{column}_stored"]
+        changed |= ~((new == old) | (new.isna() & old.isna()))
+    updated = both[changed]
+    return added[COLUMNS].reset_index(drop=True), updated[COLUMNS].reset_index(drop=True), sorted(removed)
+
+
+def write_changes(engine, current, page_changed=True):
+    """
+    Diffs `current` against asset.sp500_symbols and writes only the differences.
+
+    Inserts and updates go through one batched upsert with a fresh updated_at;
+    unchanged rows keep theirs. Removed constituents are deleted; rows that
+    failed validation are skipped, not treated as removed.
+
+    Returns:
+        SyncResult: added/updated/removed symbols and validation errors.
+    """
+    records, errors = validate_records(current.to_dict(orient='records'), required=['symbol'],
+                                       max_lengths=MAX_LENGTHS)
+    for error in errors:
+        print(f"Skipping {error['record'].get('symbol')!r}: {error['error']}")
+    valid = normalize(pd.DataFrame(records, columns=COLUMNS))
+    if valid.empty:
+        # Never treat a failed or empty parse as "every constituent was removed"
+        print("No constituents parsed; leaving asset.sp500_symbols untouched.")
+        return SyncResult([], [], [], page_changed, errors)
+
+    added, updated, removed = diff_constituents(valid, read_stored(engine))
+    # A row rejected by validation is still listed on the page, so it must not be deleted
+    rejected = {str(e['record'].get('symbol')).strip() for e in errors if e['record'].get('symbol')}
+    removed = [s for s in removed if s not in rejected]
+    changes = pd.concat([added, updated], ignore_index=True)
+    if not changes.empty:
+        changes['updated_at'] = datetime.datetime.now()
+        upsert_records(engine, TABLE, changes.to_dict(orient='records'),
+                       conflict_columns=['symbol'], columns=COLUMNS + ['updated_at'])
+    if removed:
+        with engine.connect() as conn:
+            conn.execute(text(f"DELETE FROM {TABLE} WHERE symbol = ANY(:symbols)"), {'symbols': removed})
+            conn.commit()
+
+    result = SyncResult(added['symbol'].tolist(), updated['symbol'].tolist(), removed, page_changed, errors)
+    print(f"S&P 500 sync: {len(result.added)} added, {len(result.updated)} updated, "
+          f"{len(result.removed)} removed" + ("" if page_changed else " (page unchanged)") + ".")
+    return result
+
+
+def sync_constituents(engine, session=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Fetches (if changed) and applies the constituent list; see write_changes."""
+    current, page_changed = load_constituents(session, cache_dir)
+    return write_changes(engine, current, page_changed)
+
@@ -0,0 +1,78 @@
+import json
+
+import pandas as pd
+
+from backfill_state import Checkpoint, record_stored
+
+
+def long_rows(ticker, days):
+    return pd.DataFrame({
+        'time': pd.date_range('2024-01-01', periods=days, freq='D', tz='UTC'),
+        'ticker': pd.Categorical([ticker] * days),
+        'close': 1.0,
+    })
+
+
+def test_resume_skips_done_and_retries_failed(tmp_path):
+    path = str(tmp_path / 'job.json')
+    first = Checkpoint(path, job='prices')
+    record_stored(first, long_rows('AAA', 3), ['AAA', 'BBB'])
+    first.mark_failed('CCC', 'HTTP 429')
+    first.save()
+
+    # Simulated crash: no finish(), a new run loads the same file
+    second = Checkpoint(path, job='prices')
+    assert second.pending(['AAA', 'BBB', 'CCC', 'DDD']) == ['BBB', 'CCC', 'DDD']
+    assert second.tickers['AAA'] == {**second.tickers['AAA'], 'status': 'done', 'rows': 3,
+                                     'last_date': '2024-01-03'}
+    assert second.tickers['BBB']['error'] == 'no data returned'
+
+
+def test_clean_finish_starts_a_new_job(tmp_path):
+    path = str(tmp_path / 'job.json')
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done('AAA', 10)
+    assert checkpoint.finish()
+
+    assert Checkpoint(path).pending(['AAA']) == ['AAA']
+
+
+def test_failures_finish_the_job_and_are_retried_next_run(tmp_path):
+    path = str(tmp_path / 'job.json')
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done('BBB', 5, '2024-01-05')
+    checkpoint.mark_failed('GONE', 'no data returned')
+    assert not checkpoint.finish()
+    assert checkpoint.state['finished'] and checkpoint.retry() == ['GONE']
+
+    # The next scheduled run is a new job: everything is fetched again, plus the retries
+    following = Checkpoint(path)
+    assert following.pending(['AAA', 'BBB']) == ['AAA', 'BBB', 'GONE']
+    assert following.pending([]) == ['GONE']
+    following.mark_failed('GONE', 'still nothing')
+    following.mark_failed('GONE', 'timeout')
+    following.mark_done('BBB', 5, '2024-01-05')
+    report = following.report()
+    assert report['done'] == 1 and report['rows'] == 5 and report['retry'] == ['GONE']
+    assert report['failed'] == [{'ticker': 'GONE', 'error': 'timeout', 'attempts': 2}]
+
+    following.write_report(str(tmp_path / 'report.json'))
+    assert json.loads((tmp_path / 'report.json').read_text())['failed'][0]['ticker'] == 'GONE'
+
+
+def test_empty_incremental_batch_is_not_a_failure(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'job.json'))
+    record_stored(checkpoint, long_rows('AAA', 0), ['AAA', 'BBB'], empty_ok=True)
+
+    assert checkpoint.done() == {'AAA', 'BBB'} and not checkpoint.failed()
+    assert checkpoint.tickers['AAA']['rows'] == 0
+    assert checkpoint.finish()
+
+
+def test_fresh_ignores_existing_state(tmp_path):
+    path = str(tmp_path / 'job.json')
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done('AAA', 1)
+    checkpoint.save()
+    assert Checkpoint(path, fresh=True).pending(['AAA']) == ['AAA']
+    assert Checkpoint(None).pending(['AAA']) == ['AAA']
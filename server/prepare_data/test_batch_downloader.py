@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_downloader import BatchDownloader, TokenBucket, make_batches, split_by_ticker
+
+
+def fake_download(tickers, period="5y"):
+    # Mimics yf.download(group_by='ticker'): MultiIndex columns (Ticker, Price)
+    dates = pd.date_range("2024-01-01", periods=3, name="Date")
+    frames = {}
+    for i, ticker in enumerate(tickers):
+        frames[ticker] = pd.DataFrame({
+            'Open': np.arange(3) + i, 'High': np.arange(3) + i, 'Low': np.arange(3) + i,
+            'Close': np.arange(3) + i, 'Volume': np.arange(3) * 100,
+        }, index=dates)
+    return pd.concat(frames, axis=1, names=['Ticker', 'Price'])
+
+
+def test_make_batches():
+    batches = make_batches(['A', 'B', 'C', 'D', 'E'], 2, period="1y")
+    assert [b.tickers for b in batches] == [['A', 'B'], ['C', 'D'], ['E']]
+    assert all(b.kwargs == {'period': "1y"} for b in batches)
+
+
+def test_split_by_ticker():
+    frame = fake_download(['AAA', 'BBB'])
+    parts = split_by_ticker(frame, ['AAA', 'BBB', 'CCC'])
+    assert set(parts) == {'AAA', 'BBB'}
+    assert list(parts['BBB']['Open']) == [1, 2, 3]
+
+    # group_by='column' puts the ticker on the second level
+    swapped = frame.swaplevel(0, 1, axis=1)
+    assert set(split_by_ticker(swapped, ['AAA', 'BBB'])) == {'AAA', 'BBB'}
+
+
+def test_token_bucket_waits_for_refill():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=1, clock=lambda: now[0], sleep=sleep)
+    bucket.acquire()
+    bucket.acquire()
+    assert sleeps == [pytest.approx(0.5)]
+
+
+def test_downloader_writes_every_batch():
+    tickers = [f"T{i}" for i in range(23)]
+    written = []
+    lock = threading.Lock()
+
+    def write(batch, frame):
+        with lock:
+            written.extend(split_by_ticker(frame, batch.tickers))
+
+    downloader = BatchDownloader(fake_download, write, batch_size=5, workers=3, rate=1000)
+    summary = downloader.run(tickers)
+
+    assert sorted(written) == sorted(tickers)
+    assert summary['batches'] == 5
+    assert summary['failed'] == {}
+
+
+def test_downloader_retries_then_reports_failures():
+    calls = {}
+
+    def flaky(tickers):
+        key = tickers[0]
+        calls[key] = calls.get(key, 0) + 1
+        if key == 'BAD':
+            raise RuntimeError("boom")
+        if calls[key] == 1:
+            raise ConnectionError("transient")
+        return fake_download(tickers)
+
+    written = []
+    downloader = BatchDownloader(flaky, lambda b, f: written.extend(b.tickers),
+                                 batch_size=1, workers=2, rate=1000, retries=2,
+                                 sleep=lambda s: None)
+    summary = downloader.run(['OK1', 'BAD', 'OK2'])
+
+    assert sorted(written) == ['OK1', 'OK2']
+    assert calls['BAD'] == 3
+    assert list(summary['failed']) == ['BAD']
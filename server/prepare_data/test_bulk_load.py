@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bulk_load import (copy_dataframe, dataframe_to_csv_buffer, merge_sql, quote_ident,
+                       upsert_records, validate_records)
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def execute(self, sql):
+        self.log.append(('execute', sql))
+
+    def copy_expert(self, sql, buffer):
+        self.log.append(('copy', sql, buffer.read()))
+
+
+class FakeConnection:
+    def __init__(self, log, fail_on_copy=False):
+        self.log = log
+        self.fail_on_copy = fail_on_copy
+
+    def cursor(self):
+        cursor = FakeCursor(self.log)
+        if self.fail_on_copy:
+            cursor.copy_expert = lambda sql, buf: (_ for _ in ()).throw(RuntimeError("copy failed"))
+        return cursor
+
+    def commit(self):
+        self.log.append(('commit',))
+
+    def rollback(self):
+        self.log.append(('rollback',))
+
+    def close(self):
+        self.log.append(('close',))
+
+
+class FakeEngine:
+    def __init__(self, **kwargs):
+        self.log = []
+        self.kwargs = kwargs
+
+    def raw_connection(self):
+        return FakeConnection(self.log, **self.kwargs)
+
+
+@pytest.fixture
+def prices():
+    return pd.DataFrame({
+        'time': pd.to_datetime(['2024-01-02', '2024-01-03']),
+        'ticker': ['AAPL', 'AAPL'],
+        'close': [185.5, None],
+        'volume': pd.array([100, None], dtype='Int64'),
+    })
+
+
+def test_quote_ident():
+    assert quote_ident('asset.sp500_symbols') == '"asset"."sp500_symbols"'
+    assert quote_ident('we"ird') == '"we""ird"'
+
+
+def test_csv_buffer_writes_nulls_as_empty(prices):
+    text = dataframe_to_csv_buffer(prices, ['ticker', 'close', 'volume']).read()
+    assert text.splitlines() == ['AAPL,185.5,100', 'AAPL,,']
+
+
+def test_csv_buffer_widens_float32_to_keep_precision():
+    df = pd.DataFrame({'close': pd.Series([712345.67], dtype='float32')})
+    text = dataframe_to_csv_buffer(df, ['close']).read()
+    # float32's own text form would be 712345.7
+    assert float(text) == float(np.float32(712345.67)) and df['close'].dtype == 'float32'
+
+
+def test_copy_without_conflict_columns_copies_directly(prices):
+    engine = FakeEngine()
+    stats = copy_dataframe(engine, prices, 'sp500_stock_prices', chunksize=1)
+
+    copies = [entry for entry in engine.log if entry[0] == 'copy']
+    assert len(copies) == 2
+    assert copies[0][1].startswith('COPY "sp500_stock_prices" ("time", "ticker", "close", "volume")')
+    assert engine.log[-2:] == [('commit',), ('close',)]
+    assert stats.rows == 2
+
+
+def test_copy_with_conflict_columns_merges_from_staging(prices):
+    engine = FakeEngine()
+    copy_dataframe(engine, prices, 'sp500_stock_prices', conflict_columns=['time', 'ticker'])
+
+    statements = [entry[1] for entry in engine.log if entry[0] in ('execute', 'copy')]
+    assert statements[0].startswith('CREATE TEMP TABLE "_stage_sp500_stock_prices"')
+    assert statements[1].startswith('COPY "_stage_sp500_stock_prices"')
+    assert 'ON CONFLICT ("time", "ticker") DO UPDATE SET "close" = EXCLUDED."close"' in statements[2]
+
+
+def test_copy_rolls_back_on_error(prices):
+    engine = FakeEngine(fail_on_copy=True)
+    with pytest.raises(RuntimeError):
+        copy_dataframe(engine, prices, 'sp500_stock_prices')
+    assert ('rollback',) in engine.log
+    assert ('commit',) not in engine.log
+
+
+def test_merge_sql_do_nothing():
+    sql = merge_sql('"t"', '"s"', ['id', 'v'], ['id'], update=False)
+    assert sql.endswith('ON CONFLICT ("id") DO NOTHING;')
+
+
+def test_merge_keeps_the_last_copied_duplicate(prices):
+    engine = FakeEngine()
+    copy_dataframe(engine, prices, 'sp500_stock_prices', conflict_columns=['time', 'ticker'])
+
+    statements = [entry[1] for entry in engine.log if entry[0] == 'execute']
+    assert 'ADD COLUMN "_stage_row" BIGSERIAL' in statements[0]
+    assert 'SELECT DISTINCT ON ("time", "ticker") "time", "ticker", "close", "volume" ' \
+           'FROM "_stage_sp500_stock_prices" ORDER BY "time", "ticker", "_stage_row" DESC ' in statements[1]
+
+
+def test_validate_records_collects_errors():
+    records = [
+        {'symbol': 'AAI', 'sector': 'FOOD'},
+        {'symbol': '', 'sector': 'FOOD'},
+        {'symbol': 'X' * 25, 'sector': 'FOOD'},
+    ]
+    valid, errors = validate_records(records, required=['symbol'], max_lengths={'symbol': 20})
+    assert valid == [records[0]]
+    assert [(e['index'], e['error']) for e in errors] == [
+        (1, 'missing symbol'),
+        (2, 'symbol longer than 20 characters'),
+    ]
+
+
+def test_upsert_records_batches_and_dedupes(monkeypatch):
+    import psycopg2.extras
+
+    calls = []
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+                        lambda cur, sql, values, template, page_size: calls.append((sql, values, page_size)))
+
+    engine = FakeEngine()
+    records = [
+        {'symbol': 'AAI', 'sector': 'AGRI'},
+        {'symbol': 'CPF', 'sector': 'FOOD'},
+        {'symbol': 'AAI', 'sector': 'FOOD'},
+    ]
+    stats = upsert_records(engine, 'asset.set_symbols', records, conflict_columns=['symbol'], page_size=500)
+
+    sql, values, page_size = calls[0]
+    assert sql == ('INSERT INTO "asset"."set_symbols" ("symbol", "sector") VALUES %s '
+                   'ON CONFLICT ("symbol") DO UPDATE SET "sector" = EXCLUDED."sector"')
+    assert values == [('AAI', 'FOOD'), ('CPF', 'FOOD')]
+    assert page_size == 500
+    assert stats.rows == 2
+    assert ('commit',) in engine.log
+
+
+def test_upsert_records_server_values_go_in_the_template(monkeypatch):
+    import psycopg2.extras
+
+    calls = []
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+                        lambda cur, sql, values, template, page_size: calls.append((sql, values, template)))
+
+    upsert_records(FakeEngine(), 'asset.set_symbols', [{'symbol': 'AAI', 'sector': 'FOOD'}],
+                   conflict_columns=['symbol'], server_values={'updated_at': 'NOW()'})
+
+    sql, values, template = calls[0]
+    assert sql == ('INSERT INTO "asset"."set_symbols" ("symbol", "sector", "updated_at") VALUES %s '
+                   'ON CONFLICT ("symbol") DO UPDATE SET "sector" = EXCLUDED."sector", '
+                   '"updated_at" = EXCLUDED."updated_at"')
+    assert values == [('AAI', 'FOOD')]
+    assert template == '(%s, %s, NOW())'
@@ -0,0 +1,26 @@
+import db
+
+
+def test_database_url_reads_env_overrides(monkeypatch):
+    monkeypatch.setenv('TRADING_DB_HOST', 'tsdb.internal')
+    monkeypatch.setenv('TRADING_DB_PORT', '5433')
+    url = db.database_url('trading')
+    assert url.host == 'tsdb.internal'
+    assert url.port == 5433
+    assert url.database == 'trading_db'
+
+
+def test_get_engine_is_cached_and_tuned():
+    engine = db.get_engine('asset')
+    assert db.get_engine('asset') is engine
+    assert engine.pool.size() == db.POOL_SIZE
+    assert engine.pool._pre_ping
+
+
+def test_ensure_schema_runs_once_per_key():
+    engine = db.get_engine('asset')
+    calls = []
+    db.ensure_schema(engine, 'test.table', calls.append)
+    db.ensure_schema(engine, 'test.table', calls.append)
+    db.ensure_schema(engine, 'test.other', calls.append)
+    assert calls == [engine, engine]
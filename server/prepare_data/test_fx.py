@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sqlalchemy import create_engine
+
+from fx import RateTable, ingest_rates, load_rates, rates_frame, rates_table
+from test_batch_downloader import fake_download
+
+
+def usdthb():
+    times = pd.to_datetime(['2024-01-03', '2024-01-01', '2024-01-02'], utc=True)
+    return RateTable({'USDTHB': (times, [36.0, 34.0, 35.0])})
+
+
+def test_as_of_lookup_uses_latest_rate_at_or_before():
+    table = usdthb()
+    times = pd.to_datetime(['2023-12-31 00:00', '2024-01-01 00:00', '2024-01-02 15:00', '2024-02-01 00:00'], utc=True)
+    np.testing.assert_allclose(table.factor('USD', 'THB', times), [np.nan, 34.0, 35.0, 36.0])
+    assert table.latest('usd', 'thb') == 36.0
+
+
+def test_lookup_is_independent_of_datetime_resolution():
+    # DB reads come back as datetime64[ns], parsed strings as [us] or [s]
+    table = RateTable({'USDTHB': (pd.to_datetime(['2024-01-01'], utc=True).as_unit('s'), [34.0])})
+    ns_times = pd.to_datetime(['2024-01-02'], utc=True).as_unit('ns')
+    assert table.factor('USD', 'THB', ns_times)[0] == 34.0
+    assert np.isnan(table.factor('USD', 'THB', '2023-12-31')[0])
+
+
+def test_inverse_and_cross_rates():
+    table = usdthb()
+    table.add('EURUSD', pd.to_datetime(['2024-01-01'], utc=True), [1.1])
+    assert table.factor('THB', 'USD', '2024-01-02')[0] == pytest.approx(1 / 35.0)
+    assert table.factor('EUR', 'THB', '2024-01-02')[0] == pytest.approx(1.1 * 35.0)
+    with pytest.raises(KeyError):
+        table.factor('USD', 'JPY', '2024-01-02')
+
+
+def test_convert_mixed_currencies_vectorized():
+    table = usdthb()
+    n = 200_000
+    amounts = np.ones(n)
+    currencies = np.where(np.arange(n) % 2 == 0, 'USD', 'THB')
+    times = pd.Timestamp('2024-01-02', tz='UTC') + pd.to_timedelta(np.arange(n) % 3, unit='D')
+    out = table.convert(amounts, currencies, 'THB', times)
+    assert out[0] == 35.0 and out[1] == 1.0 and out[2] == 36.0
+    assert table.convert([10.0, 20.0], 'USD', 'THB', '2024-01-01').tolist() == [340.0, 680.0]
+
+
+def test_rates_frame_strips_provider_suffix():
+    wide = fake_download(['USDTHB=X', 'EURTHB=X'])
+    rows = rates_frame(wide, ['USDTHB', 'EURTHB'])
+    assert list(rows.columns) == ['time', 'pair', 'rate']
+    assert set(rows['pair']) == {'USDTHB', 'EURTHB'}
+    assert RateTable.from_frame(rows).pairs == ['EURTHB', 'USDTHB']
+
+
+def test_intervals_use_separate_tables():
+    assert rates_table('1d') == 'fx_rates' and rates_table('1h') == 'fx_rates_1h'
+    with pytest.raises(ValueError):
+        rates_table('1d; DROP TABLE fx_rates')
+
+
+def test_loaded_daily_rates_take_effect_when_the_bar_closes():
+    engine = create_engine('sqlite://')
+    pd.DataFrame({'time': ['2024-01-01 00:00:00', '2024-01-02 00:00:00'], 'pair': 'USDTHB',
+                  'rate': [34.0, 35.0]}).to_sql('fx_rates', engine, index=False)
+
+    table = load_rates(engine)
+
+    # The 2024-01-02 close is unknown during that day
+    times = pd.to_datetime(['2024-01-02 09:00', '2024-01-03 00:00'], utc=True)
+    np.testing.assert_allclose(table.factor('USD', 'THB', times), [34.0, 35.0])
+
+
+def test_ingest_fetches_each_pair_from_its_watermark(monkeypatch):
+    import fx
+    tables = []
+
+    def read_watermarks(engine, table, column):
+        tables.append(table)
+        return {'USDTHB': pd.Timestamp('2024-05-01').date()}
+
+    monkeypatch.setattr(fx, 'read_watermarks', read_watermarks)
+    written = []
+    monkeypatch.setattr(fx, 'copy_dataframe',
+                        lambda engine, df, table, conflict_columns: written.append((table, df)))
+    calls = []
+
+    def fetch(pairs, interval, start):
+        calls.append((tuple(pairs), start))
+        return rates_frame(fake_download([p + '=X' for p in pairs]), pairs)
+
+    rows = ingest_rates(object(), ['USDTHB', 'EURTHB'], interval='1h', fetch=fetch)
+    assert sorted(calls) == [(('EURTHB',), None), (('USDTHB',), '2024-05-01')]
+    assert rows == sum(len(df) for _, df in written) == 6
+    assert tables == ['fx_rates_1h'] and {table for table, _ in written} == {'fx_rates_1h'}
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import gold
+from fx import RateTable
+from quote_cache import QuoteCache
+from test_batch_downloader import fake_download
+from test_quote_engine import StubProvider
+
+
+def test_fine_ounces_across_units_and_purity():
+    ounces = gold.fine_ounces([31.1034768, 1.0, 2.0, 1.0], ['GRAM', 'baht', 'OUNCE', None], [100, 96.5, 99.99, 100])
+    np.testing.assert_allclose(ounces, [1.0, 15.244 * 0.965 / 31.1034768, 1.9998, 1 / 31.1034768])
+    with pytest.raises(ValueError):
+        gold.fine_ounces([1.0], ['TAEL'], [100])
+
+
+def test_unit_prices_in_thb_and_usd():
+    fx = RateTable({'USDTHB': (pd.to_datetime(['2024-01-01'], utc=True), [35.0])})
+    prices = gold.unit_prices(2000.0, ['BAHT', 'OUNCE'], [96.5, 100.0], ['THB', 'USD'], fx)
+    assert prices[0] == pytest.approx(2000.0 * 15.244 / 31.1034768 * 0.965 * 35.0)
+    assert prices[1] == pytest.approx(2000.0)
+    with pytest.raises(ValueError):
+        gold.unit_prices(2000.0, 'BAHT', 96.5, 'THB')
+
+
+def test_value_holdings_in_one_pass():
+    fx = RateTable({'USDTHB': (pd.to_datetime(['2024-01-01'], utc=True), [35.0])})
+    holdings = pd.DataFrame({'amount': [2.0, 10.0], 'unit': ['BAHT', 'GRAM'],
+                             'gold_purity': [96.5, 99.99], 'currency': ['THB', 'THB']})
+    valued = gold.value_holdings(holdings, 2000.0, fx)
+    np.testing.assert_allclose(valued['market_value'], valued['fine_oz'] * 2000.0 * 35.0)
+
+
+def test_latest_price_uses_cache_then_stored_fallback(monkeypatch):
+    provider = StubProvider({'GC=F': 2350.0})
+    cache = QuoteCache()
+    assert gold.latest_price(cache, provider) == 2350.0
+    assert gold.latest_price(cache, provider) == 2350.0
+    assert provider.requested == ['GC=F']
+
+    monkeypatch.setattr(gold, 'latest_stored_price', lambda engine: 2300.0)
+    assert gold.latest_price(None, StubProvider({}), engine=object()) == 2300.0
+
+
+def test_ingest_resumes_from_the_intervals_own_watermark(monkeypatch):
+    tables = []
+
+    def read_watermarks(engine, table, column):
+        tables.append(table)
+        return {'GC=F': pd.Timestamp('2024-05-01').date()}
+
+    monkeypatch.setattr(gold, 'read_watermarks', read_watermarks)
+    written = []
+    monkeypatch.setattr(gold, 'copy_dataframe',
+                        lambda engine, df, table, conflict_columns: written.append((table, df)))
+    calls = []
+
+    def fetch(interval, start):
+        calls.append((interval, start))
+        long = gold.to_long_frame(fake_download(['GC=F']), ['GC=F'])
+        return long.rename(columns={'ticker': 'symbol'})
+
+    assert gold.ingest_gold(object(), '1h', fetch=fetch) == 3
+    assert calls == [('1h', '2024-05-01')]
+    assert tables == ['gold_prices_1h'] and written[0][0] == 'gold_prices_1h'
+    assert list(written[0][1].columns[:2]) == ['time', 'symbol']
+    assert gold.price_table() == 'gold_prices'
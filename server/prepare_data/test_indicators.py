@@ -0,0 +1,79 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+from indicators import (INDICATOR_COLUMNS, SMA_WINDOWS, compute_indicators, lookback_start, rolling_mean,
+                        rolling_std, running_peak, to_rows)
+
+
+def close_matrix(n_days=300, tickers=('AAA', 'BBB', 'CCC'), seed=1):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2023-01-02', periods=n_days, tz='UTC', name='time')
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_days, len(tickers))), axis=0))
+    frame = pd.DataFrame(values, index=index, columns=list(tickers))
+    frame.iloc[:40, 2] = np.nan  # CCC listed later
+    return frame
+
+
+def test_kernels_match_pandas_rolling():
+    frame = close_matrix()
+    values = frame.to_numpy()
+    for window in (5, 20, 200):
+        expected = frame.rolling(window).mean().to_numpy()
+        np.testing.assert_allclose(rolling_mean(values, window), expected, rtol=1e-9, equal_nan=True)
+
+    returns = frame.pct_change(fill_method=None)
+    np.testing.assert_allclose(rolling_std(returns.to_numpy(), 20), returns.rolling(20).std().to_numpy(),
+                               rtol=1e-6, atol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(running_peak(values), frame.cummax().to_numpy(), equal_nan=True)
+
+
+def test_window_longer_than_history_is_all_nan():
+    assert np.isnan(rolling_mean(np.ones((5, 2)), 20)).all()
+
+
+def test_drawdown_and_returns():
+    close = np.array([[100.0], [120.0], [90.0], [130.0]])
+    result = compute_indicators(close)
+    np.testing.assert_allclose(result['drawdown'][:, 0], [0.0, 0.0, -0.25, 0.0])
+    np.testing.assert_allclose(result['return_1d'][1:, 0], [0.2, -0.25, 130 / 90 - 1])
+    assert set(result) == set(INDICATOR_COLUMNS)
+
+
+def test_incremental_tail_matches_full_computation():
+    frame = close_matrix()
+    full = to_rows(frame, compute_indicators(frame.to_numpy()))
+
+    # Indicators stored up to day 250; reload 220 bars of lookback with the stored peaks
+    cut = frame.index[250]
+    after = {t: cut.date() for t in frame.columns}
+    window = frame.iloc[250 - 219:]
+    peaks = full[full['time'] == cut].set_index('ticker')['peak']
+    seed = peaks.reindex(window.columns).to_numpy()
+    tail = to_rows(window, compute_indicators(window.to_numpy(), seed), after)
+
+    expected = full[full['time'] > cut].reset_index(drop=True)
+    assert len(tail) == len(expected) == 3 * 49
+    pd.testing.assert_frame_equal(tail, expected, check_exact=False, rtol=1e-9)
+
+
+def test_lookback_covers_the_longest_window_after_holidays():
+    holidays = USFederalHolidayCalendar().holidays('2019-01-01', '2025-12-31')
+    for watermark in pd.date_range('2020-01-02', '2025-12-31', freq='17D'):
+        start = lookback_start({'AAA': watermark.date(), 'BBB': watermark.date() + datetime.timedelta(days=30)})
+        trading_days = pd.bdate_range(start, watermark).difference(holidays)
+        # The bars before the first new one, with a margin for halts
+        assert len(trading_days) >= max(SMA_WINDOWS) * 1.05
+
+
+def test_rows_skip_missing_bars_and_respect_watermarks():
+    frame = close_matrix(60)
+    rows = to_rows(frame, compute_indicators(frame.to_numpy()),
+                   after={'AAA': frame.index[50].date(), 'BBB': datetime.date(2100, 1, 1)})
+    assert set(rows['ticker'].astype(str)) == {'AAA', 'CCC'}
+    assert (rows['ticker'] == 'AAA').sum() == 9
+    assert (rows['ticker'] == 'CCC').sum() == 20
+    assert str(rows['time'].dt.tz) == 'UTC'
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+from batch_downloader import BatchDownloader
+from instrumentation import METRICS, Registry, job_run, profile
+
+
+def test_stage_records_timings_and_errors():
+    registry = Registry()
+    with registry.stage('fetch', source='set'):
+        pass
+    with pytest.raises(ValueError):
+        with registry.stage('fetch', source='set'):
+            raise ValueError('bad page')
+
+    snapshot = registry.snapshot()
+    assert snapshot['stages']['fetch']['source=set']['count'] == 2
+    assert snapshot['counters']['errors'] == {'error=ValueError,stage=fetch': 1}
+
+
+def test_nested_stages_count_an_error_once():
+    registry = Registry()
+    with pytest.raises(RuntimeError):
+        with registry.stage('store'):
+            try:
+                raise RuntimeError('copy failed')
+            except RuntimeError as e:
+                registry.count_error(e, 'load')
+                raise
+
+    snapshot = registry.snapshot()
+    assert snapshot['counters']['errors'] == {'error=RuntimeError,stage=load': 1}
+    assert snapshot['stages']['store']['']['count'] == 1
+
+
+def test_timed_wraps_sync_and_async_functions():
+    registry = Registry()
+
+    @registry.timed('parse')
+    def parse(x):
+        return x * 2
+
+    @registry.timed()
+    async def fetch():
+        return 'ok'
+
+    assert parse(2) == 4
+    assert asyncio.run(fetch()) == 'ok'
+    assert set(registry.snapshot()['stages']) == {'parse', 'fetch'}
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    registry.job = 'ingest'
+    registry.count('rows', 500, table='sp500_stock_prices')
+    registry.count('rows', 20, table='sp500_stock_prices')
+    registry.observe('load', 0.25, table='a"b')
+
+    text = registry.to_prometheus()
+
+    assert '# TYPE prepare_data_rows_total counter' in text
+    assert 'prepare_data_rows_total{job="ingest",table="sp500_stock_prices"} 520' in text
+    assert 'prepare_data_stage_seconds_count{job="ingest",stage="load",table="a\\"b"} 1' in text
+    assert 'prepare_data_stage_seconds_sum{job="ingest",stage="load",table="a\\"b"} 0.250000' in text
+
+
+def test_job_run_writes_jsonl_and_prom_files(tmp_path):
+    registry = Registry()
+    with job_run('demo', directory=str(tmp_path), registry=registry):
+        with registry.stage('transform'):
+            registry.count('rows', 3)
+
+    events = [json.loads(line) for line in (tmp_path / 'demo.jsonl').read_text().splitlines()]
+    assert [e['event'] for e in events] == ['start', 'stage', 'stage', 'summary']
+    assert events[-1]['ok'] and events[-1]['counters'] == {'rows': {'': 3}}
+    assert 'prepare_data_stage_seconds_count{job="demo",stage="job"} 1' in (tmp_path / 'demo.prom').read_text()
+
+
+def test_job_run_dumps_metrics_when_the_job_fails(tmp_path):
+    registry = Registry()
+    with pytest.raises(RuntimeError):
+        with job_run('broken', directory=str(tmp_path), registry=registry):
+            raise RuntimeError('db down')
+
+    summary = json.loads((tmp_path / 'broken.jsonl').read_text().splitlines()[-1])
+    assert summary['ok'] is False
+    assert 'error="RuntimeError"' in (tmp_path / 'broken.prom').read_text()
+
+
+def test_profile_writes_cpu_and_memory_reports(tmp_path, capsys):
+    with profile(str(tmp_path / 'run'), cpu=True, memory=True, top=5):
+        sum(range(10000))
+
+    assert (tmp_path / 'run.pstats').exists()
+    assert (tmp_path / 'run.memory.txt').read_text().startswith('peak traced')
+
+
+def test_batch_downloader_counts_retries():
+    METRICS.reset()
+    calls = []
+
+    def flaky(tickers):
+        calls.append(tickers)
+        if len(calls) < 3:
+            raise ConnectionError('reset')
+        return 'ok'
+
+    downloader = BatchDownloader(flaky, lambda batch, result: None, rate=1000, backoff=0, sleep=lambda s: None)
+    downloader.run(['AAA'])
+
+    snapshot = METRICS.snapshot()
+    assert snapshot['counters']['retries'] == {'stage=fetch': 2}
+    assert snapshot['stages']['fetch']['']['count'] == 3
+    assert snapshot['stages']['store']['']['count'] == 1
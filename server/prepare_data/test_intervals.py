@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+
+from intervals import bar_length, interval_table, range_kwargs
+
+
+def test_intraday_intervals_get_their_own_table():
+    assert interval_table('gold_prices') == 'gold_prices'
+    assert interval_table('gold_prices', '1h') == 'gold_prices_1h'
+    with pytest.raises(ValueError):
+        interval_table('fx_rates', '1d; DROP TABLE fx_rates')
+
+
+def test_bar_length():
+    assert bar_length('1d') == pd.Timedelta(days=1)
+    assert bar_length('1h') == pd.Timedelta(hours=1)
+    assert bar_length('15m') == pd.Timedelta(minutes=15)
+
+
+def test_range_kwargs_resume_from_start_or_use_full_period():
+    assert range_kwargs('1d', start='2024-05-01') == {'start': '2024-05-01'}
+    assert range_kwargs('1d') == {'period': '5y'}
+    assert range_kwargs('1h') == {'period': '730d'}
+    assert range_kwargs('5m') == {'period': '60d'}
+    assert range_kwargs('1d', period='max') == {'period': 'max'}
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_ohlcv_transform import per_ticker_loop, synthetic_download
+from ohlcv_transform import to_long_frame
+from test_batch_downloader import fake_download
+
+
+def test_long_frame_layout_and_dtypes():
+    long = to_long_frame(fake_download(['AAA', 'BBB']))
+    assert list(long.columns) == ['time', 'ticker', 'open', 'high', 'low', 'close', 'volume']
+    assert long['ticker'].dtype == 'category'
+    assert long['close'].dtype == np.float32
+    assert long['volume'].dtype == 'Int64'
+    assert list(long['ticker']) == ['AAA'] * 3 + ['BBB'] * 3
+    assert list(long.loc[long['ticker'] == 'BBB', 'open']) == [1.0, 2.0, 3.0]
+
+
+def test_db_rows_can_keep_full_precision():
+    wide = fake_download(['AAA'])
+    wide[('AAA', 'Close')] = 712345.67
+    long = to_long_frame(wide, price_dtype='float64')
+    assert long['close'].dtype == np.float64 and long['close'].iloc[0] == 712345.67
+
+
+def test_column_layouts_give_the_same_rows():
+    wide = fake_download(['AAA', 'BBB'])
+    by_ticker = to_long_frame(wide)
+    by_field = to_long_frame(wide.swaplevel(0, 1, axis=1))
+    pd.testing.assert_frame_equal(by_ticker, by_field)
+
+    flat = to_long_frame(wide['AAA'], ['AAA'])
+    pd.testing.assert_frame_equal(flat, by_ticker[by_ticker['ticker'] == 'AAA'], check_categorical=False)
+
+
+def test_missing_bars_and_tickers_are_dropped():
+    wide = fake_download(['AAA', 'BBB'])
+    wide.loc[wide.index[0], 'AAA'] = np.nan
+    long = to_long_frame(wide, ['AAA', 'BBB', 'ZZZ'])
+    assert len(long) == 5
+    assert list(long['ticker'].cat.categories) == ['AAA', 'BBB']
+
+
+def test_flat_frame_needs_one_ticker():
+    with pytest.raises(ValueError):
+        to_long_frame(fake_download(['AAA'])['AAA'], ['AAA', 'BBB'])
+
+
+def test_matches_per_ticker_loop():
+    wide, tickers = synthetic_download(7, 30)
+    expected = per_ticker_loop(wide, tickers)
+    long = to_long_frame(wide, tickers)
+    assert len(long) == len(expected)
+    np.testing.assert_allclose(long['close'], expected['close'], rtol=1e-6)
+    assert list(long['ticker'].astype(str)) == list(expected['ticker'])
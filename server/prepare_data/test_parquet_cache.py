@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from parquet_cache import read_matrix, read_prices, write_prices
+
+
+def bars(ticker, start, periods, close=100.0):
+    times = pd.date_range(start, periods=periods, freq='D')
+    return pd.DataFrame({
+        'time': times,
+        'ticker': ticker,
+        'open': close, 'high': close, 'low': close,
+        'close': close + np.arange(periods, dtype=float),
+        'volume': np.arange(periods) * 10,
+    })
+
+
+def test_write_partitions_by_ticker_and_year(tmp_path):
+    root = str(tmp_path / 'cache')
+    write_prices(pd.concat([bars('AAPL', '2023-12-30', 4), bars('MSFT', '2024-01-01', 2)]), root)
+
+    assert sorted(p.name for p in (tmp_path / 'cache').iterdir()) == ['ticker=AAPL', 'ticker=MSFT']
+    assert sorted(p.name for p in (tmp_path / 'cache' / 'ticker=AAPL').iterdir()) == ['year=2023', 'year=2024']
+
+
+def test_incremental_write_merges_without_duplicates(tmp_path):
+    root = str(tmp_path / 'cache')
+    write_prices(bars('AAPL', '2024-01-01', 5), root)
+    write_prices(bars('AAPL', '2024-01-04', 4, close=200.0), root)
+
+    df = read_prices(['AAPL'], root=root)
+    assert len(df) == 7
+    assert df['time'].is_unique
+    assert df.loc[df['time'] == pd.Timestamp('2024-01-04', tz='UTC'), 'close'].item() == 200.0
+
+
+def test_read_filters_tickers_dates_and_columns(tmp_path):
+    root = str(tmp_path / 'cache')
+    write_prices(pd.concat([bars('AAPL', '2023-12-25', 20), bars('MSFT', '2023-12-25', 20)]), root)
+
+    df = read_prices(['MSFT'], start='2024-01-02', end='2024-01-05', columns=['close'], root=root)
+    assert list(df.columns) == ['time', 'ticker', 'close']
+    assert set(df['ticker']) == {'MSFT'}
+    assert df['time'].min() == pd.Timestamp('2024-01-02', tz='UTC')
+    assert len(df) == 4
+
+
+def test_read_matrix_pivots_dates_by_ticker(tmp_path):
+    root = str(tmp_path / 'cache')
+    write_prices(pd.concat([bars('AAPL', '2024-01-01', 3), bars('MSFT', '2024-01-02', 2)]), root)
+
+    matrix = read_matrix('close', root=root)
+    assert list(matrix.columns) == ['AAPL', 'MSFT']
+    assert matrix.shape == (3, 2)
+    assert np.isnan(matrix['MSFT'].iloc[0])
+
+
+def test_read_missing_root_is_empty(tmp_path):
+    assert read_prices(root=str(tmp_path / 'nothing')).empty
+
+
+def test_date_end_includes_bars_stamped_at_exchange_midnight(tmp_path):
+    root = str(tmp_path / 'cache')
+    ny = bars('AAPL', '2024-01-02', 5)
+    ny['time'] = ny['time'].dt.tz_localize('America/New_York')
+    write_prices(ny, root)
+
+    df = read_prices(['AAPL'], start='2024-01-02', end='2024-01-05', root=root)
+    assert len(df) == 4 and df['time'].max() == pd.Timestamp('2024-01-05 05:00', tz='UTC')
+    # A bound with a time of day stays exact
+    assert len(read_prices(['AAPL'], end='2024-01-05 04:59', root=root)) == 3
+
+
+def test_each_ticker_year_file_is_one_row_group(tmp_path):
+    import pyarrow.parquet as pq
+
+    root = tmp_path / 'cache'
+    write_prices(bars('AAPL', '2023-01-01', 300), str(root))
+
+    files = list(root.glob('ticker=AAPL/year=2023/*.parquet'))
+    assert len(files) == 1 and pq.ParquetFile(files[0]).num_row_groups == 1
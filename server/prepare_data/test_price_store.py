@@ -0,0 +1,103 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_store import PriceStore
+
+
+def bars():
+    return pd.DataFrame({
+        'time': pd.to_datetime(['2024-01-03', '2024-01-02', '2024-01-04', '2024-01-02', '2024-01-05'], utc=True),
+        'ticker': ['AAA', 'AAA', 'AAA', 'BBB', 'BBB'],
+        'open': [10.5, 9.5, 11.5, 50.5, 51.5],
+        'close': [11.0, 10.0, 12.0, 50.0, 52.0],
+    })
+
+
+def test_asof_uses_latest_bar_at_or_before_each_time():
+    store = PriceStore.from_frame(bars())
+
+    got = store.asof('AAA', ['2024-01-01 00:00', '2024-01-02 00:00', '2024-01-03 12:00', '2024-02-01 00:00'])
+
+    np.testing.assert_array_equal(got, [np.nan, 10.0, 11.0, 12.0])
+    np.testing.assert_array_equal(store.asof_many(['BBB', 'AAA', 'ZZZ'], '2024-01-04'), [50.0, 12.0, np.nan])
+    assert store.latest() == {'AAA': 12.0, 'BBB': 52.0}
+
+
+def test_range_returns_views_inside_bounds():
+    store = PriceStore.from_frame(bars(), fields=['open', 'close'])
+
+    times, opens = store.range('AAA', '2024-01-03', '2024-01-04', field='open')
+
+    assert list(pd.to_datetime(times, utc=True).day) == [3, 4]
+    np.testing.assert_array_equal(opens, [10.5, 11.5])
+    assert np.shares_memory(opens, store.series('AAA', 'open')[1])
+
+
+def test_append_interns_symbols_and_newest_duplicate_wins():
+    store = PriceStore.from_frame(bars())
+    store.append('CCC', ['2024-01-02', '2024-01-03'], close=[5.0, 6.0])
+    store.append(['AAA', 'AAA'], ['2024-01-04', '2024-01-08'], close=[12.5, 13.0])
+
+    assert store.symbols == ['AAA', 'BBB', 'CCC']
+    assert store.intern(['CCC', 'AAA']).tolist() == [2, 0]
+    np.testing.assert_array_equal(store.series('AAA', 'close')[1], [10.0, 11.0, 12.5, 13.0])
+    assert len(store) == 8
+    with pytest.raises(KeyError):
+        store.asof('ZZZ', '2024-01-02')
+    with pytest.raises(ValueError):
+        store.append('AAA', '2024-01-09', volume=[1.0])
+
+
+def test_interned_symbol_without_bars_reads_as_empty():
+    store = PriceStore().append(['AAA'], ['2024-01-02'], close=[10.0])
+    assert len(store) == 1  # merged, so BBB is interned after the offsets were built
+    store.intern(['BBB'])
+
+    assert store.latest(['BBB']) == {'BBB': None}
+    assert len(store.range('BBB')[0]) == 0
+    np.testing.assert_array_equal(store.asof('BBB', ['2024-01-03']), [np.nan])
+    assert store.latest(['AAA']) == {'AAA': 10.0}
+
+    store.append('BBB', ['2024-01-03'], close=[20.0])
+    assert store.latest() == {'AAA': 10.0, 'BBB': 20.0}
+
+
+def test_to_frame_round_trip():
+    store = PriceStore.from_frame(bars(), fields=['open', 'close'])
+
+    df = store.to_frame()
+
+    assert list(df.columns) == ['time', 'symbol', 'open', 'close']
+    assert df['symbol'].tolist() == ['AAA', 'AAA', 'AAA', 'BBB', 'BBB']
+    assert df['close'].tolist() == [10.0, 11.0, 12.0, 50.0, 52.0]
+
+
+def read_shared(spec):
+    store = PriceStore.attach(spec)
+    try:
+        return store.asof('BBB', '2024-01-06').tolist(), store.latest(['AAA'])
+    finally:
+        store.close()
+
+
+def test_shared_memory_store_is_readable_from_other_processes():
+    store = PriceStore.from_frame(bars())
+    spec = store.to_shared()
+    try:
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(read_shared, [spec, spec]))
+        assert results == [([52.0], {'AAA': 12.0})] * 2
+
+        attached = PriceStore.attach(spec)
+        assert not attached.series('AAA', 'close')[1].flags.writeable
+        with pytest.raises(TypeError):
+            attached.append('AAA', '2024-01-09', close=[1.0])
+        attached.close()
+    finally:
+        store.unlink()
+    # The owner keeps working on private copies after unlinking
+    assert store.latest(['BBB']) == {'BBB': 52.0}
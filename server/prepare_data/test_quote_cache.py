@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from quote_cache import QuoteCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_until_ttl_expires():
+    clock = Clock()
+    cache = QuoteCache(ttls={'SET': 30}, clock=clock)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return 43.5
+
+    assert cache.get_or_fetch('yfinance', 'KTC.BK', 'SET', loader) == 43.5
+    clock.now += 29
+    assert cache.get_or_fetch('yfinance', 'KTC.BK', 'SET', loader) == 43.5
+    clock.now += 2
+    assert cache.get_or_fetch('yfinance', 'KTC.BK', 'SET', loader) == 43.5
+
+    assert len(calls) == 2
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 2
+
+
+def test_none_and_errors_are_not_cached():
+    cache = QuoteCache()
+    assert cache.get_or_fetch('p', 'X', 'US', lambda: None) is None
+    with pytest.raises(ValueError):
+        cache.get_or_fetch('p', 'X', 'US', lambda: (_ for _ in ()).throw(ValueError("down")))
+    assert cache.get_or_fetch('p', 'X', 'US', lambda: 1.0) == 1.0
+
+
+def test_lru_eviction():
+    cache = QuoteCache(maxsize=2)
+    cache.put('p', 'A', 'US', 1.0)
+    cache.put('p', 'B', 'US', 2.0)
+    assert cache.get('p', 'A') == 1.0  # A becomes most recently used
+    cache.put('p', 'C', 'US', 3.0)
+
+    assert cache.get('p', 'B') is None
+    assert cache.get('p', 'A') == 1.0
+    assert cache.stats['evictions'] == 1
+
+
+def test_concurrent_requests_share_one_fetch():
+    cache = QuoteCache()
+    calls = []
+    release = threading.Event()
+
+    def slow_loader():
+        calls.append(1)
+        release.wait(1)
+        return 9.8
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch('p', 'LH.BK', 'SET', slow_loader)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == [9.8] * 5
+    assert len(calls) == 1
+    assert cache.stats['coalesced'] == 4
+
+
+def test_sqlite_store_survives_new_instance(tmp_path):
+    path = str(tmp_path / "quotes.sqlite3")
+    QuoteCache(path=path).put('p', 'GC=F', 'GOLD', 2350.0)
+
+    cache = QuoteCache(path=path)
+    assert cache.get('p', 'GC=F', 'GOLD') == 2350.0
+    assert cache.stats['disk_hits'] == 1
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from quote_engine import QuoteProvider, fetch_quotes, provider_symbol
+
+
+class StubProvider(QuoteProvider):
+    name = 'stub'
+
+    def __init__(self, prices, delay=0.0):
+        self.prices = prices
+        self.delay = delay
+        self.requested = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_price(self, symbol):
+        with self._lock:
+            self.requested.append(symbol)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            price = self.prices[symbol]
+            if isinstance(price, Exception):
+                raise price
+            return price
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_provider_symbol_suffixes():
+    assert provider_symbol('KTC', 'SET') == 'KTC.BK'
+    assert provider_symbol('AAPL', 'nasdaq') == 'AAPL'
+    assert provider_symbol('AAPL', None) == 'AAPL'
+
+
+def test_fetch_quotes_keeps_input_order_and_maps_suffix():
+    provider = StubProvider({'KTC.BK': 43.456, 'LH.BK': 9.8, 'BAD.BK': ValueError("no data")})
+    quotes = fetch_quotes(['KTC', 'BAD', 'LH'], 'SET', provider=provider)
+    assert quotes == [{'KTC': 43.46}, {'BAD': None}, {'LH': 9.8}]
+    assert sorted(provider.requested) == ['BAD.BK', 'KTC.BK', 'LH.BK']
+
+
+def test_fetch_quotes_caps_concurrency():
+    symbols = [f"S{i}" for i in range(12)]
+    provider = StubProvider({s: 1.0 for s in symbols}, delay=0.02)
+    fetch_quotes(symbols, 'US', provider=provider, max_concurrency=3)
+    assert provider.max_in_flight <= 3
+
+
+def test_fetch_quotes_times_out_slow_symbols():
+    provider = StubProvider({'SLOW': 1.0}, delay=0.5)
+    start = time.perf_counter()
+    assert fetch_quotes(['SLOW'], 'US', provider=provider, timeout=0.05) == [{'SLOW': None}]
+    assert time.perf_counter() - start < 0.4
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+from quote_engine import QuoteProvider, fetch_quotes
+from replay import (Cassette, Latency, RecordedResponse, ReplayDownload, ReplayMissError, ReplayProvider,
+                    ReplaySession)
+
+
+class FakeProvider(QuoteProvider):
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = []
+
+    def get_price(self, symbol):
+        self.calls.append(symbol)
+        return {'KTC.BK': 43.5, 'LH.BK': 9.8}.get(symbol)
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append(url)
+        return RecordedResponse(200, b'<html>43.50</html>', {'ETag': '"v1"', 'Server': 'x'}, url)
+
+
+def test_provider_records_then_replays_without_the_source(tmp_path):
+    source = FakeProvider()
+    recorder = ReplayProvider(Cassette('q', root=str(tmp_path), mode='record'), source)
+    assert fetch_quotes(['KTC', 'LH', 'GONE'], 'SET', provider=recorder) == \
+        [{'KTC': 43.5}, {'LH': 9.8}, {'GONE': None}]
+
+    replayer = ReplayProvider(Cassette('q', root=str(tmp_path), mode='replay'))
+    assert fetch_quotes(['KTC', 'LH', 'GONE'], 'SET', provider=replayer) == \
+        [{'KTC': 43.5}, {'LH': 9.8}, {'GONE': None}]
+    assert sorted(source.calls) == ['GONE.BK', 'KTC.BK', 'LH.BK']
+
+
+def test_replay_miss_raises(tmp_path):
+    provider = ReplayProvider(Cassette('empty', root=str(tmp_path), mode='replay'))
+    with pytest.raises(ReplayMissError):
+        provider.get_price('KTC.BK')
+
+
+def test_session_round_trip_keeps_body_and_validators(tmp_path):
+    url = 'https://example.test/quote/KTC'
+    ReplaySession(Cassette('s', root=str(tmp_path), mode='record'), FakeSession()).get(url, timeout=5)
+
+    response = ReplaySession(Cassette('s', root=str(tmp_path), mode='replay')).get(url)
+
+    assert response.status_code == 200
+    assert response.content == b'<html>43.50</html>'
+    assert response.headers == {'ETag': '"v1"'}
+
+
+def test_download_round_trips_multiindex_frame(tmp_path):
+    columns = pd.MultiIndex.from_product([['AAA', 'BBB'], ['Close', 'Volume']], names=['Ticker', 'Price'])
+    wide = pd.DataFrame([[1.0, 10.0, 2.0, 20.0]], index=pd.DatetimeIndex(['2024-01-02'], name='Date'),
+                        columns=columns)
+    ReplayDownload(Cassette('d', root=str(tmp_path), mode='record'), lambda tickers, **kw: wide)(
+        ['AAA', 'BBB'], period='5y')
+
+    got = ReplayDownload(Cassette('d', root=str(tmp_path), mode='replay'))(['AAA', 'BBB'], period='5y')
+
+    pd.testing.assert_frame_equal(got, wide, check_freq=False)
+
+
+def test_latency_is_seeded_and_only_applies_on_replay(tmp_path):
+    slept = []
+    cassette = Cassette('q', root=str(tmp_path), mode='replay')
+    cassette.put('quote:KTC.BK', {'price': 43.5})
+    provider = ReplayProvider(cassette, latency=Latency(0.01, 0.02, seed=1, sleep=slept.append))
+
+    provider.get_price('KTC.BK')
+    provider.get_price('KTC.BK')
+    again = []
+    Latency(0.01, 0.02, seed=1, sleep=again.append).wait()
+
+    assert len(slept) == 2 and all(0.01 <= s < 0.03 for s in slept)
+    assert again == slept[:1]
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        Cassette('x', root=str(tmp_path), mode='live')
@@ -0,0 +1,115 @@
+import datetime
+
+import pandas as pd
+
+import sp500_constituents as sc
+
+
+def page(rows):
+    body = ''.join(
+        f"<tr><td>{s}</td><td>{name}</td><td>IT</td><td>Software</td><td>Austin</td>"
+        f"<td>{added}</td><td>{cik}</td><td>1990</td></tr>" for s, name, added, cik in rows)
+    return (
+        "<html><body><table><tr><th>Symbol</th><th>Security</th><th>GICS Sector</th>"
+        "<th>GICS Sub-Industry</th><th>Headquarters Location</th><th>Date added</th><th>CIK</th>"
+        f"<th>Founded</th></tr>{body}</table></body></html>"
+    ).encode()
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent.append(headers)
+        return self.responses.pop(0)
+
+
+ROWS = [('AAPL', 'Apple', '1982-11-30', '320193'), ('BRK.B', 'Berkshire', '2010-02-16', '1067983')]
+
+
+def test_parse_normalizes_values():
+    df = sc.parse_constituents(page(ROWS))
+    assert list(df.columns) == sc.COLUMNS
+    assert df.loc[0, 'date_added'] == datetime.date(1982, 11, 30)
+    assert df.loc[1, 'cik'] == '1067983'
+    assert df.loc[0, 'founded'] == '1990'
+
+
+def test_unchanged_page_is_not_reparsed(tmp_path, monkeypatch):
+    html = page(ROWS)
+    session = FakeSession([
+        FakeResponse(200, html, {'ETag': '"v1"'}),
+        FakeResponse(304),
+        FakeResponse(200, html),
+    ])
+    df, changed = sc.load_constituents(session, str(tmp_path))
+    assert changed and len(df) == 2
+
+    parsed = []
+    monkeypatch.setattr(sc, 'parse_constituents', lambda h: parsed.append(h))
+    cached, changed = sc.load_constituents(session, str(tmp_path))
+    assert not changed
+    assert session.sent[1]['If-None-Match'] == '"v1"'
+    pd.testing.assert_frame_equal(cached, df)
+
+    # Same bytes without a 304 are caught by the content hash
+    _, changed = sc.load_constituents(session, str(tmp_path))
+    assert not changed and parsed == []
+
+
+def test_diff_finds_only_real_changes():
+    stored = sc.parse_constituents(page(ROWS + [('OLD', 'Gone Inc', '2000-01-01', '1')]))
+    current = sc.parse_constituents(page([
+        ('AAPL', 'Apple', '1982-11-30', '320193'),
+        ('BRK.B', 'Berkshire Hathaway', '2010-02-16', '1067983'),
+        ('NEW', 'New Co', '2024-06-24', '2'),
+    ]))
+    added, updated, removed = sc.diff_constituents(current, stored)
+    assert added['symbol'].tolist() == ['NEW']
+    assert updated['symbol'].tolist() == ['BRK.B']
+    assert removed == ['OLD']
+
+    added, updated, removed = sc.diff_constituents(stored, stored)
+    assert added.empty and updated.empty and removed == []
+
+
+def test_write_changes_upserts_only_the_diff(monkeypatch):
+    stored = sc.parse_constituents(page(ROWS))
+    monkeypatch.setattr(sc, 'read_stored', lambda engine: stored)
+    upserts = []
+    monkeypatch.setattr(sc, 'upsert_records', lambda engine, table, records, **kw: upserts.append(records))
+
+    current = sc.parse_constituents(page(ROWS + [('NEW', 'New Co', '2024-06-24', '2')]))
+    result = sc.write_changes(object(), current)
+    assert result.added == ['NEW'] and result.updated == [] and result.removed == []
+    assert [r['symbol'] for r in upserts[0]] == ['NEW']
+    assert sc.yfinance_ticker('BRK.B') == 'BRK-B'
+
+    # An empty parse never deletes the table
+    assert sc.write_changes(object(), current.iloc[:0]).removed == []
+
+
+def test_rows_rejected_by_validation_are_not_deleted(monkeypatch):
+    stored = sc.parse_constituents(page(ROWS))
+    monkeypatch.setattr(sc, 'read_stored', lambda engine: stored)
+    monkeypatch.setattr(sc, 'upsert_records', lambda engine, table, records, **kw: None)
+
+    current = stored.copy()
+    current.loc[current['symbol'] == 'AAPL', 'security_name'] = 'A' * 300
+    result = sc.write_changes(object(), current, page_changed=False)
+
+    assert result.removed == [] and not result.page_changed
+    assert [e['record']['symbol'] for e in result.errors] == ['AAPL']
@@ -0,0 +1,95 @@
+from timescale_schema import create_ohlcv_aggregates, ensure_hypertable, init_price_schema, timescale_version
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeConnection:
+    def __init__(self, compression_enabled=False, version='2.14.2'):
+        self.statements = []
+        self.compression_enabled = compression_enabled
+        self.version = version
+        self.committed = False
+
+    def execute(self, statement, params=None):
+        sql = ' '.join(str(statement).split())
+        self.statements.append((sql, params))
+        if 'extversion' in sql:
+            return FakeResult(self.version)
+        return FakeResult(self.compression_enabled if 'compression_enabled' in sql else None)
+
+    def commit(self):
+        self.committed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def connect(self):
+        return self.conn
+
+
+def sql_log(conn):
+    return [sql for sql, _ in conn.statements]
+
+
+def test_hypertable_uses_the_real_table_name():
+    conn = FakeConnection()
+    ensure_hypertable(conn, 'sp500_stock_prices', 'ticker')
+    create = next(p for s, p in conn.statements if 'create_hypertable' in s)
+    assert create == {'table': 'sp500_stock_prices', 'time_column': 'time'}
+
+    log = sql_log(conn)
+    assert any('CREATE INDEX IF NOT EXISTS "sp500_stock_prices_ticker_time_idx" '
+               'ON "sp500_stock_prices" ("ticker", "time" DESC)' in s for s in log)
+    assert any("timescaledb.compress_segmentby = 'ticker'" in s for s in log)
+    assert any("add_compression_policy" in s and "INTERVAL '30 days'" in s for s in log)
+
+
+def test_compression_settings_are_not_reapplied():
+    conn = FakeConnection(compression_enabled=True)
+    ensure_hypertable(conn, 'sp500_stock_prices', 'ticker')
+    assert not any(s.startswith('ALTER TABLE') for s in sql_log(conn))
+
+
+def test_compression_policy_needs_dml_on_compressed_chunks():
+    conn = FakeConnection(version='2.10.3')
+    ensure_hypertable(conn, 'sp500_stock_prices', 'ticker')
+    assert timescale_version(conn) == (2, 10, 3)
+    assert not any('add_compression_policy' in s for s in sql_log(conn))
+    # Compression settings alone are harmless, so they are still applied
+    assert any("timescaledb.compress_segmentby = 'ticker'" in s for s in sql_log(conn))
+
+
+def test_weekly_and_monthly_aggregates_with_policies():
+    conn = FakeConnection()
+    create_ohlcv_aggregates(conn, 'sp500_stock_prices')
+    log = sql_log(conn)
+    views = [s for s in log if 'CREATE MATERIALIZED VIEW' in s]
+    assert len(views) == 2
+    assert '"sp500_stock_prices_weekly"' in views[0] and "INTERVAL '1 week'" in views[0]
+    assert '"sp500_stock_prices_monthly"' in views[1] and 'WITH NO DATA' in views[1]
+    assert 'first(open, time)' in views[0] and 'last(close, time)' in views[0]
+    policies = [p for s, p in conn.statements if 'add_continuous_aggregate_policy' in s]
+    assert policies == [{'view': 'sp500_stock_prices_weekly'}, {'view': 'sp500_stock_prices_monthly'}]
+
+
+def test_init_price_schema_runs_in_one_transaction():
+    conn = FakeConnection()
+    init_price_schema(FakeEngine(conn), aggregates=False)
+    log = sql_log(conn)
+    assert log[0].startswith('CREATE TABLE IF NOT EXISTS "sp500_stock_prices"')
+    assert not any('MATERIALIZED VIEW' in s for s in log)
+    assert conn.committed
@@ -0,0 +1,30 @@
+import datetime
+
+from watermarks import plan_incremental
+
+
+def test_plan_incremental_groups_by_start_date():
+    today = datetime.date(2024, 6, 10)
+    watermarks = {
+        'AAPL': datetime.date(2024, 6, 7),
+        'MSFT': datetime.date(2024, 6, 7),
+        'NVDA': datetime.date(2024, 6, 3),
+        'KO': datetime.date(2024, 6, 10),  # today's bar may still be partial
+    }
+    batches = plan_incremental(['AAPL', 'MSFT', 'NVDA', 'KO', 'NEW'], watermarks,
+                               batch_size=10, today=today)
+
+    assert [(b.tickers, b.kwargs) for b in batches] == [
+        (['NEW'], {'period': '5y'}),
+        (['NVDA'], {'start': '2024-06-03'}),
+        (['AAPL', 'MSFT'], {'start': '2024-06-07'}),
+        (['KO'], {'start': '2024-06-10'}),
+    ]
+
+
+def test_plan_incremental_respects_batch_size():
+    today = datetime.date(2024, 6, 10)
+    last = datetime.date(2024, 6, 7)
+    tickers = [f"T{i}" for i in range(5)]
+    batches = plan_incremental(tickers, {t: last for t in tickers}, batch_size=2, today=today)
+    assert [len(b.tickers) for b in batches] == [2, 2, 1]
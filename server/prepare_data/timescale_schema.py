@@ -0,0 +1,142 @@
+"""
+TimescaleDB schema management for the price tables.
+
+Creates hypertables with a (symbol, time DESC) index, native compression
+segmented by symbol, and weekly/monthly OHLCV continuous aggregates.
+Every step is idempotent, so init functions can run on every job start.
+
+Full-period re-runs (e.g. the 5-year ingester without --incremental)
+upsert with ON CONFLICT DO UPDATE into chunks the compression policy has
+already compressed. That needs TimescaleDB 2.11 or newer, and each such
+upsert decompresses the affected segments, so it is slow; prefer
+incremental runs for routine updates. On older versions the compression
+policy is skipped so those upserts keep working.
+"""
+from sqlalchemy import text
+
+from bulk_load import quote_ident
+
+# Continuous aggregate suffix -> time_bucket width
+OHLCV_AGGREGATES = {'weekly': '1 week', 'monthly': '1 month'}
+
+# First TimescaleDB release that allows UPDATE / ON CONFLICT DO UPDATE on compressed chunks
+MIN_COMPRESSED_DML_VERSION = (2, 11)
+
+# Refresh windows per aggregate; each must span at least two buckets
+AGGREGATE_POLICIES = {
+    'weekly': ("INTERVAL '3 months'", "INTERVAL '1 day'", "INTERVAL '1 day'"),
+    'monthly': ("INTERVAL '1 year'", "INTERVAL '1 day'", "INTERVAL '1 day'"),
+}
+
+
+def timescale_version(conn):
+    """Installed timescaledb extension version as a tuple, e.g. (2, 14, 2); None if unknown."""
+    version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'timescaledb';")).scalar()
+    if not version:
+        return None
+    return tuple(int(part) for part in version.split('-')[0].split('.') if part.isdigit())
+
+
+def ensure_hypertable(conn, table, segment_by, time_column='time', compress_after='30 days'):
+    """
+    Converts `table` to a hypertable and configures indexing and compression.
+
+    Args:
+        conn: SQLAlchemy connection (caller commits).
+        table (str): Existing table with a timestamp column.
+        segment_by (str): Column compressed chunks are segmented by (ticker/symbol),
+            also the leading column of the (segment_by, time DESC) index.
+        time_column (str): Partitioning column.
+        compress_after (str): Age after which chunks are compressed, or None to skip the policy.
+            Skipped with a warning before TimescaleDB 2.11, which can't upsert into compressed chunks.
+    """
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb;"))
+    version = timescale_version(conn)
+    if compress_after and version is not None and version < MIN_COMPRESSED_DML_VERSION:
+        print(f"TimescaleDB {'.'.join(map(str, version))} can't upsert into compressed chunks "
+              f"(needs 2.11+); not adding a compression policy to {table}.")
+        compress_after = None
+    conn.execute(
+        text("SELECT create_hypertable(CAST(:table AS regclass), :time_column, if_not_exists => TRUE, migrate_data => TRUE);"),
+        {'table': table, 'time_column': time_column},
+    )
+
+    index_name = quote_ident(f"{table.split('.')[-1]}_{segment_by}_{time_column}_idx")
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {index_name} "
+        f"ON {quote_ident(table)} ({quote_ident(segment_by)}, {quote_ident(time_column)} DESC);"
+    ))
+
+    enabled = conn.execute(
+        text("SELECT compression_enabled FROM timescaledb_information.hypertables "
+             "WHERE hypertable_schema || '.' || hypertable_name = :qualified OR hypertable_name = :table;"),
+        {'qualified': table, 'table': table},
+    ).scalar()
+    if not enabled:
+        conn.execute(text(
+            f"ALTER TABLE {quote_ident(table)} SET ("
+            f"timescaledb.compress, "
+            f"timescaledb.compress_segmentby = '{segment_by}', "
+            f"timescaledb.compress_orderby = '{time_column} DESC');"
+        ))
+    if compress_after:
+        conn.execute(
+            text(f"SELECT add_compression_policy(CAST(:table AS regclass), INTERVAL '{compress_after}', if_not_exists => TRUE);"),
+            {'table': table},
+        )
+
+
+def create_ohlcv_aggregates(conn, table, symbol_column='ticker', aggregates=OHLCV_AGGREGATES):
+    """
+    Creates continuous aggregates <table>_weekly / <table>_monthly with OHLCV bars.
+
+    Each view has columns bucket, <symbol_column>, open, high, low, close, volume
+    and a refresh policy, so chart queries read pre-aggregated bars.
+    """
+    for suffix, width in aggregates.items():
+        view = f"{table}_{suffix}"
+        sym = quote_ident(symbol_column)
+        conn.execute(text(f"""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS {quote_ident(view)}
+            WITH (timescaledb.continuous) AS
+            SELECT time_bucket(INTERVAL '{width}', time) AS bucket,
+                   {sym},
+                   first(open, time) AS open,
+                   max(high) AS high,
+                   min(low) AS low,
+                   last(close, time) AS close,
+                   sum(volume) AS volume
+            FROM {quote_ident(table)}
+            GROUP BY bucket, {sym}
+            WITH NO DATA;
+        """))
+
+        start_offset, end_offset, schedule = AGGREGATE_POLICIES.get(suffix, AGGREGATE_POLICIES['monthly'])
+        conn.execute(
+            text(f"SELECT add_continuous_aggregate_policy(CAST(:view AS regclass), "
+                 f"start_offset => {start_offset}, end_offset => {end_offset}, "
+                 f"schedule_interval => {schedule}, if_not_exists => TRUE);"),
+            {'view': view},
+        )
+
+
+def init_price_schema(engine, table='sp500_stock_prices', symbol_column='ticker', aggregates=True):
+    """Creates the daily OHLCV hypertable with compression, indexing and continuous aggregates."""
+    with engine.connect() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {quote_ident(table)} (
+                time TIMESTAMPTZ NOT NULL,
+                {quote_ident(symbol_column)} TEXT NOT NULL,
+                open DOUBLE PRECISION,
+                high DOUBLE PRECISION,
+                low DOUBLE PRECISION,
+                close DOUBLE PRECISION,
+                volume BIGINT,
+                PRIMARY KEY (time, {quote_ident(symbol_column)})
+            );
+        """))
+        ensure_hypertable(conn, table, symbol_column)
+        if aggregates:
+            create_ohlcv_aggregates(conn, table, symbol_column)
+        conn.commit()
+    print(f"Hypertable '{table}' ready (compression, ({symbol_column}, time DESC) index, aggregates).")
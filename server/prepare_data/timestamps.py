@@ -0,0 +1,11 @@
+import numpy as np
+import pandas as pd
+
+
+def to_ns(times):
+    """UTC nanosecond int64 array from timestamps (naive values are taken as UTC)."""
+    if isinstance(times, np.ndarray) and times.dtype == np.int64:
+        return times
+    if np.ndim(times) == 0:
+        times = [times]
+    return pd.DatetimeIndex(pd.to_datetime(times, utc=True)).as_unit('ns').asi8
@@ -0,0 +1,61 @@
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from batch_downloader import make_batches
+from bulk_load import quote_ident
+
+
+def read_watermarks(engine, table='sp500_stock_prices', ticker_column='ticker'):
+    """
+    Reads the latest loaded bar for every ticker in a single grouped query.
+
+    Returns:
+        dict: {ticker: datetime.date of the newest row}
+    """
+    sql = text(
+        f"SELECT {quote_ident(ticker_column)} AS ticker, max(time) AS last_time "
+        f"FROM {quote_ident(table)} GROUP BY {quote_ident(ticker_column)};"
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(sql).fetchall()
+    return {row.ticker: row.last_time.date() for row in rows if row.last_time is not None}
+
+
+def plan_incremental(tickers, watermarks, batch_size, full_period="5y", today=None):
+    """
+    Builds download batches that only cover the bars missing from the database.
+
+    Tickers without a watermark get a full `full_period` download. Tickers
+    with one are grouped by their watermark day so that each multi-symbol
+    request shares the same `start` date. The watermark day itself is
+    re-fetched: a bar stored while the market was open gets its final close
+    (the COPY merge makes the overlap idempotent).
+
+    Args:
+        tickers (list): Tickers to refresh.
+        watermarks (dict): {ticker: last loaded date}, see read_watermarks.
+        batch_size (int): Maximum tickers per request.
+        full_period (str): yfinance period for tickers with no history yet.
+        today (date): Reference date, defaults to today.
+
+    Returns:
+        list: Batch tuples with either `period` or `start` fetch kwargs.
+    """
+    today = today or datetime.date.today()
+    new_tickers = []
+    by_start = defaultdict(list)
+
+    for ticker in tickers:
+        last = watermarks.get(ticker)
+        if last is None:
+            new_tickers.append(ticker)
+            continue
+        if last <= today:
+            by_start[last].append(ticker)
+
+    batches = make_batches(new_tickers, batch_size, period=full_period)
+    for start in sorted(by_start):
+        batches.extend(make_batches(by_start[start], batch_size, start=start.isoformat()))
+    return batches